@@ -0,0 +1,396 @@
+import asyncio
+import contextvars
+import importlib.util
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+import metrics
+from llm_client import get_async_client, get_client, iter_sse_data
+from metrics import Counter, Histogram
+from scheduler import readmit, readmit_async
+
+# Backend settings (overridable from the environment)
+LLM_FALLBACK_BACKEND = os.environ.get("LLM_FALLBACK_BACKEND", "local")  # Raced against or replaces a slow or failing remote
+LLM_HEDGE_AFTER = float(os.environ.get("LLM_HEDGE_AFTER", "8"))  # Seconds before the fallback is raced, 0 only falls back on errors
+LOCAL_MODEL_PATH = os.environ.get("LOCAL_MODEL_PATH", "")  # Quantised GGUF model, empty disables the local backend
+LOCAL_MODEL_CONTEXT = int(os.environ.get("LOCAL_MODEL_CONTEXT", "8192"))  # Fits the default prompt budget, see condense.py
+LOCAL_MODEL_THREADS = int(os.environ.get("LOCAL_MODEL_THREADS", str(os.cpu_count() or 4)))
+HEDGE_WORKERS = 32  # Threads that run sync remote calls while a fallback may be raced
+
+BACKEND_SECONDS = Histogram("llm_backend_seconds", "Completion latency by backend and outcome", ["backend", "outcome"])
+HEDGED_REQUESTS = Counter("llm_hedged_requests_total", "Requests that involved the fallback backend, by the backend that answered",
+                          ["winner"])
+
+
+# Chat format of the Llama 3 instruct models, for endpoints that take plain prompts
+_LLAMA3_MESSAGE = "<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>"
+_LLAMA3_REPLY = "<|start_header_id|>assistant<|end_header_id|>\n\n"
+
+
+def render_chat_prompt(messages: List[Dict[str, str]]) -> str:
+    """Chat messages as one Llama 3 prompt, ready for the model to write the assistant turn"""
+    return "<|begin_of_text|>" + "".join(_LLAMA3_MESSAGE.format(**message) for message in messages) + _LLAMA3_REPLY
+
+
+class BackendError(Exception):
+    """A backend answered without a completion; the message is what the user sees"""
+
+
+class Completion(NamedTuple):
+    text: str
+    backend: str  # Name of the backend that produced the text
+    seconds: float
+
+
+class Backend:
+    """Produces chat completions for an OpenAI-style request body"""
+    name = ""
+    supports_json = False  # Honours a JSON "response_format" in the request body
+    remote = False  # Calls count against the provider's rate limits, so the scheduler admits them
+
+    def available(self) -> bool:
+        return True
+
+    def complete(self, data: Dict, headers: Dict[str, str]) -> str:
+        raise NotImplementedError
+
+    def complete_stoppable(self, data: Dict, headers: Dict[str, str], stop: threading.Event) -> str:
+        """complete() that gives up once stop is set; backends that cannot stop part way run to the end"""
+        return self.complete(data, headers)
+
+    async def complete_async(self, data: Dict, headers: Dict[str, str]) -> str:
+        stop = threading.Event()
+        try:
+            return await asyncio.to_thread(self.complete_stoppable, data, headers, stop)
+        finally:
+            stop.set()  # A cancelled caller (a lost hedge) also stops the worker thread
+
+    async def stream(self, data: Dict, headers: Dict[str, str]) -> AsyncIterator[str]:
+        """Completion text as it is generated; backends that cannot stream send it in one piece"""
+        yield await self.complete_async(data, headers)
+
+    def complete_batch(self, datas: List[Dict], headers: Dict[str, str]) -> List[str]:
+        """Completions for requests that differ only in their messages; one at a time unless a backend can batch"""
+        return [self.complete(data, headers) for data in datas]
+
+
+class RemoteBackend(Backend):
+    """OpenAI-compatible HTTP endpoint behind the shared pooled clients"""
+    remote = True
+
+    def __init__(self, name: str, url: str, supports_json: bool = True, batch_url: str = ""):
+        self.name = name
+        self.url = url
+        self.supports_json = supports_json
+        self._batch_url = batch_url
+
+    @property
+    def batch_url(self) -> str:
+        """OpenAI-style completions endpoint that takes a list of prompts, by default next to the chat one"""
+        return self._batch_url or self.url.replace("/chat/completions", "/completions")
+
+    def _content(self, response) -> str:
+        if response.status_code != 200:
+            raise BackendError(f"API Error: {response.status_code} - {response.text}")
+        result = response.json()
+        metrics.record_usage(result.get('usage'))
+        return result['choices'][0]['message']['content']
+
+    def complete(self, data: Dict, headers: Dict[str, str]) -> str:
+        return self._content(get_client().post_json(self.url, data, headers=headers))
+
+    async def complete_async(self, data: Dict, headers: Dict[str, str]) -> str:
+        return self._content(await get_async_client().post_json(self.url, data, headers=headers))
+
+    async def stream(self, data: Dict, headers: Dict[str, str]) -> AsyncIterator[str]:
+        async with get_async_client().stream_post(self.url, {**data, "stream": True}, headers=headers) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise BackendError(f"API Error: {response.status_code} - {body.decode('utf-8', 'replace')}")
+
+            async for event in iter_sse_data(response):
+                payload = json.loads(event)
+                metrics.record_usage(payload.get('usage'))  # Sent with the last chunk, if at all
+                choices = payload.get('choices') or [{}]
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    yield delta
+
+    def complete_batch(self, datas: List[Dict], headers: Dict[str, str]) -> List[str]:
+        """One upstream call for the whole batch, which a self-hosted server runs as one batch on the GPU"""
+        body = {key: value for key, value in datas[0].items() if key != "messages"}
+        body["prompt"] = [render_chat_prompt(data["messages"]) for data in datas]
+        response = get_client().post_json(self.batch_url, body, headers=headers)
+        if response.status_code != 200:
+            raise BackendError(f"API Error: {response.status_code} - {response.text}")
+        result = response.json()
+        metrics.record_usage(result.get('usage'))
+        choices = sorted(result['choices'], key=lambda choice: choice.get('index', 0))
+        if len(choices) != len(datas):
+            raise BackendError(f"API Error: batched completion returned {len(choices)} answers for {len(datas)} prompts")
+        return [choice['text'] for choice in choices]
+
+
+class LocalBackend(Backend):
+    """Quantised model on the CPU through llama-cpp-python, loaded on first use and shared"""
+    name = "local"
+    supports_json = True  # Grammar-constrained by llama.cpp
+
+    def __init__(self, model_path: str = LOCAL_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()  # One generation at a time: a llama.cpp context is not thread safe
+
+    def available(self) -> bool:
+        return bool(self.model_path) and importlib.util.find_spec("llama_cpp") is not None
+
+    def _load(self):
+        # Called with the lock held. Importing and loading take seconds, so neither
+        # happens until the first request that needs the local model.
+        if self._model is None:
+            from llama_cpp import Llama
+            self._model = Llama(model_path=self.model_path, n_ctx=LOCAL_MODEL_CONTEXT,
+                                n_threads=LOCAL_MODEL_THREADS, verbose=False)
+        return self._model
+
+    def complete(self, data: Dict, headers: Dict[str, str]) -> str:
+        return self.complete_stoppable(data, headers, threading.Event())
+
+    def complete_stoppable(self, data: Dict, headers: Dict[str, str], stop: threading.Event) -> str:
+        if not self.available():
+            raise BackendError("Local model is not configured.")
+        pieces = []
+        with self._lock:
+            # Generated token by token so a caller that gave up frees the model at the next token
+            chunks = self._load().create_chat_completion(
+                messages=data["messages"],
+                max_tokens=data.get("max_tokens"),
+                temperature=data.get("temperature", 0.4),
+                top_p=data.get("top_p", 0.8),
+                response_format=data.get("response_format"),
+                stream=True,
+            )
+            try:
+                for chunk in chunks:
+                    if stop.is_set():
+                        raise BackendError("Local generation was stopped.")
+                    content = chunk['choices'][0]['delta'].get('content')
+                    if content:
+                        pieces.append(content)
+            finally:
+                chunks.close()
+        return ''.join(pieces)
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend) -> Backend:
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name: str) -> Optional[Backend]:
+    return BACKENDS.get(name)
+
+
+def get_fallback_backend() -> Optional[Backend]:
+    """The configured fallback, or None when it cannot run here"""
+    backend = get_backend(LLM_FALLBACK_BACKEND)
+    return backend if backend is not None and backend.available() else None
+
+
+register_backend(LocalBackend())
+
+
+def _observe(backend: Backend, start: float, outcome: str) -> float:
+    seconds = time.perf_counter() - start
+    BACKEND_SECONDS.observe(seconds, (backend.name, outcome))
+    return seconds
+
+
+def _attempt(backend: Backend, data: Dict, headers: Dict[str, str], stop: Optional[threading.Event] = None) -> Completion:
+    start = time.perf_counter()
+    try:
+        text = backend.complete(data, headers) if stop is None else backend.complete_stoppable(data, headers, stop)
+    except BaseException:
+        _observe(backend, start, "error")
+        raise
+    return Completion(text, backend.name, _observe(backend, start, "ok"))
+
+
+def _fallback_attempt(backend: Backend, data: Dict, headers: Dict[str, str], stop: threading.Event) -> Completion:
+    if backend.remote:
+        readmit()  # The fallback is one more upstream attempt for the rate limit scheduler
+    return _attempt(backend, data, headers, stop)
+
+
+async def _attempt_async(backend: Backend, data: Dict, headers: Dict[str, str]) -> Completion:
+    start = time.perf_counter()
+    try:
+        text = await backend.complete_async(data, headers)
+    except asyncio.CancelledError:
+        _observe(backend, start, "cancelled")
+        raise
+    except BaseException:
+        _observe(backend, start, "error")
+        raise
+    return Completion(text, backend.name, _observe(backend, start, "ok"))
+
+
+async def _fallback_attempt_async(backend: Backend, data: Dict, headers: Dict[str, str]) -> Completion:
+    if backend.remote:
+        await readmit_async()  # A local fallback does not use the provider's budget, nor wait for it
+    return await _attempt_async(backend, data, headers)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+    return _executor
+
+
+def complete_hedged(primary: Backend, fallback: Optional[Backend], data: Dict, headers: Dict[str, str],
+                    hedge_after: float = LLM_HEDGE_AFTER) -> Completion:
+    """Complete with the primary; race the fallback once it is slow, use the fallback if it fails"""
+    if fallback is None:
+        return _attempt(primary, data, headers)
+
+    executor = _get_executor()
+    stop = threading.Event()  # Set once the race is decided, so a loser that can stop part way does
+    # Each call runs in a copy of the caller's context, which carries its scheduler lane
+    primary_future = executor.submit(contextvars.copy_context().run, _attempt, primary, data, headers, stop)
+    fallback_future: Optional[Future] = None
+    try:
+        wait([primary_future], timeout=hedge_after if hedge_after > 0 else None)
+        while True:
+            for future in (primary_future, fallback_future):
+                if future is not None and future.done() and future.exception() is None:
+                    if fallback_future is not None:
+                        HEDGED_REQUESTS.inc((future.result().backend,))
+                    return future.result()
+            if fallback_future is None:
+                fallback_future = executor.submit(contextvars.copy_context().run, _fallback_attempt, fallback, data,
+                                                  headers, stop)
+            pending = [future for future in (primary_future, fallback_future) if not future.done()]
+            if not pending:
+                raise primary_future.exception()  # Both failed, report the primary's error
+            # A slow remote loser is left to finish in the background
+            wait(pending, return_when=FIRST_COMPLETED)
+    finally:
+        stop.set()
+
+
+async def complete_hedged_async(primary: Backend, fallback: Optional[Backend], data: Dict, headers: Dict[str, str],
+                                hedge_after: float = LLM_HEDGE_AFTER) -> Completion:
+    """Async variant of complete_hedged; the losing call is cancelled"""
+    if fallback is None:
+        return await _attempt_async(primary, data, headers)
+
+    primary_task = asyncio.ensure_future(_attempt_async(primary, data, headers))
+    fallback_task: Optional[asyncio.Future] = None
+    try:
+        await asyncio.wait({primary_task}, timeout=hedge_after if hedge_after > 0 else None)
+        while True:
+            for task in (primary_task, fallback_task):
+                if task is not None and task.done() and task.exception() is None:
+                    if fallback_task is not None:
+                        HEDGED_REQUESTS.inc((task.result().backend,))
+                    return task.result()
+            if fallback_task is None:
+                fallback_task = asyncio.ensure_future(_fallback_attempt_async(fallback, data, headers))
+            pending = {task for task in (primary_task, fallback_task) if not task.done()}
+            if not pending:
+                raise primary_task.exception()
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (primary_task, fallback_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class HedgedStream:
+    """Stream from the primary, or the fallback's whole answer if the primary is slow to start or fails first"""
+
+    def __init__(self, primary: Backend, fallback: Optional[Backend], data: Dict, headers: Dict[str, str],
+                 hedge_after: float = LLM_HEDGE_AFTER):
+        self.primary = primary
+        self.fallback = fallback
+        self.data = data
+        self.headers = headers
+        self.hedge_after = hedge_after
+        self.backend: Optional[str] = None  # Set once a backend's text is being yielded
+
+    async def chunks(self) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        stream = self.primary.stream(self.data, self.headers)
+        if self.fallback is None:
+            self.backend = self.primary.name
+            async for chunk in self._finish(stream, start):
+                yield chunk
+            return
+
+        # The race is decided by the primary's first chunk; after that it streams on alone
+        first = asyncio.ensure_future(stream.__anext__())
+        fallback_task: Optional[asyncio.Future] = None
+        try:
+            await asyncio.wait({first}, timeout=self.hedge_after if self.hedge_after > 0 else None)
+            while not (first.done() and not first.cancelled()
+                       and isinstance(first.exception(), (type(None), StopAsyncIteration))):
+                if fallback_task is None:
+                    fallback_task = asyncio.ensure_future(_fallback_attempt_async(self.fallback, self.data, self.headers))
+                if fallback_task.done() and fallback_task.exception() is None:
+                    completion = fallback_task.result()
+                    HEDGED_REQUESTS.inc((completion.backend,))
+                    self.backend = completion.backend
+                    yield completion.text
+                    return
+                pending = {task for task in (first, fallback_task) if not task.done()}
+                if not pending:
+                    break  # Both failed
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if fallback_task is not None and not fallback_task.done():
+                fallback_task.cancel()
+            if not first.done():
+                first.cancel()
+                await asyncio.wait({first})
+                _observe(self.primary, start, "cancelled")
+                await stream.aclose()
+
+        error = first.exception()
+        if error is not None and not isinstance(error, StopAsyncIteration):
+            _observe(self.primary, start, "error")
+            await stream.aclose()
+            raise error  # Report the primary's failure
+
+        if fallback_task is not None:
+            HEDGED_REQUESTS.inc((self.primary.name,))
+        self.backend = self.primary.name
+        if error is None:
+            yield first.result()
+        async for chunk in self._finish(stream, start):
+            yield chunk
+
+    async def _finish(self, stream: AsyncIterator[str], start: float) -> AsyncIterator[str]:
+        """Rest of the primary's stream, timed until its last chunk"""
+        try:
+            async for chunk in stream:
+                yield chunk
+        except BaseException:
+            _observe(self.primary, start, "error")
+            raise
+        finally:
+            await stream.aclose()
+        _observe(self.primary, start, "ok")
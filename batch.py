@@ -0,0 +1,156 @@
+"""Analyze a directory of chat exports without the web UI.
+
+Usage: python batch.py CHATS_DIR -o results.jsonl [--pattern "*.txt"] [--processes 4] [--concurrency 16]
+
+Files are read and condensed on a process pool (regex heavy) while the API
+calls run concurrently on the event loop (network bound). Every finished file
+is appended to the JSONL output straight away, and files already recorded
+there as "ok" are skipped, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import engine
+import metrics
+from backends import BACKEND_SECONDS, LocalBackend
+
+BATCH_PROCESSES = int(os.environ.get("BATCH_PROCESSES", str(os.cpu_count() or 1)))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "16"))  # API calls in flight
+
+
+def file_signature(path: Path) -> Tuple[int, int]:
+    """Size and mtime, so a file that changed since the last run is analyzed again"""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_checkpoint(output: Path) -> Dict[str, Tuple[int, int]]:
+    """Files already analyzed successfully, read back from an existing results file"""
+    done = {}
+    if not output.exists():
+        return done
+    with output.open(encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Line cut short by a crash
+            if record.get("status") == "ok":
+                done[record["path"]] = (record["size"], record["mtime_ns"])
+    return done
+
+
+def model_calls() -> Tuple[int, int]:
+    """(API requests, local model calls) issued so far, with retries, repairs and fallbacks; counted while metrics are enabled"""
+    api = sum(value for _, _, value in metrics.UPSTREAM_RESPONSES.samples())
+    local = sum(value for name, labels, value in BACKEND_SECONDS.samples()
+                if name.endswith("_count") and labels["backend"] == LocalBackend.name)
+    return int(api), int(local)
+
+
+def prepare_prompt(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """Process pool worker: return (prompt, error) for one conversation file"""
+    try:
+        content = engine.read_conversation_file(path)
+    except Exception as e:
+        return None, f"An error occurred: {str(e)}"
+    if content is None:
+        return None, "Unable to decode file with supported encodings."
+    if not content.strip():
+        return None, "No valid conversation content found in the file."
+    return engine.build_file_prompt(content), None
+
+
+class BatchRunner:
+    """Feed prepared prompts to the API with bounded concurrency and write results as they finish"""
+
+    def __init__(self, output: Path, processes: int = BATCH_PROCESSES, concurrency: int = BATCH_CONCURRENCY):
+        self.output = output
+        self.processes = processes
+        self.concurrency = concurrency
+        self.counts = {"ok": 0, "error": 0}
+
+    async def run(self, paths: List[Path]):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ProcessPoolExecutor(max_workers=self.processes) as pool, self._open_output() as results:
+
+            async def analyze(path: Path):
+                started = time.perf_counter()
+                record = {"path": str(path)}
+                try:
+                    record["size"], record["mtime_ns"] = file_signature(path)
+                    prompt, error = await loop.run_in_executor(pool, prepare_prompt, str(path))
+                    if error is None:
+                        async with semaphore:
+                            title, summary, resolution = await engine.analyze_async(prompt, engine.LANE_BULK)
+                        if title.startswith("❌"):
+                            error = summary
+                        else:
+                            record.update(title=title, summary=summary, resolution=resolution)
+                except Exception as e:
+                    # A file that vanished, a dead worker or a failed call only fails its own row
+                    error = f"An error occurred: {str(e)}"
+                record["status"] = "ok" if error is None else "error"
+                if error is not None:
+                    record["error"] = error
+                record["seconds"] = round(time.perf_counter() - started, 3)
+                self.counts[record["status"]] += 1
+                results.write(json.dumps(record, ensure_ascii=False) + "\n")
+                results.flush()
+
+            await asyncio.gather(*(analyze(path) for path in paths))
+
+    def _open_output(self):
+        # Start on a fresh line if the previous run died mid-record
+        needs_newline = False
+        if self.output.exists() and self.output.stat().st_size:
+            with self.output.open("rb") as previous:
+                previous.seek(-1, os.SEEK_END)
+                needs_newline = previous.read(1) != b"\n"
+        results = self.output.open("a", encoding="utf-8")
+        if needs_newline:
+            results.write("\n")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path, help="directory with exported chats")
+    parser.add_argument("-o", "--output", type=Path, default=Path("results.jsonl"))
+    parser.add_argument("--pattern", default="*.txt", help="glob for conversation files (searched recursively)")
+    parser.add_argument("--processes", type=int, default=BATCH_PROCESSES, help="preprocessing worker processes")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="API calls in flight")
+    args = parser.parse_args()
+
+    if engine.TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        sys.exit("Please configure your Together AI API key in engine.py or set TOGETHER_API_KEY.")
+
+    done = load_checkpoint(args.output)
+    paths = sorted(path for path in args.directory.rglob(args.pattern) if path.is_file())
+    pending = [path for path in paths if done.get(str(path)) != file_signature(path)]
+    print(f"{len(paths)} files, {len(paths) - len(pending)} already done, {len(pending)} to analyze")
+
+    metrics.METRICS_ENABLED = True  # Calls are counted where they are issued, by the metrics counters
+    runner = BatchRunner(args.output, args.processes, args.concurrency)
+    start = time.perf_counter()
+    asyncio.run(runner.run(pending))
+    elapsed = time.perf_counter() - start
+    api_calls, local_calls = model_calls()
+
+    seconds = max(elapsed, 1e-9)
+    print(f"{runner.counts['ok']} ok, {runner.counts['error']} failed in {elapsed:.1f} s")
+    print(f"{len(pending) / seconds:.1f} files/s, {api_calls / seconds:.1f} API calls/s -> {args.output}")
+    if local_calls:
+        print(f"{local_calls} local model calls")
+
+
+if __name__ == "__main__":
+    main()
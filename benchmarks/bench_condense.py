@@ -0,0 +1,65 @@
+"""Benchmark conversation condensation on large message lists.
+
+Usage: python benchmarks/bench_condense.py [--messages 100000] [--budget 6568]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condense import PROMPT_TOKEN_BUDGET, select_window  # noqa: E402
+
+CALM = [
+    "ok see you at 6",
+    "did anyone book the table?",
+    "lol that meme",
+    "good morning everyone",
+    "sending the photos now",
+]
+HEATED = [
+    "Why do you ALWAYS do this??",
+    "I'm not the one who lied about it",
+    "Seriously, you never listen to me",
+    "Sorry but that's just unfair",
+    "How dare you blame me for this!!",
+]
+
+
+def generate_lines(count: int, seed: int = 11):
+    """Mostly small talk with one heated exchange a thousand messages before the end"""
+    rng = random.Random(seed)
+    argument = range(max(0, count - 1000), max(0, count - 1000) + 40)
+    lines = []
+    for index in range(count):
+        sender = f"Person {rng.randint(1, 8)}"
+        pool = HEATED if index in argument else CALM
+        lines.append(f"{sender}: {rng.choice(pool)}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET, help="token budget")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = generate_lines(args.messages)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        window = select_window(iter(lines), args.budget)
+        timings.append(time.perf_counter() - start)
+
+    heated = sum(1 for line in window if line.split(": ", 1)[1] in HEATED)
+    best = min(timings)
+    print(f"{args.messages:,} messages, budget {args.budget} tokens")
+    print(f"best of {args.repeat}: {best * 1000:.1f} ms ({args.messages / best / 1e6:.2f} M messages/s)")
+    print(f"selected {len(window)} messages, {heated} of them from the heated exchange")
+
+
+if __name__ == "__main__":
+    main()
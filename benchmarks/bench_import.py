@@ -0,0 +1,91 @@
+"""Measure cold start of the engine and the web server against a time budget.
+
+Usage: python benchmarks/bench_import.py [--repeat 5] [--engine-budget-ms 150] [--server-budget-ms 8000]
+
+Each run is a fresh interpreter under `python -X importtime`. The engine run
+only imports engine; the server run imports app and builds the Gradio UI, as
+`python app.py` does before it starts listening. The engine must also stay free
+of the heavy modules it imports lazily. Exits with status 1 when a budget is
+exceeded.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINE_CODE = "import engine"
+SERVER_CODE = "import app; app.create_interface()"
+# Imported on first use only: a batch job or a test that needs the engine must not pay for them
+ENGINE_FORBIDDEN = ("gradio", "requests", "httpx", "llama_cpp")
+
+
+def run_importtime(code: str):
+    """Run code in a fresh interpreter; return (wall seconds, {module: cumulative microseconds})"""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative)
+    return wall, modules
+
+
+def slowest(modules, prefix: str, count: int = 5):
+    """The heaviest imports other than the measured module itself (submodules left out)"""
+    return sorted(((us, name) for name, us in modules.items() if name != prefix and "." not in name),
+                  reverse=True)[:count]
+
+
+def measure(code: str, module: str, repeat: int):
+    walls, imports, last = [], [], {}
+    for _ in range(repeat):
+        wall, modules = run_importtime(code)
+        walls.append(wall)
+        imports.append(modules.get(module, 0))
+        last = modules
+    return statistics.median(walls) * 1000, statistics.median(imports) / 1000, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engine-budget-ms", type=float, default=150.0, help="median `import engine` time")
+    parser.add_argument("--server-budget-ms", type=float, default=8000.0, help="median process time to a built UI")
+    args = parser.parse_args()
+
+    failures = []
+
+    engine_wall, engine_import, modules = measure(ENGINE_CODE, "engine", args.repeat)
+    print(f"engine: import {engine_import:.1f} ms (budget {args.engine_budget_ms:.0f} ms), "
+          f"process {engine_wall:.0f} ms, median of {args.repeat}")
+    for us, name in slowest(modules, "engine"):
+        print(f"    {name:<24} {us / 1000:8.1f} ms")
+    if engine_import > args.engine_budget_ms:
+        failures.append(f"engine import {engine_import:.1f} ms > {args.engine_budget_ms:.0f} ms")
+    leaked = [name for name in ENGINE_FORBIDDEN if name in modules]
+    if leaked:
+        failures.append(f"engine imports {', '.join(leaked)} eagerly")
+
+    server_wall, app_import, modules = measure(SERVER_CODE, "app", args.repeat)
+    print(f"server: import {app_import:.1f} ms, process to built UI {server_wall:.0f} ms "
+          f"(budget {args.server_budget_ms:.0f} ms), median of {args.repeat}")
+    for us, name in slowest(modules, "app"):
+        print(f"    {name:<24} {us / 1000:8.1f} ms")
+    if server_wall > args.server_budget_ms:
+        failures.append(f"server start {server_wall:.0f} ms > {args.server_budget_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
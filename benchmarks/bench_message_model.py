@@ -0,0 +1,89 @@
+"""Compare memory per parsed message: list of dicts versus the columnar Conversation.
+
+Usage: python benchmarks/bench_message_model.py [--lines 200000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine import WHATSAPP_LINE_RE, is_promotional_message, parse_whatsapp_messages, strip_system_messages  # noqa: E402
+from segmenter import TechnicalSegmenter  # noqa: E402
+from bench_preprocess import generate_export  # noqa: E402
+
+
+def legacy_parse(lines):
+    """Per-message dicts, as before the columnar model"""
+    messages = []
+    current_message = None
+    segmenter = TechnicalSegmenter()
+
+    def emit(message):
+        pieces = message.pop('pieces')
+        segmenter.finish(pieces)
+        if pieces:
+            message['message'] = ' '.join(pieces)
+            messages.append(message)
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = WHATSAPP_LINE_RE.match(line)
+        if match:
+            if current_message:
+                emit(current_message)
+            date, time_, sender, message = match.groups()
+            sender = sender.strip()
+            message = message.strip()
+            if not message or is_promotional_message(message):
+                current_message = None
+                continue
+            current_message = {'sender': sender, 'pieces': [], 'timestamp': f"{date} {time_}"}
+            segmenter.feed(message, current_message['pieces'])
+        elif current_message:
+            segmenter.feed(line, current_message['pieces'])
+    if current_message:
+        emit(current_message)
+    return messages
+
+
+def measure(parse, lines):
+    """Return (parsed result, bytes retained by it, seconds to parse)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = parse(lines)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    args = parser.parse_args()
+
+    lines = strip_system_messages(generate_export(args.lines)).split('\n')
+
+    legacy, legacy_bytes, legacy_time = measure(legacy_parse, lines)
+    conversation, columnar_bytes, columnar_time = measure(parse_whatsapp_messages, lines)
+    if [m['message'] for m in legacy] != conversation.texts:
+        sys.exit("message text mismatch between dict and columnar parsers")
+
+    count = len(conversation)
+    print(f"{count:,} messages from {args.lines:,} lines, {len(conversation.senders)} senders")
+    print(f"dicts   : {legacy_bytes / count:7.1f} bytes/message  parse {legacy_time:6.3f} s")
+    print(f"columnar: {columnar_bytes / count:7.1f} bytes/message  parse {columnar_time:6.3f} s")
+    print(f"memory  : {legacy_bytes / columnar_bytes:7.2f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Throughput and latency of micro-batched upstream calls against the local mock.
+
+Usage: python benchmarks/bench_microbatch.py [--max-size 1 4 16 64] [--max-wait-ms 2 10 50] [--users 1 8 64]
+                                             [--requests 4] [--capacity 1] [--token-latency 0.002]
+
+The mock answers one generation pass at a time (--capacity), as a single GPU
+server would. A batch takes one pass however many prompts it holds, so larger
+batches raise throughput under load. The price is the wait for a batch to fill,
+which a lone user pays in full. --max-size 1 is the unbatched baseline.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Pool sized for the largest user count so connections are not the bottleneck
+os.environ.setdefault("LLM_POOL_SIZE", "64")
+
+import engine  # noqa: E402
+from microbatch import BatchedBackend  # noqa: E402
+from mock_llm_server import completion_url, start_mock_server  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(backend, users: int, requests_per_user: int):
+    """Closed loop: each user sends its next request when the previous one is answered"""
+    latencies = []
+
+    async def user(index: int):
+        for request in range(requests_per_user):
+            headers, data = engine.build_completion_request(f"Conversation {index}.{request}", engine.SYSTEM_PROMPT)
+            start = time.perf_counter()
+            await backend.complete_async(data, headers)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(users)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-size", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2.0, 10.0, 50.0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--requests", type=int, default=4, help="requests per user")
+    parser.add_argument("--capacity", type=int, default=1, help="mock generation passes at a time")
+    parser.add_argument("--latency", type=float, default=0.005, help="mock seconds before answering")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="mock seconds per generated word")
+    args = parser.parse_args()
+
+    server = start_mock_server(latency=args.latency, token_latency=args.token_latency, capacity=args.capacity)
+    engine.REMOTE_BACKEND.url = completion_url(server)
+
+    configs = [(1, 0.0)] + [(size, wait) for size in args.max_size if size > 1 for wait in args.max_wait_ms]
+    for users in args.users:
+        for max_size, max_wait_ms in configs:
+            if max_size == 1:
+                backend = engine.REMOTE_BACKEND
+            else:
+                backend = BatchedBackend(engine.REMOTE_BACKEND, max_size, max_wait_ms / 1000)
+            server.batch_sizes.clear()
+            latencies, elapsed = asyncio.run(run(backend, users, args.requests))
+            batches = f"{statistics.mean(server.batch_sizes):5.1f}" if server.batch_sizes else "    -"
+            label = "unbatched" if max_size == 1 else f"size<={max_size} wait={max_wait_ms:g}ms"
+            print(f"users={users:<3} {label:<24} batch mean={batches}  "
+                  f"p50={percentile(latencies, 50) * 1000:7.1f} ms  p99={percentile(latencies, 99) * 1000:7.1f} ms  "
+                  f"throughput={len(latencies) / elapsed:7.1f} req/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Benchmark preprocess_chat_content against the original multi-pass implementation.
+
+Usage: python benchmarks/bench_preprocess.py [--lines 500000]
+
+Outputs differ where technical content is involved: the original judged it
+line by line and dropped those lines, the current parser collapses whole
+code, LaTeX, HTML and stack trace spans into placeholders.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condense import estimate_tokens  # noqa: E402
+from engine import anonymize_sender, preprocess_chat_content  # noqa: E402
+
+SENDERS = ["Alice", "Bob Kumar", "Chitra", "Dev", "+91 98765 43210", "Esha"]
+BODIES = [
+    "I can't believe you said that in front of everyone",
+    "Can we talk about this later?",
+    "<Media omitted>",
+    "This message was deleted",
+    "Use my referral code for cashback https://example.com",
+    "ok",
+    "You always do this, every single time",
+    "\\begin{document} \\section{Intro}",
+]
+CONTINUATIONS = [
+    "and another thing",
+    "import numpy as np",
+    "# not a comment, just emphasis",
+    "seriously though",
+]
+
+
+def generate_export(lines: int, seed: int = 7) -> str:
+    """Build a synthetic WhatsApp export with roughly the given number of lines"""
+    rng = random.Random(seed)
+    out = ["12/01/2020, 9:00 am - Messages and calls are end-to-end encrypted. Learn more"]
+    while len(out) < lines:
+        day = rng.randint(1, 28)
+        month = rng.randint(1, 12)
+        hour = rng.randint(1, 12)
+        minute = rng.randint(0, 59)
+        ampm = rng.choice(["am", "pm"])
+        out.append(f"{month}/{day}/2021, {hour}:{minute:02d} {ampm} - {rng.choice(SENDERS)}: {rng.choice(BODIES)}")
+        if rng.random() < 0.2:
+            out.append(rng.choice(CONTINUATIONS))
+    return "\n".join(out[:lines])
+
+
+def legacy_preprocess_chat_content(content: str) -> str:
+    """Original implementation, kept verbatim as the comparison baseline"""
+    if not content or not content.strip():
+        return ""
+    system_messages = [
+        'Messages and calls are end-to-end encrypted',
+        'Only people in this chat can read, listen to, or share them',
+        'Learn more',
+        'is a contact',
+        'Your security code with',
+        'changed. Tap to learn more',
+        '<Media omitted>',
+        'This message was deleted',
+        'You deleted this message',
+        'joined using this group',
+        'left the group',
+        'added you',
+        'removed you',
+        'created group',
+        'changed the group description',
+        'changed this group\'s icon',
+        'null'
+    ]
+    for msg in system_messages:
+        content = re.sub(re.escape(msg), '', content, flags=re.IGNORECASE)
+    whatsapp_pattern = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}),?\s*(\d{1,2}:\d{2}(?:\s*[ap]m)?)\s*-\s*([^:]+):\s*(.+)'
+    messages = []
+    current_message = None
+    sender_map = {}
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = re.match(whatsapp_pattern, line, re.IGNORECASE)
+        if match:
+            if current_message:
+                messages.append(current_message)
+            date, time_, sender, message = match.groups()
+            sender = sender.strip()
+            message = message.strip()
+            if not message or message.isspace():
+                current_message = None
+                continue
+            if legacy_is_promotional_message(message):
+                current_message = None
+                continue
+            if len(message) > 1000 and legacy_contains_technical_content(message):
+                current_message = None
+                continue
+            current_message = {'sender': sender, 'message': message, 'timestamp': f"{date} {time_}"}
+        else:
+            if current_message and line:
+                if not legacy_contains_technical_content(line):
+                    current_message['message'] += f" {line}"
+    if current_message:
+        messages.append(current_message)
+    conversation_lines = []
+    for msg in messages:
+        conversation_lines.append(f"{anonymize_sender(msg['sender'], sender_map)}: {msg['message']}")
+    result = '\n'.join(conversation_lines)
+    result = re.sub(r'\n\s*\n', '\n', result)
+    result = re.sub(r'\s+', ' ', result)
+    return result.strip()
+
+
+def legacy_is_promotional_message(message: str) -> bool:
+    promotional_keywords = [
+        'referral code', 'cashback', 'join india', 'click my link', 'get assured',
+        'download app', 'earn up to', 'https://', 'http://', 'www.', 'paytm', 'gpay', 'phonepe'
+    ]
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in promotional_keywords)
+
+
+def legacy_contains_technical_content(text: str) -> bool:
+    technical_patterns = [
+        r'\\documentclass', r'\\usepackage', r'\\begin{', r'\\end{', r'\\textbf{', r'\\section{',
+        r'\\title{', r'def\s+\w+\(', r'import\s+\w+', r'from\s+\w+\s+import', r'<[^>]+>',
+        r'^\s*#.*$', r'^\s*//.*$'
+    ]
+    for pattern in technical_patterns:
+        if re.search(pattern, text, re.IGNORECASE | re.MULTILINE):
+            return True
+    return False
+
+
+def best_of(func, content: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = generate_export(args.lines)
+    print(f"synthetic export: {args.lines:,} lines, {len(content) / 1e6:.1f} MB")
+
+    legacy = best_of(legacy_preprocess_chat_content, content, args.repeat)
+    current = best_of(preprocess_chat_content, content, args.repeat)
+    print(f"legacy : {legacy:8.3f} s")
+    print(f"current: {current:8.3f} s")
+    print(f"speedup: {legacy / current:8.2f}x")
+    print(f"output : legacy {estimate_tokens(legacy_preprocess_chat_content(content)):,} tokens, "
+          f"current {estimate_tokens(preprocess_chat_content(content)):,} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark redaction of participant names inside message bodies in large group chats.
+
+Usage: python benchmarks/bench_redaction.py [--participants 10 50 200] [--messages 20000]
+
+Compares the word automaton of NameRedactor, which reads the text once however
+many participants there are, with the obvious one regex substitution per name
+form, which reads it once per form. The regex version skips the shared first
+name and capitalization rules, so it only shows the least a per-name approach costs.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redaction import NameRedactor, phone_forms  # noqa: E402
+
+FIRST = ["Aarav", "Priya", "Rahul", "Sneha", "Vikram", "Ananya", "Karan", "Meera", "Rohan", "Divya",
+         "Arjun", "Kavya", "Nikhil", "Pooja", "Siddharth", "Tanvi", "Varun", "Ishita", "Aditya", "Neha"]
+LAST = ["Sharma", "Patel", "Reddy", "Iyer", "Gupta", "Nair", "Singh", "Das", "Mehta", "Joshi"]
+BODIES = [
+    "{name} you said you would bring the cake",
+    "why is {name} always late, every single time",
+    "ok",
+    "can someone call {name} on {phone}",
+    "I told {name} and {other} about it yesterday",
+    "Fine. Whatever.",
+    "that's not fair and you know it",
+]
+
+
+def participants(count: int, rng: random.Random):
+    """(sender as exported, how others refer to them); every tenth is an unsaved number"""
+    people = []
+    for index in range(count):
+        if index % 10 == 9:
+            number = f"+91 9{rng.randint(1000, 9999)} {rng.randint(10000, 99999)}"
+            people.append((number, number))
+        else:
+            name = f"{FIRST[index % len(FIRST)]} {LAST[(index // len(FIRST)) % len(LAST)]}"
+            people.append((name, rng.choice([name, name.split()[0]])))
+    return people
+
+
+def generate(count: int, messages: int, seed: int = 5):
+    rng = random.Random(seed)
+    people = participants(count, rng)
+    senders = {}
+    lines = []
+    for _ in range(messages):
+        sender, _ = rng.choice(people)
+        label = senders.setdefault(sender, f"Person {len(senders) + 1}")
+        _, name = rng.choice(people)
+        _, other = rng.choice(people)
+        phone = rng.choice(people)[0] if rng.random() < 0.5 else "98765 43210"
+        lines.append(f"{label}: " + rng.choice(BODIES).format(name=name, other=other, phone=phone))
+    return senders, ' '.join(lines)
+
+
+def naive_redact(senders, text: str) -> str:
+    """One case-insensitive substitution per name form, longest forms first"""
+    forms = []
+    for sender, label in senders.items():
+        if sender.startswith('+'):
+            forms += [(r'\+?' + r'\W+'.join(map(re.escape, form)), label) for form in phone_forms(sender)]
+            continue
+        forms.append((r'\W+'.join(map(re.escape, sender.lower().split())), label))
+        forms.append((re.escape(sender.split()[0].lower()), label))
+    forms.sort(key=lambda form: len(form[0]), reverse=True)
+    for pattern, label in forms:
+        text = re.sub(rf'\b{pattern}\b', label, text, flags=re.IGNORECASE)
+    return text
+
+
+def timed(func, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    for count in args.participants:
+        senders, text = generate(count, args.messages)
+
+        def automaton():
+            redactor = NameRedactor()
+            for sender, label in senders.items():
+                redactor.add_participant(sender, label)
+            return redactor.redact(text)
+
+        size = len(text.encode("utf-8")) / 1024
+        fast = timed(automaton)
+        slow = timed(lambda: naive_redact(senders, text), repeat=1)
+        print(f"participants={count:<4} text={size:7.0f} KB  automaton={fast * 1000:8.1f} ms  "
+              f"regex per name={slow * 1000:8.1f} ms  ({slow / fast:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
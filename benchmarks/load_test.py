@@ -0,0 +1,131 @@
+"""Load test the analyze handlers against a local mock completion endpoint.
+
+Usage: python benchmarks/load_test.py [--latency 0.2] [--requests 4] [--users 1 16 64]
+       python benchmarks/load_test.py --url http://127.0.0.1:8765/v1/chat/completions
+
+Reports p50/p99 latency and throughput for the async handlers (as wired to the
+Gradio queue) and for the sync handlers on a fixed-size thread pool. For the
+async handlers it also reports time to first visible text, which is what
+streaming improves.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Pool sized for the largest user count so connections are not the bottleneck
+os.environ.setdefault("LLM_POOL_SIZE", "64")
+# Repeated text (--identical, or reruns) would otherwise be a cache hit
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+# The mock endpoint has no account limits; set these to see queueing under load
+os.environ.setdefault("LLM_RPM_LIMIT", "0")
+os.environ.setdefault("LLM_TPM_LIMIT", "0")
+
+import engine  # noqa: E402
+from mock_llm_server import completion_url, start_mock_server  # noqa: E402
+
+CONVERSATION = "Person A: You said you'd be home by seven.\nPerson B: Work ran late, I texted you!"
+
+
+def conversation_text(identical: bool, user: int, request: int) -> str:
+    """Distinct text per request unless measuring request coalescing"""
+    if identical:
+        return CONVERSATION
+    return f"{CONVERSATION}\nPerson A: (user {user}, message {request})"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(label, users, latencies, elapsed, first_text=None):
+    line = (f"{label:<6} users={users:<3} requests={len(latencies):<4} "
+            f"p50={percentile(latencies, 50) * 1000:7.1f} ms  p99={percentile(latencies, 99) * 1000:7.1f} ms  "
+            f"mean={statistics.mean(latencies) * 1000:7.1f} ms  throughput={len(latencies) / elapsed:7.1f} req/s")
+    if first_text:
+        line += (f"  first text p50={percentile(first_text, 50) * 1000:7.1f} ms"
+                 f" p99={percentile(first_text, 99) * 1000:7.1f} ms")
+    print(line)
+
+
+async def run_async(users, requests_per_user, identical=False):
+    latencies = []
+    first_text = []
+
+    async def user(index):
+        for request in range(requests_per_user):
+            start = time.perf_counter()
+            first = None
+            async for result in engine.process_conversation_async(conversation_text(identical, index, request)):
+                if first is None:
+                    first = time.perf_counter() - start
+            latencies.append(time.perf_counter() - start)
+            first_text.append(first)
+            assert not result[0].startswith("❌"), result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(users)))
+    return latencies, time.perf_counter() - start, first_text
+
+
+def run_sync(users, requests_per_user, threads, identical=False):
+    latencies = []
+
+    def user(index):
+        for request in range(requests_per_user):
+            # Latency includes time spent waiting for a free worker thread
+            start = time.perf_counter()
+            result = pool.submit(engine.process_conversation, conversation_text(identical, index, request)).result()
+            latencies.append(time.perf_counter() - start)
+            assert not result[0].startswith("❌"), result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool, ThreadPoolExecutor(max_workers=users) as clients:
+        for future in [clients.submit(user, index) for index in range(users)]:
+            future.result()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="mock upstream latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="mock delay between streamed tokens")
+    parser.add_argument("--requests", type=int, default=4, help="requests per user")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for the sync comparison")
+    parser.add_argument("--url", help="use an already running mock endpoint instead of an in-process one")
+    parser.add_argument("--identical", action="store_true",
+                        help="every user sends the same text, so concurrent requests are coalesced")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        engine.REMOTE_BACKEND.url = args.url
+    else:
+        server = start_mock_server(latency=args.latency, token_latency=args.token_latency)
+        engine.REMOTE_BACKEND.url = completion_url(server)
+    engine.TOGETHER_API_KEY = "mock-key"
+    mode = "streaming" if engine.STREAM_RESPONSES else "non-streaming"
+    print(f"mock upstream at {engine.REMOTE_BACKEND.url}, async handlers {mode}, sync pool {args.threads} threads")
+
+    for users in args.users:
+        latencies, elapsed, first_text = asyncio.run(run_async(users, args.requests, args.identical))
+        report("async", users, latencies, elapsed, first_text)
+        latencies, elapsed = run_sync(users, args.requests, args.threads, args.identical)
+        report("sync", users, latencies, elapsed)
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Usage: python benchmarks/mock_llm_server.py [--port 8765] [--latency 0.2] [--fail-rate 0.1] [--token-latency 0.01]
+                                            [--bad-json-rate 0.1] [--capacity 1]
+
+Point the app at it with TOGETHER_API_URL=http://127.0.0.1:8765/v1/chat/completions
+
+/v1/completions takes a list of prompts and answers them all in one pass, like
+a self-hosted server batching on the GPU. --capacity limits how many passes run
+at once; 0 leaves them unlimited, like a large hosted provider.
+"""
+import argparse
+import contextlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESPONSE = """⚔️ Conflict Title:
+"Different Expectations, Shared Goal"
+
+🔍 Conflict Summary:
+Both people want the plan to succeed but disagree on who should have been consulted and when.
+
+🤝 Conflict Resolution:
+Agree on a short check-in before decisions that affect both of you, and acknowledge the effort each person has already made."""
+
+# Answer to requests with a JSON response_format
+CANNED_JSON_RESPONSE = json.dumps({
+    "title": "Different Expectations, Shared Goal",
+    "summary": "Both people want the plan to succeed but disagree on who should have been consulted and when.",
+    "resolution": "Agree on a short check-in before decisions that affect both of you, and acknowledge the effort "
+                  "each person has already made.",
+}, ensure_ascii=False)
+
+
+def usage(body, text):
+    """Rough OpenAI-style token counts (about four characters per token)"""
+    prompt = sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+    completion = len(text) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real provider
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with server.lock:
+            server.request_count += 1
+
+        time.sleep(server.latency)
+
+        if random.random() < server.fail_rate:
+            self._send(503, {"error": "mock overload"}, {"Retry-After": "0"})
+            return
+
+        if self.path.endswith("/v1/completions"):
+            self._complete_batch(body)
+            return
+
+        text = self._answer(body)
+        with server.slots:
+            if body.get("stream"):
+                try:
+                    self._stream(text, server.token_latency)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # Client gave up mid-stream
+                return
+
+            # A non-streamed answer still takes as long to generate as a streamed one
+            time.sleep(server.token_latency * len(text.split(" ")))
+        self._send(200, {
+            "id": "mock",
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+            "usage": usage(body, text),
+        })
+
+    def _answer(self, body):
+        text = CANNED_RESPONSE
+        if body.get("response_format"):
+            text = CANNED_JSON_RESPONSE
+            if random.random() < self.server.bad_json_rate:
+                text = text[:len(text) // 2]  # Cut short, as when a model runs out of tokens
+        return text
+
+    def _complete_batch(self, body):
+        """Answer every prompt of a batched completions request in one generation pass"""
+        prompts = body.get("prompt") or []
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        texts = [self._answer(body) for _ in prompts]
+        with self.server.lock:
+            self.server.batch_sizes.append(len(prompts))
+        with self.server.slots:
+            time.sleep(self.server.token_latency * max((len(text.split(" ")) for text in texts), default=0))
+        prompt_tokens = sum(len(prompt) for prompt in prompts) // 4
+        completion_tokens = sum(len(text) for text in texts) // 4
+        self._send(200, {
+            "id": "mock",
+            "model": body.get("model", "mock"),
+            "choices": [{"index": index, "text": text} for index, text in enumerate(texts)],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, text, token_latency):
+        """Send the response as server-sent events, one word per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for index, word in enumerate(words):
+            token = word if index == 0 else " " + word
+            event = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            time.sleep(token_latency)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    request_queue_size = 256  # Default backlog of 5 drops connects under load
+    daemon_threads = True
+
+
+def start_mock_server(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0,
+                      token_latency: float = 0.0, bad_json_rate: float = 0.0, capacity: int = 0) -> MockServer:
+    """Start the mock server on a background thread and return it (port 0 picks a free port)"""
+    server = MockServer(("127.0.0.1", port), MockCompletionHandler)
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.token_latency = token_latency
+    server.bad_json_rate = bad_json_rate
+    server.request_count = 0
+    server.batch_sizes = []  # Prompts per /v1/completions request
+    server.slots = threading.Semaphore(capacity) if capacity > 0 else contextlib.nullcontext()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def completion_url(server: MockServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--bad-json-rate", type=float, default=0.0, help="fraction of JSON answers cut short")
+    parser.add_argument("--capacity", type=int, default=0, help="generation passes at a time, 0 for unlimited")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.port, args.latency, args.fail_rate, args.token_latency, args.bad_json_rate,
+                               args.capacity)
+    print(f"mock completions endpoint at {completion_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
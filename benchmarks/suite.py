@@ -0,0 +1,207 @@
+"""Benchmark suite for preprocessing, parsing and end-to-end handler latency.
+
+Usage: python benchmarks/suite.py [--sizes 1KB 100KB 1MB 10MB] [--file-sizes 10MB 500MB] [-o results.json]
+       python benchmarks/suite.py --compare baseline.json [--threshold 0.10]
+
+Each result is keyed by benchmark name and input size, so two result files
+from different commits can be compared directly. With --compare, results that
+got slower than the threshold are listed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Every end-to-end run sends the same text, which would otherwise be a cache hit
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+# Likewise every file upload after the first would be an unchanged re-upload
+os.environ.setdefault("ANALYSIS_STATE_MAX_ENTRIES", "0")
+
+import engine  # noqa: E402
+from mock_llm_server import CANNED_JSON_RESPONSE, CANNED_RESPONSE, completion_url, start_mock_server  # noqa: E402
+from segmenter import TechnicalSegmenter  # noqa: E402
+from structured import validate_analysis  # noqa: E402
+from synthetic import format_size, generate_export_text, parse_size, write_export_file  # noqa: E402
+
+POV_A = "I planned the whole trip and nobody even thanked me. Then they changed the hotel without asking."
+POV_B = "The first hotel was cancelled last minute, I had to book something fast and I did tell the group."
+CONVERSATION = "Person A: You said you'd be home by seven.\nPerson B: Work ran late, I texted you!"
+
+
+def timed(func, *args, repeat: int = 5):
+    """Run func repeat times (after one warm-up run when repeating) and return the wall times in seconds"""
+    if repeat > 1:
+        func(*args)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def result(name: str, timings, size: int = 0, items: int = 0):
+    entry = {
+        "name": name,
+        "size_bytes": size,
+        "repeat": len(timings),
+        "best_s": min(timings),
+        "median_s": statistics.median(timings),
+        "p99_s": percentile(timings, 99),
+    }
+    if size:
+        entry["mb_per_s"] = size / 1e6 / min(timings)
+    if items:
+        entry["items_per_s"] = items / min(timings)
+    print(f"{name:<32} {format_size(size) if size else '':>7}  best {entry['best_s'] * 1000:10.2f} ms"
+          f"  median {entry['median_s'] * 1000:10.2f} ms")
+    return entry
+
+
+def repeats_for(size: int) -> int:
+    return 5 if size <= 1024 ** 2 else 3 if size <= 64 * 1024 ** 2 else 1
+
+
+def segment_lines(lines):
+    segmenter = TechnicalSegmenter()
+    pieces = []
+    for line in lines:
+        segmenter.feed(line, pieces)
+    segmenter.finish(pieces)
+    return pieces
+
+
+def bench_text(sizes):
+    results = []
+    for size in sizes:
+        content = generate_export_text(size)
+        repeat = repeats_for(size)
+        results.append(result("preprocess_chat_content", timed(engine.preprocess_chat_content, content, repeat=repeat),
+                              size))
+        results.append(result("is_whatsapp_export", timed(engine.is_whatsapp_export, content, repeat=repeat), size))
+
+        lines = [line.strip() for line in content.split("\n") if line.strip()]
+        results.append(result("segment_technical", timed(segment_lines, lines, repeat=repeat), size, len(lines)))
+    return results
+
+
+def bench_response_parsing(count: int = 10_000):
+    responses = [CANNED_RESPONSE.replace("Shared Goal", f"Shared Goal {index}") for index in range(count)]
+    parse = lambda: [engine.parse_conflict_response(response) for response in responses]  # noqa: E731
+    json_responses = [CANNED_JSON_RESPONSE.replace("Shared Goal", f"Shared Goal {index}") for index in range(count)]
+    validate = lambda: [validate_analysis(response) for response in json_responses]  # noqa: E731
+    return [result("parse_conflict_response", timed(parse), items=count),
+            result("validate_analysis", timed(validate), items=count)]
+
+
+def bench_files(sizes, directory):
+    results = []
+    for size in sizes:
+        path = os.path.join(directory, f"export_{format_size(size)}.txt")
+        write_export_file(path, size)
+        results.append(result("read_conversation_file", timed(engine.read_conversation_file, path,
+                                                               repeat=repeats_for(size)), size))
+        os.remove(path)
+    return results
+
+
+def bench_handlers(directory, latency: float, requests: int):
+    """End-to-end latency of the three UI handlers against the local mock endpoint"""
+    server = start_mock_server(latency=latency)
+    engine.REMOTE_BACKEND.url = completion_url(server)
+    engine.TOGETHER_API_KEY = "mock-key"
+    path = os.path.join(directory, "upload.txt")
+    size = 1024 ** 2
+    write_export_file(path, size)
+    try:
+        return [
+            result("process_conversation", timed(engine.process_conversation, CONVERSATION, repeat=requests)),
+            result("process_pov", timed(engine.process_pov, POV_A, POV_B, repeat=requests)),
+            result("process_uploaded_file", timed(engine.process_uploaded_file, path, repeat=requests), size),
+        ]
+    finally:
+        server.shutdown()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def compare(baseline_path: str, current, threshold: float) -> int:
+    """Print per-benchmark ratios against a baseline file and return how many regressed"""
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = {(entry["name"], entry["size_bytes"]): entry for entry in json.load(baseline_file)["results"]}
+    regressions = 0
+    print(f"\ncompared with {baseline_path} (regression threshold {threshold:.0%})")
+    for entry in current:
+        previous = baseline.get((entry["name"], entry["size_bytes"]))
+        if previous is None:
+            continue
+        ratio = entry["best_s"] / previous["best_s"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        size = format_size(entry["size_bytes"]) if entry["size_bytes"] else ""
+        print(f"{entry['name']:<32} {size:>7}  {ratio:6.2f}x  {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1KB", "100KB", "1MB", "10MB"],
+                        help="in-memory export sizes for the text benchmarks")
+    parser.add_argument("--file-sizes", nargs="+", default=["1MB", "5MB", "10MB", "100MB"],
+                        help="on-disk export sizes for read_conversation_file, e.g. 500MB")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock upstream latency in seconds")
+    parser.add_argument("--requests", type=int, default=20, help="end-to-end requests per handler")
+    parser.add_argument("--skip-handlers", action="store_true", help="skip the end-to-end handler runs")
+    parser.add_argument("-o", "--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    results = bench_text([parse_size(size) for size in args.sizes])
+    results += bench_response_parsing()
+    with tempfile.TemporaryDirectory() as directory:
+        results += bench_files([parse_size(size) for size in args.file_sizes], directory)
+        if not args.skip_handlers:
+            results += bench_handlers(directory, args.latency, args.requests)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Synthetic WhatsApp exports for benchmarks, from a few KB to hundreds of MB.
+
+Exports mix both date orders (MM/DD/YYYY and DD-MM-YY), 12 and 24 hour clocks,
+multi-line messages, media placeholders, system notices and LaTeX/code blobs.
+Output only depends on the seed and target size, so runs are comparable.
+"""
+import io
+import random
+from typing import Iterator, TextIO
+
+SENDERS = ["Alice", "Bob Kumar", "Chitra", "Dev", "+91 98765 43210", "Esha", "Farhan", "Grace O'Neil"]
+BODIES = [
+    "I can't believe you said that in front of everyone",
+    "Can we talk about this later?",
+    "ok",
+    "You always do this, every single time",
+    "Why didn't you tell me earlier??",
+    "I said sorry already, what else do you want",
+    "lol 😂",
+    "Running 10 min late, start without me",
+    "That's not fair and you know it",
+    "Fine. Whatever.",
+]
+MEDIA = ["<Media omitted>", "image omitted", "This message was deleted", "You deleted this message"]
+NOTICES = [
+    "Messages and calls are end-to-end encrypted. No one outside of this chat can read them. Learn more",
+    "Dev joined using this group's invite link",
+    "Chitra left the group",
+    "Your security code with Esha changed. Tap to learn more",
+]
+CONTINUATIONS = [
+    "and another thing",
+    "seriously though",
+    "I mean it this time",
+    "# not a comment, just emphasis",
+]
+BLOBS = [
+    "\\begin{document} \\section{Results} $$\\sum_{i=1}^{n} x_i$$ \\end{document}",
+    "import numpy as np\ndef score(x):\n    return np.mean(x)",
+    "```python\nfor row in rows:\n    print(row)\n```",
+]
+PROMOS = ["Use my referral code for cashback https://example.com", "Get 50% off, apply code SAVE50"]
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """'1KB', '500MB' or a plain byte count"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit, factor in reversed(list(SIZE_UNITS.items())):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return f"{size}B"
+
+
+def iter_export_lines(seed: int = 7) -> Iterator[str]:
+    """Endless stream of export lines"""
+    rng = random.Random(seed)
+    yield "12/01/2020, 9:00 am - " + NOTICES[0]
+    while True:
+        day = rng.randint(1, 28)
+        month = rng.randint(1, 12)
+        minute = rng.randint(0, 59)
+        if rng.random() < 0.5:
+            stamp = f"{month}/{day}/2021, {rng.randint(1, 12)}:{minute:02d} {rng.choice(['am', 'pm'])}"
+        else:
+            stamp = f"{day:02d}-{month:02d}-21, {rng.randint(0, 23):02d}:{minute:02d}"
+
+        roll = rng.random()
+        if roll < 0.03:
+            yield f"{stamp} - {rng.choice(NOTICES)}"
+            continue
+        if roll < 0.10:
+            body = rng.choice(MEDIA)
+        elif roll < 0.12:
+            body = rng.choice(PROMOS)
+        elif roll < 0.14:
+            body = rng.choice(BLOBS) * rng.choice([1, 20])
+        else:
+            body = rng.choice(BODIES)
+        yield f"{stamp} - {rng.choice(SENDERS)}: {body}"
+
+        while rng.random() < 0.2:
+            yield rng.choice(CONTINUATIONS)
+
+
+def write_export(out: TextIO, size: int, seed: int = 7) -> int:
+    """Write roughly `size` bytes (never more) of export lines to a text stream, return bytes written"""
+    written = 0
+    buffer = []
+    buffered = 0
+    for line in iter_export_lines(seed):
+        cost = len(line.encode("utf-8")) + 1
+        if written + buffered + cost > size:
+            break
+        buffer.append(line)
+        buffered += cost
+        if buffered >= 1024 * 1024:
+            out.write("\n".join(buffer) + "\n")
+            written += buffered
+            buffer = []
+            buffered = 0
+    if buffer:
+        out.write("\n".join(buffer) + "\n")
+        written += buffered
+    return written
+
+
+def generate_export_text(size: int, seed: int = 7) -> str:
+    """In-memory export of roughly `size` bytes"""
+    out = io.StringIO()
+    write_export(out, size, seed)
+    return out.getvalue()
+
+
+def write_export_file(path: str, size: int, seed: int = 7) -> int:
+    with open(path, "w", encoding="utf-8") as out:
+        return write_export(out, size, seed)
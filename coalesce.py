@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import weakref
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from metrics import Counter
+
+COALESCED_CALLS = Counter("llm_coalesced_calls_total",
+                          "Upstream calls saved by sharing an identical in-flight request", ["mode"])
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Let concurrent threads asking for the same key share one call and its result or exception"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], str]) -> str:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_CALLS.inc(("sync",))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _SharedStream:
+    """Chunks of one upstream stream, replayed to every subscriber that joins while it runs"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class AsyncSingleFlight:
+    """Share in-flight coroutine calls and streams between tasks of one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+
+    async def do(self, key: str, func: Callable[[], "asyncio.Future"]) -> str:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(func())
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._forget_call(key, task))
+        else:
+            COALESCED_CALLS.inc(("async",))
+
+        self._waiters[key] += 1
+        try:
+            # Shielded so one cancelled caller does not cancel the call for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._calls.get(key) is task and self._waiters[key] == 1:
+                task.cancel()  # Nobody else is waiting for it
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget_call(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+
+    async def stream(self, key: str, func: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the chunks of func(), running it once for all concurrent subscribers of key"""
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._produce(key, shared, func))
+        else:
+            COALESCED_CALLS.inc(("stream",))
+
+        shared.subscribers += 1
+        try:
+            async for chunk in shared.subscribe():
+                yield chunk
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.finished:
+                # Last listener left (closed tab, cancelled event): stop the upstream call
+                shared.task.cancel()
+                self._forget_stream(key, shared)
+
+    async def _produce(self, key: str, shared: _SharedStream, func: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in func():
+                shared.publish(chunk)
+        except asyncio.CancelledError:
+            shared.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            shared.finish(e)
+        else:
+            shared.finish()
+        finally:
+            self._forget_stream(key, shared)
+
+    def _forget_stream(self, key: str, shared: _SharedStream):
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+
+_single_flight = SingleFlight()
+_async_single_flights = weakref.WeakKeyDictionary()
+
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
+
+
+def get_async_single_flight() -> AsyncSingleFlight:
+    """Return the coalescing layer for the running event loop"""
+    # Futures and tasks are bound to the loop that created them
+    loop = asyncio.get_running_loop()
+    single_flight = _async_single_flights.get(loop)
+    if single_flight is None:
+        single_flight = _async_single_flights[loop] = AsyncSingleFlight()
+    return single_flight
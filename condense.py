@@ -0,0 +1,148 @@
+import os
+import re
+import zlib
+from collections import deque
+from typing import Iterable, Iterator, List
+
+# Condensation settings (overridable from the environment)
+MODEL_CONTEXT_TOKENS = int(os.environ.get("MODEL_CONTEXT_TOKENS", "8192"))  # Context window of the analysis model
+COMPLETION_TOKENS = int(os.environ.get("COMPLETION_TOKENS", "600"))  # Reserved for the answer
+PROMPT_OVERHEAD_TOKENS = 1024  # System prompt, template and an earlier analysis around the conversation
+PROMPT_TOKEN_BUDGET = int(os.environ.get(
+    "PROMPT_TOKEN_BUDGET", str(MODEL_CONTEXT_TOKENS - COMPLETION_TOKENS - PROMPT_OVERHEAD_TOKENS)))  # Conversation tokens sent to the model
+CONDENSE_RECENCY_HALF_LIFE = float(os.environ.get("CONDENSE_RECENCY_HALF_LIFE", "5000"))  # In messages
+CONFLICT_MARKER_WEIGHT = 1.0
+REPLY_DENSITY_WEIGHT = 1.0
+REPLY_DENSITY_SPAN = 6  # Recent messages considered for reply density
+CHARS_PER_TOKEN = 4  # Rough average for English chat text with Llama tokenizers
+CHUNK_TOKEN_BUDGET = int(os.environ.get("CHUNK_TOKEN_BUDGET", "1500"))  # Per chunk in long conversation mode
+CHUNK_BOUNDARY_MODULUS = 8  # A content-defined cut every 8 lines on average once a chunk is half full
+
+# Matched against lowercased text, which is much faster than re.IGNORECASE. The lookahead
+# on the markers' first characters lets most positions fail before the alternation is tried.
+_CONFLICT_MARKER_RE = re.compile(
+    r"(?=[abcdefhilnpsuw!?])(?:\b(?:why|never|always|sorry|fault|blame|angry|upset|hurt|unfair|seriously|whatever|"
+    r"stop|wrong|lie[ds]?|lying|promised?|ignored?|ignoring|annoy(?:ed|ing)?|disrespect(?:ful)?|excuses?|"
+    r"can'?t believe|how dare)\b|[!?]{2,})"
+)
+_SENDER_RE = re.compile(r'^([^:\n]{1,40}):')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate, no tokenizer needed"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class MessageScorer:
+    """Score conversation lines one at a time by conflict markers and reply density"""
+
+    def __init__(self, span: int = REPLY_DENSITY_SPAN):
+        self._switches = deque(maxlen=span)
+        self._switch_count = 0
+        self._previous_sender = None
+
+    def score(self, line: str) -> float:
+        match = _SENDER_RE.match(line)
+        sender = match.group(1) if match else None
+        switched = sender is not None and self._previous_sender is not None and sender != self._previous_sender
+        if sender is not None:
+            self._previous_sender = sender
+
+        # Running count of speaker changes over the last few messages
+        if len(self._switches) == self._switches.maxlen:
+            self._switch_count -= self._switches[0]
+        self._switches.append(switched)
+        self._switch_count += switched
+        density = self._switch_count / len(self._switches)
+
+        markers = min(3, len(_CONFLICT_MARKER_RE.findall(line.lower())))
+        return 1.0 + CONFLICT_MARKER_WEIGHT * markers + REPLY_DENSITY_WEIGHT * density
+
+
+def select_window(lines: Iterable[str], budget: int = PROMPT_TOKEN_BUDGET,
+                  half_life: float = CONDENSE_RECENCY_HALF_LIFE) -> List[str]:
+    """Pick the contiguous run of lines with the highest score that fits the token budget"""
+    # Single pass with two pointers. Older windows lose value as newer lines
+    # arrive, which favours recent arguments without knowing the total length
+    # up front, so lines can come straight from a streaming parser.
+    decay = 0.5 ** (1.0 / half_life)
+    max_chars = budget * CHARS_PER_TOKEN
+    scorer = MessageScorer()
+
+    kept = []  # Lines from the start of the best window on
+    base = 0  # Position of kept[0] among all lines
+    window_costs = deque()
+    window_start = 0
+    window_tokens = 0
+    window_score = 0.0
+    best_start = best_end = 0
+    best_score = 0.0
+
+    for index, line in enumerate(lines):
+        if len(line) > max_chars:
+            line = line[:max_chars]
+        tokens = estimate_tokens(line)
+        score = scorer.score(line)
+
+        kept.append(line)
+        window_costs.append((tokens, score))
+        window_tokens += tokens
+        window_score += score
+        while window_tokens > budget:
+            old_tokens, old_score = window_costs.popleft()
+            window_start += 1
+            window_tokens -= old_tokens
+            window_score -= old_score
+
+        best_score *= decay
+        if window_score >= best_score:
+            best_score = window_score
+            best_start, best_end = window_start, index + 1
+            # Lines before the best window are never needed again; dropping them in halves keeps this linear
+            if best_start - base > len(kept) // 2:
+                del kept[:best_start - base]
+                base = best_start
+
+    return kept[best_start - base:best_end - base]
+
+
+def condense_lines(lines: Iterable[str], budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Condense rendered conversation lines into one prompt-ready string"""
+    return ' '.join(select_window(lines, budget))
+
+
+def condense_text(text: str, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Condense pasted conversation text, leaving it untouched when it already fits"""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = (line.strip() for line in text.split('\n'))
+    return '\n'.join(select_window((line for line in lines if line), budget))
+
+
+def iter_chunks(lines: Iterable[str], max_tokens: int = CHUNK_TOKEN_BUDGET) -> Iterator[List[str]]:
+    """Group lines into token-bounded chunks whose boundaries depend only on nearby content"""
+    # Cutting after lines whose hash hits the modulus (rather than every N
+    # tokens from the start) keeps earlier chunks byte-identical when an export
+    # grows or is read from a different offset, so their summaries are reused.
+    min_tokens = max_tokens // 2
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunk = []
+    chunk_tokens = 0
+    for line in lines:
+        if len(line) > max_chars:
+            line = line[:max_chars]
+        tokens = estimate_tokens(line)
+        if chunk and chunk_tokens + tokens > max_tokens:
+            yield chunk
+            chunk = []
+            chunk_tokens = 0
+
+        chunk.append(line)
+        chunk_tokens += tokens
+        if chunk_tokens >= min_tokens and zlib.crc32(line.encode('utf-8', 'surrogatepass')) % CHUNK_BOUNDARY_MODULUS == 0:
+            yield chunk
+            chunk = []
+            chunk_tokens = 0
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,64 @@
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Tuple
+
+
+class Message:
+    """One parsed chat message, as handed out by Conversation"""
+    __slots__ = ('sender_id', 'timestamp', 'text')
+
+    def __init__(self, sender_id: int, timestamp: str, text: str):
+        self.sender_id = sender_id
+        self.timestamp = timestamp
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"Message(sender_id={self.sender_id!r}, timestamp={self.timestamp!r}, text={self.text!r})"
+
+
+class Conversation:
+    """Parsed chat stored column-wise, with sender names interned to small integer IDs"""
+    __slots__ = ('senders', '_sender_ids', 'sender_column', 'timestamps', 'texts')
+
+    def __init__(self):
+        self.senders: List[str] = []  # Sender ID -> name, in order of first appearance
+        self._sender_ids = {}
+        self.sender_column = array('I')
+        self.timestamps: List[str] = []
+        self.texts: List[str] = []
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, str, str]]) -> "Conversation":
+        """Build a conversation from (sender, timestamp, text) tuples"""
+        conversation = cls()
+        for sender, timestamp, text in records:
+            conversation.append(sender, timestamp, text)
+        return conversation
+
+    def sender_id(self, sender: str) -> int:
+        sender_id = self._sender_ids.get(sender)
+        if sender_id is None:
+            sender_id = len(self.senders)
+            self._sender_ids[sender] = sender_id
+            self.senders.append(sys.intern(sender))
+        return sender_id
+
+    def append(self, sender: str, timestamp: str, text: str):
+        self.sender_column.append(self.sender_id(sender))
+        self.timestamps.append(timestamp)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> Message:
+        return Message(self.sender_column[index], self.timestamps[index], self.texts[index])
+
+    def __iter__(self) -> Iterator[Message]:
+        return map(Message, self.sender_column, self.timestamps, self.texts)
+
+    def records(self) -> Iterator[Tuple[str, str, str]]:
+        """(sender, timestamp, text) tuples, as the streaming parsers produce them"""
+        senders = self.senders
+        for sender_id, timestamp, text in zip(self.sender_column, self.timestamps, self.texts):
+            yield senders[sender_id], timestamp, text
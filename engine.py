@@ -0,0 +1,1131 @@
+import asyncio
+import io
+import itertools
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import metrics
+from coalesce import get_async_single_flight, get_single_flight
+from llm_client import get_client
+from backends import (BackendError, HedgedStream, RemoteBackend, complete_hedged, complete_hedged_async,
+                      get_fallback_backend, register_backend)
+from microbatch import get_batched_backend
+from response_cache import completion_cache_key, get_response_cache
+from condense import COMPLETION_TOKENS, PROMPT_TOKEN_BUDGET, condense_lines, condense_text, estimate_tokens, iter_chunks
+from conversation import Conversation
+from filters import FILTER_BATCH_SIZE, configured_rule_sets
+from formats import FORMAT_SNIFF_CHARS, DetectedFormat, detect_format
+from incremental import (FINGERPRINT_MESSAGES, AnalysisState, ParseTracker, SenderMap, boundary_digest, get_state_store,
+                         prefix_fingerprint)
+from parsers import get_parser, register_parser
+from redaction import NameRedactor
+from prompts import STRUCTURED_TEMPLATE_VERSION, SYSTEM_PROMPT, PromptTemplate, get_template, iter_templates
+from segmenter import TechnicalSegmenter, collapse_technical
+from scheduler import LANE_BULK, LANE_INTERACTIVE, QueuePosition, admitted_call, get_scheduler
+from structured import ANALYSIS_FORMAT, ANALYSIS_SCHEMA, FormatError, JsonAnalysisStream, extract_fields, validate_analysis
+
+# Together AI API Configuration
+TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY", "your_together_ai_api_key_here")
+TOGETHER_API_URL = os.environ.get("TOGETHER_API_URL", "https://api.together.xyz/v1/chat/completions")
+TOGETHER_BATCH_URL = os.environ.get("TOGETHER_BATCH_URL", "")  # Prompt-list completions endpoint for micro-batches, empty derives it
+REMOTE_BACKEND = register_backend(RemoteBackend("together", TOGETHER_API_URL, batch_url=TOGETHER_BATCH_URL))
+
+# File ingestion settings
+FILE_ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1']
+FILE_CHUNK_SIZE = 64 * 1024  # Characters decoded per read
+FILE_TAIL_BYTES = int(os.environ.get("FILE_TAIL_BYTES", str(4 * 1024 * 1024)))  # Only the latest part of huge exports is condensed
+FILE_TAIL_ALIGN = 1024 * 1024  # Tail start moves in 1 MB steps so growing exports parse the same way
+REDACT_MESSAGE_NAMES = os.environ.get("REDACT_MESSAGE_NAMES", "1") == "1"  # Also replace participants' names and numbers inside messages
+
+# Long conversation (map-reduce) mode
+LONG_CHAT_MAX_CHUNKS = int(os.environ.get("LONG_CHAT_MAX_CHUNKS", "16"))  # Most recent chunks summarized
+LONG_CHAT_WORKERS = int(os.environ.get("LONG_CHAT_WORKERS", "4"))  # Concurrent chunk summary calls
+
+# Streaming settings
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1") == "1"  # Fill the result boxes as tokens arrive
+
+# Structured output settings
+STRUCTURED_OUTPUT = os.environ.get("STRUCTURED_OUTPUT", "1") == "1"  # Ask JSON-capable backends for a JSON analysis
+
+# WhatsApp system notices stripped from exports before parsing and promotional
+# messages dropped while parsing, compiled from the rule packs of filter_rules.json.
+# System rules are removed in config order, as the legacy list was: a later notice
+# only sees what earlier removals left behind.
+FILTER_RULES = configured_rule_sets()
+SYSTEM_RULES = FILTER_RULES["system"]
+PROMOTIONAL_RULES = FILTER_RULES["promotional"]
+SYSTEM_MESSAGES = SYSTEM_RULES.keywords
+PROMOTIONAL_KEYWORDS = tuple(PROMOTIONAL_RULES.keywords)
+
+# Precompiled once at import time instead of on every call
+# Characters re.IGNORECASE treats as ASCII letters although str.lower() does not
+_CASEFOLD_EXCEPTIONS = ('\u0131', '\u017f')
+
+# Line layouts per detected format. Groups are the timestamp parts (if any),
+# then the sender, then the message.
+# Pattern: MM/DD/YYYY or DD-MM-YYYY, HH:MM [AM/PM] - Name: Message
+WHATSAPP_LINE_RE = re.compile(
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}),?\s*(\d{1,2}:\d{2}(?:\s*[ap]m)?)\s*-\s*([^:]+):\s*(.+)',
+    re.IGNORECASE
+)
+# Pattern: [DD/MM/YY, HH:MM:SS [AM/PM]] Name: Message (iOS may prefix a left-to-right mark)
+WHATSAPP_IOS_LINE_RE = re.compile(
+    r'\u200e?\[(\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}),?\s+(\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?\s?m\.?)?)\]\s*([^:]+):\s*(.+)',
+    re.IGNORECASE
+)
+# Pattern: [any timestamp] Name: Message
+BRACKETED_LINE_RE = re.compile(r'\[([^\]]{4,40})\]\s*([^:\[\]]{1,40}):\s*(.+)')
+# Pattern: Name: Message
+NAME_TEXT_LINE_RE = re.compile(r'([^:/\[\]]{1,40}?):\s+(.+)')
+LINE_FORMAT_PATTERNS = {
+    "whatsapp_android": WHATSAPP_LINE_RE,
+    "whatsapp_ios": WHATSAPP_IOS_LINE_RE,
+    "bracketed": BRACKETED_LINE_RE,
+    "name_text": NAME_TEXT_LINE_RE,
+}
+
+def strip_system_messages(content: str) -> str:
+    """Remove WhatsApp system notices in a single scan of the content"""
+    # Scanning a lowercased copy case-sensitively is much faster than an
+    # IGNORECASE alternation. It is only equivalent when lowering keeps every
+    # offset and none of the characters re folds differently are present.
+    lowered = content.lower()
+    if len(lowered) != len(content) or any(ch in content for ch in _CASEFOLD_EXCEPTIONS):
+        lowered = None
+        hits = (match.start() for match in SYSTEM_RULES.pattern.finditer(content))
+    else:
+        hits = SYSTEM_RULES.hit_positions(lowered)
+    # None of the notices span a newline and removing them never removes one,
+    # so only lines with a hit need the ordered per-notice pass.
+    line_starts = sorted({content.rfind('\n', 0, pos) + 1 for pos in hits})
+    if not line_starts:
+        return content
+
+    pieces = []
+    pos = 0
+    for start in line_starts:
+        end = content.find('\n', start)
+        if end == -1:
+            end = len(content)
+        line = SYSTEM_RULES.remove(content[start:end], None if lowered is None else lowered[start:end])
+        pieces.append(content[pos:start])
+        pieces.append(line)
+        pos = end
+
+    pieces.append(content[pos:])
+    return ''.join(pieces)
+
+def iter_whatsapp_messages(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    """Yield (sender, timestamp, text) for each WhatsApp message as soon as it is complete"""
+    return iter_line_messages(lines, WHATSAPP_LINE_RE)
+
+def iter_line_messages(lines: Iterable[str], line_re: re.Pattern) -> Iterator[Tuple[str, str, str]]:
+    """Yield (sender, timestamp, text) for each message of a line-oriented chat layout"""
+    current = None  # (sender, timestamp, [message, continuation lines...])
+    match_line = line_re.match
+    segmenter = TechnicalSegmenter()  # Code, LaTeX, HTML and stack traces become placeholders
+    lines = iter(lines)
+    
+    while True:
+        batch = []
+        for line in itertools.islice(lines, FILTER_BATCH_SIZE):
+            line = line.strip()
+            if line:
+                match = match_line(line)
+                batch.append((line, match.groups() if match else None))
+        if not batch:
+            break
+        # First lines of messages are checked for spam together, in one scan per batch
+        verdicts = iter(PROMOTIONAL_RULES.classify_batch([groups[-1].strip() for _, groups in batch if groups]))
+        
+        for line, groups in batch:
+            # Check if this is a new message
+            if groups:
+                # Emit previous message if it exists
+                if current:
+                    segmenter.finish(current[2])
+                    if current[2]:
+                        yield current[0], current[1], ' '.join(current[2])
+                
+                *stamp, sender, message = groups
+                rule = next(verdicts)
+                
+                # Clean sender name
+                sender = sender.strip()
+                
+                # Clean message content
+                message = message.strip()
+                
+                # Skip if message is empty or just whitespace
+                if not message:
+                    current = None
+                    continue
+                
+                # Skip promotional/spam messages
+                if rule is not None:
+                    PROMOTIONAL_RULES.record(rule, len(message))
+                    current = None
+                    continue
+                
+                current = (sender, ' '.join(stamp), [])
+                segmenter.feed(message, current[2])
+            elif current:
+                # A continuation of the previous message; technical spans
+                # may run on over many of them
+                segmenter.feed(line, current[2])
+    
+    # Emit the last message
+    if current:
+        segmenter.finish(current[2])
+        if current[2]:
+            yield current[0], current[1], ' '.join(current[2])
+
+def parse_whatsapp_messages(lines: Iterable[str]) -> Conversation:
+    """Parse WhatsApp export lines into a columnar Conversation"""
+    return Conversation.from_records(iter_whatsapp_messages(lines))
+
+def iter_conversation_lines(messages: Iterable[Tuple[str, str, str]], sender_map: Optional[dict] = None,
+                            redactor: Optional[NameRedactor] = None) -> Iterator[str]:
+    """Render streamed (sender, timestamp, text) messages as anonymized, whitespace-collapsed lines"""
+    if sender_map is None:
+        sender_map = {}  # For anonymization
+    for sender, _, text in messages:
+        # Anonymize sender names for privacy
+        anonymized_sender = anonymize_sender(sender, sender_map)
+        if redactor is not None:
+            redactor.add_participant(sender, anonymized_sender)  # Names in message bodies are replaced once all are known
+        # Texts are joined stripped lines, so splitting collapses whitespace as \s+ would, several times faster
+        yield f"{anonymized_sender}: {' '.join(text.split())}"
+
+def new_redactor(known: Iterable[Sequence] = ()) -> Optional[NameRedactor]:
+    """A redactor for one read of a conversation, None when redaction is turned off"""
+    return NameRedactor(known) if REDACT_MESSAGE_NAMES else None
+
+def redact(text: str, redactor: Optional[NameRedactor]) -> str:
+    """Replace the participants' names and phone numbers the parse found inside the text"""
+    return text if redactor is None else redactor.redact(text)
+
+def preprocess_chat_content(content: str) -> str:
+    """Enhanced WhatsApp chat preprocessing with better message parsing"""
+    if not content or not content.strip():
+        return ""
+    
+    with metrics.stage("preprocess"):
+        # Remove system messages first
+        content = strip_system_messages(content)
+        
+        # Rendered like streamed uploads, so labels and whitespace follow the same rules
+        conversation = parse_whatsapp_messages(content.split('\n'))
+        return ' '.join(iter_conversation_lines(conversation.records())).strip()
+
+def is_promotional_message(message: str) -> bool:
+    """Check if message is promotional/spam content"""
+    return PROMOTIONAL_RULES.match(message) is not None
+
+def anonymize_sender(sender: str, sender_map: dict) -> str:
+    """Anonymize sender names for privacy while maintaining conversation flow"""
+    if not sender:
+        return "Unknown"
+    # Generate consistent anonymized names
+    if sender not in sender_map:
+        sender_id = len(sender_map) + 1
+        sender_map[sender] = f"Person {sender_id}"
+    
+    return sender_map[sender]
+
+def structured_output_enabled() -> bool:
+    """Whether analyses are requested as JSON objects rather than the emoji-headed text format"""
+    return STRUCTURED_OUTPUT and REMOTE_BACKEND.supports_json
+
+def build_completion_request(prompt: str, system_prompt: str = None, structured: bool = False) -> Tuple[Dict[str, str], Dict]:
+    """Build the headers and JSON body for a chat completion request"""
+    headers = {
+        "Authorization": f"Bearer {TOGETHER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    
+    data = {
+        "model": "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+        "messages": messages,
+        "max_tokens": COMPLETION_TOKENS,  # Balanced for quality and speed
+        "temperature": 0.4,  # Balanced creativity and focus
+        "top_p": 0.8
+    }
+    if structured:
+        # Constrains the answer to the analysis object, so it parses without guessing
+        data["response_format"] = {"type": "json_object", "schema": ANALYSIS_SCHEMA}
+    return headers, data
+
+def request_tokens(data: Dict) -> int:
+    """Tokens a request may use against the per-minute limit: its prompt plus the completion cap"""
+    return sum(estimate_tokens(message["content"]) for message in data["messages"]) + data["max_tokens"]
+
+def is_cacheable(data: Dict, text: str) -> bool:
+    """A JSON answer that fails validation is not cached, so asking again gets a fresh one"""
+    if "response_format" not in data:
+        return True
+    try:
+        validate_analysis(text)
+    except FormatError:
+        return False
+    return True
+
+def fetch_completion(headers: Dict[str, str], data: Dict, cache_key: str, lane: str = LANE_INTERACTIVE) -> str:
+    """Send one completion request upstream and cache a successful answer"""
+    # Wait for room under the account's rate limits, interactive lane first
+    tokens = request_tokens(data)
+    get_scheduler().acquire(lane, tokens)
+    
+    # Remote model on the shared pooled session (timeouts, retries, circuit breaker),
+    # batched with concurrent requests when micro-batching is on, with the local
+    # model raced in when it is slow and used when it fails. Retries and the
+    # fallback wait for their own slots on the same lane.
+    try:
+        with metrics.stage("upstream"), admitted_call(lane, tokens):
+            completion = complete_hedged(get_batched_backend(REMOTE_BACKEND), get_fallback_backend(), data, headers)
+    except BackendError as e:
+        return str(e)
+    
+    if completion.backend == REMOTE_BACKEND.name and is_cacheable(data, completion.text):
+        get_response_cache().set(cache_key, completion.text)  # Only successful remote completions are cached
+    return completion.text
+
+def call_together_ai(prompt: str, system_prompt: str = None, lane: str = LANE_INTERACTIVE, structured: bool = False) -> str:
+    """Call Together AI API with optimized settings"""
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        return "⚠️ Invalid API Key: Please configure a valid Together AI API key."
+    
+    try:
+        headers, data = build_completion_request(prompt, system_prompt, structured)
+        
+        # Identical requests are answered from the cache without an API call
+        cache_key = completion_cache_key(data)
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Identical requests already in flight share that call instead
+        return get_single_flight().do(cache_key, lambda: fetch_completion(headers, data, cache_key, lane))
+            
+    except Exception as e:
+        return f"Error calling Together AI: {str(e)}"
+
+async def fetch_completion_async(headers: Dict[str, str], data: Dict, cache_key: str, lane: str = LANE_INTERACTIVE) -> str:
+    """Async variant of fetch_completion"""
+    tokens = request_tokens(data)
+    async for _ in get_scheduler().wait_turn(lane, tokens):
+        pass
+    
+    try:
+        with metrics.stage("upstream"), admitted_call(lane, tokens):
+            completion = await complete_hedged_async(get_batched_backend(REMOTE_BACKEND), get_fallback_backend(), data, headers)
+    except BackendError as e:
+        return str(e)
+    
+    if completion.backend == REMOTE_BACKEND.name and is_cacheable(data, completion.text):
+        get_response_cache().set(cache_key, completion.text)
+    return completion.text
+
+async def call_together_ai_async(prompt: str, system_prompt: str = None, lane: str = LANE_INTERACTIVE,
+                                 structured: bool = False) -> str:
+    """Async variant of call_together_ai that does not hold a worker thread while waiting"""
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        return "⚠️ Invalid API Key: Please configure a valid Together AI API key."
+    
+    try:
+        headers, data = build_completion_request(prompt, system_prompt, structured)
+        
+        cache_key = completion_cache_key(data)
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            return cached
+        
+        return await get_async_single_flight().do(cache_key, lambda: fetch_completion_async(headers, data, cache_key, lane))
+            
+    except Exception as e:
+        return f"Error calling Together AI: {str(e)}"
+
+async def stream_completion(headers: Dict[str, str], data: Dict, cache_key: str,
+                            lane: str = LANE_INTERACTIVE) -> AsyncIterator[Union[str, QueuePosition]]:
+    """Stream one completion from upstream; failures are yielded as one error string"""
+    received = []
+    try:
+        # Queue positions go out while waiting for a rate limit slot
+        tokens = request_tokens(data)
+        async for position in get_scheduler().wait_turn(lane, tokens):
+            yield position
+        
+        # A micro-batched answer arrives in one piece
+        stream = HedgedStream(get_batched_backend(REMOTE_BACKEND), get_fallback_backend(), data, headers)
+        with metrics.stage("upstream"), admitted_call(lane, tokens):
+            async for delta in stream.chunks():
+                received.append(delta)
+                yield delta
+    
+    except BackendError as e:
+        yield str(e)
+        return
+    except Exception as e:
+        yield f"Error calling Together AI: {str(e)}"
+        return
+    
+    text = ''.join(received)
+    if stream.backend == REMOTE_BACKEND.name and is_cacheable(data, text):
+        get_response_cache().set(cache_key, text)
+
+async def call_together_ai_stream(prompt: str, system_prompt: str = None, lane: str = LANE_INTERACTIVE,
+                                  structured: bool = False) -> AsyncIterator[Union[str, QueuePosition]]:
+    """Stream completion text as it is generated, preceded by queue positions while waiting in line; failures are yielded as one error string"""
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        yield "⚠️ Invalid API Key: Please configure a valid Together AI API key."
+        return
+    
+    headers, data = build_completion_request(prompt, system_prompt, structured)
+    
+    # Streamed and non-streamed requests share cache entries
+    cache_key = completion_cache_key(data)
+    cached = get_response_cache().get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    # Late joiners of an identical stream get the text so far, then the rest live
+    stream = get_async_single_flight().stream(cache_key, lambda: stream_completion(headers, data, cache_key, lane))
+    try:
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()  # Leave the shared stream now, not when garbage collected
+
+# Section header clean-up patterns for model responses
+_TITLE_HEADER_RE = re.compile(r'⚔️.*?:', re.IGNORECASE)
+_SUMMARY_HEADER_RE = re.compile(r'🔍.*?:', re.IGNORECASE)
+_RESOLUTION_HEADER_RE = re.compile(r'🤝.*?:', re.IGNORECASE)
+_LEADING_STARS_RE = re.compile(r'^\*+')
+_QUOTED_RE = re.compile(r'^"(.*)"$')
+_HEADER_EMOJI = ('⚔️', '🔍', '🤝')
+
+# Shown for a section the model left out
+FALLBACK_TITLE = "Communication Analysis"
+FALLBACK_SUMMARY = "The situation involves differing perspectives that require careful understanding and mediation."
+FALLBACK_RESOLUTION = "Focus on open communication, active listening, and finding common ground to move forward constructively."
+
+def with_fallbacks(title: str, summary: str, resolution: str) -> Tuple[str, str, str]:
+    """Fill empty sections with the canned fallbacks"""
+    return title or FALLBACK_TITLE, summary or FALLBACK_SUMMARY, resolution or FALLBACK_RESOLUTION
+
+class ConflictResponseParser:
+    """Incrementally route model output into the title, summary and resolution sections"""
+    
+    def __init__(self):
+        self.title = ""
+        self.summary = ""
+        self.resolution = ""
+        self.current_section = None
+        self._pending = ""  # Unterminated last line of a streamed response
+    
+    def feed_line(self, line: str):
+        """Consume one complete line of the response"""
+        line = line.strip()
+        if not line:
+            return
+        
+        # Check for section headers
+        lowered = line.lower()
+        if line.startswith('⚔️') or 'conflict title' in lowered:
+            self.current_section = 'title'
+            title = _TITLE_HEADER_RE.sub('', line).strip()
+            title = _LEADING_STARS_RE.sub('', title).strip()
+            self.title = _QUOTED_RE.sub(r'\1', title).strip()  # Remove quotes
+        elif line.startswith('🔍') or 'conflict summary' in lowered:
+            self.current_section = 'summary'
+            summary = _SUMMARY_HEADER_RE.sub('', line).strip()
+            self.summary = _LEADING_STARS_RE.sub('', summary).strip()
+        elif line.startswith('🤝') or 'conflict resolution' in lowered:
+            self.current_section = 'resolution'
+            resolution = _RESOLUTION_HEADER_RE.sub('', line).strip()
+            self.resolution = _LEADING_STARS_RE.sub('', resolution).strip()
+        elif self.current_section:
+            # Continue adding to current section
+            if self.current_section == 'title' and not self.title:
+                self.title = line.strip('"')
+            elif self.current_section == 'summary':
+                self.summary += ' ' + line if self.summary else line
+            elif self.current_section == 'resolution':
+                self.resolution += ' ' + line if self.resolution else line
+    
+    def feed(self, delta: str) -> Tuple[str, str, str]:
+        """Consume a streamed chunk and return the sections as they stand so far"""
+        lines = (self._pending + delta).split('\n')
+        self._pending = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+        return self.partial()
+    
+    def partial(self) -> Tuple[str, str, str]:
+        """Current sections including the unfinished line, without fallbacks"""
+        view = self
+        pending = self._pending.strip()
+        # Hold back a header until its colon arrives so its label never flashes up
+        if pending and not (pending.startswith(_HEADER_EMOJI) and ':' not in pending):
+            view = ConflictResponseParser()
+            view.title, view.summary, view.resolution = self.title, self.summary, self.resolution
+            view.current_section = self.current_section
+            view.feed_line(pending)
+        return (
+            view.title.replace('**', '').strip(),
+            view.summary.replace('**', '').strip(),
+            view.resolution.replace('**', '').strip()
+        )
+    
+    def sections(self) -> Tuple[str, str, str]:
+        """Final sections with formatting removed, empty where the response had none"""
+        if self._pending:
+            self.feed_line(self._pending)
+            self._pending = ""
+        
+        # Clean up any remaining formatting and remove **bold** markers
+        return (
+            self.title.replace('**', '').strip(),
+            self.summary.replace('**', '').strip(),
+            self.resolution.replace('**', '').strip()
+        )
+    
+    def result(self) -> Tuple[str, str, str]:
+        """Final sections with formatting removed and fallbacks applied"""
+        return with_fallbacks(*self.sections())
+
+def parse_conflict_response(response: str) -> Tuple[str, str, str]:
+    """Parse the AI response into title, summary, and resolution components"""
+    parser = ConflictResponseParser()
+    for line in response.split('\n'):
+        parser.feed_line(line)
+    return parser.result()
+
+def text_analysis(parser: ConflictResponseParser) -> Tuple[str, str, str]:
+    """Final analysis of a text-format response, counting answers that needed a fallback"""
+    sections = parser.sections()
+    ANALYSIS_FORMAT.inc(("text", "complete" if all(sections) else "incomplete"))
+    return with_fallbacks(*sections)
+
+def json_analysis(response: str) -> Tuple[str, str, str]:
+    """Validated analysis of a JSON-format response; raises FormatError"""
+    with metrics.stage("parse"):
+        result = validate_analysis(response)
+    ANALYSIS_FORMAT.inc(("json", "valid"))
+    return result
+
+def build_repair_prompt(response: str, error: FormatError) -> str:
+    """Build the one follow-up prompt that asks for a response that failed validation in the right format"""
+    return get_template("repair", STRUCTURED_TEMPLATE_VERSION).render(problem=str(error), response=response)
+
+def repaired_analysis(response: str, repaired: str) -> Tuple[str, str, str]:
+    """The analysis from the repair attempt, or what can be read from the original response"""
+    if not is_error_response(repaired):
+        try:
+            result = validate_analysis(repaired)
+        except FormatError:
+            pass
+        else:
+            ANALYSIS_FORMAT.inc(("json", "repaired"))
+            return result
+    ANALYSIS_FORMAT.inc(("json", "invalid"))
+    
+    # No second repair: keep any fields that did arrive, and read an answer
+    # in the text format (a backend that ignored JSON mode) the legacy way
+    fields = extract_fields(response)
+    if any(fields):
+        return with_fallbacks(*fields)
+    return parse_conflict_response(response)
+
+def analysis_template(name: str) -> PromptTemplate:
+    """Template of an analysis prompt, in the JSON version in structured output mode"""
+    return get_template(name, STRUCTURED_TEMPLATE_VERSION if structured_output_enabled() else None)
+
+def build_conversation_prompt(conversation_text: str) -> str:
+    """Build the analysis prompt for a pasted conversation"""
+    return analysis_template("conversation").render(conversation=conversation_text)
+
+def build_pov_prompt(person1_pov: str, person2_pov: str) -> str:
+    """Build the analysis prompt for two opposing points of view"""
+    return analysis_template("pov").render(person1=person1_pov, person2=person2_pov)
+
+def build_file_prompt(cleaned_content: str) -> str:
+    """Build the analysis prompt for cleaned file content"""
+    return analysis_template("file").render(content=cleaned_content)
+
+def build_update_prompt(previous: Tuple[str, str, str], new_content: str) -> str:
+    """Build the prompt that updates an earlier analysis with messages appended to the conversation"""
+    title, summary, resolution = previous
+    return analysis_template("update").render(title=title, summary=summary, resolution=resolution, content=new_content)
+
+def build_chunk_summary_prompt(chunk: str) -> str:
+    """Build the map-step prompt that summarizes one part of a long conversation"""
+    # No part numbers here: the prompt must only depend on the chunk so an
+    # unchanged chunk of a re-uploaded export hits the response cache
+    return get_template("chunk_summary").render(chunk=chunk)
+
+def build_long_conversation_prompt(summaries: List[str]) -> str:
+    """Build the reduce-step prompt from the ordered chunk summaries"""
+    numbered = '\n'.join(f"{index}. {summary.strip()}" for index, summary in enumerate(summaries, 1))
+    return analysis_template("long_conversation").render(summaries=numbered)
+
+def summarize_chunks(chunks: List[str]) -> List[str]:
+    """Map step: summarize chunks concurrently on a bounded thread pool, keeping their order"""
+    # Summaries are memoised by the response cache, so chunks already seen in
+    # an earlier upload of the same export do not reach the API again
+    with ThreadPoolExecutor(max_workers=LONG_CHAT_WORKERS) as pool:
+        return list(pool.map(lambda chunk: call_together_ai(build_chunk_summary_prompt(chunk), SYSTEM_PROMPT, LANE_BULK), chunks))
+
+def is_error_response(response: str) -> bool:
+    """Check whether a completion call returned an error string instead of model output"""
+    return "API Error" in response or "Error calling Together AI" in response
+
+def analysis_from_response(response: str) -> Tuple[str, str, str]:
+    """Turn a raw text-format model response (or API error string) into the three UI outputs"""
+    if is_error_response(response):
+        return "❌ API Error", response, "Please check your API key and try again."
+    
+    with metrics.stage("parse"):
+        parser = ConflictResponseParser()
+        for line in response.split('\n'):
+            parser.feed_line(line)
+        return text_analysis(parser)
+
+def analyze(prompt: str, lane: str = LANE_INTERACTIVE) -> Tuple[str, str, str]:
+    """Request an analysis and turn it into the three UI outputs, repairing a malformed JSON answer once"""
+    structured = structured_output_enabled()
+    response = call_together_ai(prompt, SYSTEM_PROMPT, lane, structured)
+    if not structured or is_error_response(response):
+        return analysis_from_response(response)
+    try:
+        return json_analysis(response)
+    except FormatError as error:
+        return repaired_analysis(response, call_together_ai(build_repair_prompt(response, error), SYSTEM_PROMPT, lane, True))
+
+async def analyze_async(prompt: str, lane: str = LANE_INTERACTIVE) -> Tuple[str, str, str]:
+    """Async variant of analyze"""
+    structured = structured_output_enabled()
+    response = await call_together_ai_async(prompt, SYSTEM_PROMPT, lane, structured)
+    if not structured or is_error_response(response):
+        return analysis_from_response(response)
+    try:
+        return json_analysis(response)
+    except FormatError as error:
+        repaired = await call_together_ai_async(build_repair_prompt(response, error), SYSTEM_PROMPT, lane, True)
+        return repaired_analysis(response, repaired)
+
+def queue_feedback(position: int) -> Tuple[str, str, str]:
+    """UI outputs shown while an analysis waits for a rate limit slot"""
+    if position <= 1:
+        return "⏳ You're next in line, your analysis will start in a moment...", "", ""
+    return f"⏳ You're in line (position {position}), your analysis will start shortly...", "", ""
+
+async def stream_analysis(prompt: str, lane: str = LANE_INTERACTIVE) -> AsyncIterator[Tuple[str, str, str]]:
+    """Yield the three UI outputs as they fill in, ending with the final parsed analysis"""
+    if not STREAM_RESPONSES:
+        yield await analyze_async(prompt, lane)
+        return
+    
+    structured = structured_output_enabled()
+    parser = JsonAnalysisStream() if structured else ConflictResponseParser()
+    last = None
+    async for delta in call_together_ai_stream(prompt, SYSTEM_PROMPT, lane, structured):
+        if isinstance(delta, QueuePosition):
+            yield queue_feedback(delta)
+            continue
+        # Error strings always arrive as a chunk of their own
+        if is_error_response(delta):
+            yield analysis_from_response(delta)
+            return
+        partial = parser.feed(delta)
+        if partial != last and any(partial):
+            last = partial
+            yield partial
+    
+    if not structured:
+        result = text_analysis(parser)
+    else:
+        try:
+            result = json_analysis(parser.text)
+        except FormatError as error:
+            # The partial fields stay on screen while the one repair call runs
+            repaired = await call_together_ai_async(build_repair_prompt(parser.text, error), SYSTEM_PROMPT, lane, True)
+            result = repaired_analysis(parser.text, repaired)
+    if result != last:
+        yield result
+
+@metrics.instrument_handler("conversation")
+def process_conversation(conversation_text: str) -> Tuple[str, str, str]:
+    """Process single conversation text and return conflict analysis"""
+    if not conversation_text or not conversation_text.strip():
+        return "⚠️ Please enter a conversation to analyze.", "", ""
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        return "⚠️ Please configure your Together AI API key in the code.", "", ""
+    
+    try:
+        # Keep long pastes inside the prompt budget
+        with metrics.stage("condense"):
+            conversation_text = condense_text(conversation_text)
+        return analyze(build_conversation_prompt(conversation_text))
+        
+    except Exception as e:
+        return "❌ Error analyzing conversation", f"An error occurred: {str(e)}", "Please try again or check your API configuration."
+
+@metrics.instrument_handler("conversation")
+async def process_conversation_async(conversation_text: str) -> AsyncIterator[Tuple[str, str, str]]:
+    """Async variant of process_conversation that pushes partial results to the Gradio queue"""
+    if not conversation_text or not conversation_text.strip():
+        yield "⚠️ Please enter a conversation to analyze.", "", ""
+        return
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        yield "⚠️ Please configure your Together AI API key in the code.", "", ""
+        return
+    
+    try:
+        with metrics.stage("condense"):
+            conversation_text = await asyncio.to_thread(condense_text, conversation_text)
+        async for update in stream_analysis(build_conversation_prompt(conversation_text)):
+            yield update
+        
+    except Exception as e:
+        yield "❌ Error analyzing conversation", f"An error occurred: {str(e)}", "Please try again or check your API configuration."
+
+@metrics.instrument_handler("pov")
+def process_pov(person1_pov: str, person2_pov: str) -> Tuple[str, str, str]:
+    """Process individual points of view and return conflict analysis"""
+    if not person1_pov.strip() or not person2_pov.strip():
+        return "⚠️ Please enter both perspectives to analyze.", "", ""
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        return "⚠️ Please configure your Together AI API key in the code.", "", ""
+    
+    try:
+        return analyze(build_pov_prompt(person1_pov, person2_pov))
+        
+    except Exception as e:
+        return "❌ Error analyzing perspectives", f"An error occurred: {str(e)}", "Please try again or check your API configuration."
+
+@metrics.instrument_handler("pov")
+async def process_pov_async(person1_pov: str, person2_pov: str) -> AsyncIterator[Tuple[str, str, str]]:
+    """Async variant of process_pov that pushes partial results to the Gradio queue"""
+    if not person1_pov.strip() or not person2_pov.strip():
+        yield "⚠️ Please enter both perspectives to analyze.", "", ""
+        return
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        yield "⚠️ Please configure your Together AI API key in the code.", "", ""
+        return
+    
+    try:
+        async for update in stream_analysis(build_pov_prompt(person1_pov, person2_pov)):
+            yield update
+        
+    except Exception as e:
+        yield "❌ Error analyzing perspectives", f"An error occurred: {str(e)}", "Please try again or check your API configuration."
+
+@metrics.instrument_handler("file")
+def process_uploaded_file(file, long_mode: bool = False) -> Tuple[str, str, str]:
+    """Process uploaded conversation file and return conflict analysis"""
+    if file is None:
+        return "⚠️ Please upload a conversation file to analyze.", "", ""
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        return "⚠️ Please configure your Together AI API key in the code.", "", ""
+    
+    try:
+        # Gradio passes a path for type="filepath", older versions a tempfile wrapper
+        path = file if isinstance(file, str) else file.name
+        
+        if long_mode:
+            return process_long_conversation(path)
+        
+        # A grown re-upload of an analyzed export only sends the new messages
+        update = read_appended_conversation(path)
+        if update is not None:
+            state, tracker, new_content = update
+            if not new_content.strip():
+                return state.analysis
+            result = analyze(build_update_prompt(state.analysis, new_content), LANE_BULK)
+            if not result[0].startswith("❌"):
+                remember_analysis(path, tracker, result)
+            return result
+        
+        # Stream the file and keep the most relevant part that fits the prompt budget
+        tracker = ParseTracker()
+        cleaned_content = read_conversation_file(path, tracker=tracker)
+        
+        if cleaned_content is None:
+            return "❌ Error reading file", "Unable to decode file with supported encodings.", "Please upload a valid text file."
+        
+        if not cleaned_content.strip():
+            return "⚠️ No valid conversation content found in the file.", "", ""
+        
+        result = analyze(build_file_prompt(cleaned_content), LANE_BULK)
+        if not result[0].startswith("❌"):
+            remember_analysis(path, tracker, result)
+        return result
+        
+    except Exception as e:
+        return "❌ Error processing file", f"An error occurred: {str(e)}", "Please try again with a different file format."
+
+@metrics.instrument_handler("file")
+async def process_uploaded_file_async(file, long_mode: bool = False) -> AsyncIterator[Tuple[str, str, str]]:
+    """Async variant of process_uploaded_file that pushes partial results to the Gradio queue"""
+    if file is None:
+        yield "⚠️ Please upload a conversation file to analyze.", "", ""
+        return
+    
+    if TOGETHER_API_KEY == "your_together_ai_api_key_here":
+        yield "⚠️ Please configure your Together AI API key in the code.", "", ""
+        return
+    
+    try:
+        path = file if isinstance(file, str) else file.name
+        
+        if long_mode:
+            async for update in process_long_conversation_async(path):
+                yield update
+            return
+        
+        # File decoding and parsing are blocking, keep them off the event loop
+        appended = await asyncio.to_thread(read_appended_conversation, path)
+        if appended is not None:
+            state, tracker, new_content = appended
+            if not new_content.strip():
+                yield state.analysis
+                return
+            prompt = build_update_prompt(state.analysis, new_content)
+        else:
+            tracker = ParseTracker()
+            cleaned_content = await asyncio.to_thread(read_conversation_file, path, tracker=tracker)
+            
+            if cleaned_content is None:
+                yield "❌ Error reading file", "Unable to decode file with supported encodings.", "Please upload a valid text file."
+                return
+            
+            if not cleaned_content.strip():
+                yield "⚠️ No valid conversation content found in the file.", "", ""
+                return
+            prompt = build_file_prompt(cleaned_content)
+        
+        result = None
+        async for update in stream_analysis(prompt, LANE_BULK):
+            result = update
+            yield update
+        if result is not None and not result[0].startswith("❌"):
+            await asyncio.to_thread(remember_analysis, path, tracker, result)
+        
+    except Exception as e:
+        yield "❌ Error processing file", f"An error occurred: {str(e)}", "Please try again with a different file format."
+
+def process_long_conversation(path: str) -> Tuple[str, str, str]:
+    """Map-reduce analysis of a long conversation file: summarize chunks, then analyze the summaries"""
+    chunks = read_conversation_chunks(path)
+    
+    if chunks is None:
+        return "❌ Error reading file", "Unable to decode file with supported encodings.", "Please upload a valid text file."
+    
+    if not chunks:
+        return "⚠️ No valid conversation content found in the file.", "", ""
+    
+    summaries = summarize_chunks(chunks)
+    for summary in summaries:
+        if is_error_response(summary):
+            return analysis_from_response(summary)
+    
+    return analyze(build_long_conversation_prompt(summaries), LANE_BULK)
+
+async def process_long_conversation_async(path: str) -> AsyncIterator[Tuple[str, str, str]]:
+    """Async map-reduce analysis that reports progress while the chunks are summarized"""
+    chunks = await asyncio.to_thread(read_conversation_chunks, path)
+    
+    if chunks is None:
+        yield "❌ Error reading file", "Unable to decode file with supported encodings.", "Please upload a valid text file."
+        return
+    
+    if not chunks:
+        yield "⚠️ No valid conversation content found in the file.", "", ""
+        return
+    
+    # Map step on a bounded number of concurrent calls
+    semaphore = asyncio.Semaphore(LONG_CHAT_WORKERS)
+    
+    async def summarize(index: int, chunk: str) -> Tuple[int, str]:
+        async with semaphore:
+            return index, await call_together_ai_async(build_chunk_summary_prompt(chunk), SYSTEM_PROMPT, LANE_BULK)
+    
+    summaries = [None] * len(chunks)
+    tasks = [asyncio.ensure_future(summarize(index, chunk)) for index, chunk in enumerate(chunks)]
+    try:
+        for done, future in enumerate(asyncio.as_completed(tasks), 1):
+            index, summary = await future
+            if is_error_response(summary):
+                yield analysis_from_response(summary)
+                return
+            summaries[index] = summary
+            yield f"⏳ Summarized {done} of {len(chunks)} conversation parts...", "", ""
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    # Reduce step, streamed like the other analyses
+    async for update in stream_analysis(build_long_conversation_prompt(summaries), LANE_BULK):
+        yield update
+
+def is_whatsapp_export(content: str) -> bool:
+    """Check if the content looks like a WhatsApp export (only its first few KB are examined)"""
+    if not content:
+        return False
+    return detect_format(content).name.startswith("whatsapp")
+
+def basic_content_cleaning(content: str) -> str:
+    """Basic cleaning for non-WhatsApp files"""
+    if not content:
+        return ""
+    # Remove excessive whitespace
+    content = re.sub(r'\n\s*\n', '\n', content)
+    content = re.sub(r'\s+', ' ', content)
+    
+    # Remove common system messages or metadata
+    system_patterns = [
+        r'\[.*?\]',  # Remove bracketed timestamps/metadata
+        r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}',  # Remove detailed timestamps
+    ]
+    
+    for pattern in system_patterns:
+        content = re.sub(pattern, '', content)
+    
+    return content.strip()
+
+def iter_file_blocks(path: str, encoding: str, chunk_size: int = FILE_CHUNK_SIZE, start: int = 0) -> Iterator[str]:
+    """Decode a file incrementally from a byte offset and yield blocks of whole lines"""
+    with open(path, 'rb') as raw:
+        if start > 0:
+            raw.seek(start)
+            # Skip the partial line, b'\n' never occurs inside a multi-byte character. At most a
+            # chunk of it: past that, skip to the next character instead of to the end of the file.
+            if not raw.readline(chunk_size).endswith(b'\n'):
+                for _ in range(3):
+                    byte = raw.peek(1)[:1]
+                    if not byte or not 0x80 <= byte[0] < 0xC0:
+                        break
+                    raw.read(1)  # UTF-8 continuation byte
+        
+        # Text mode decodes incrementally and applies universal newlines, so
+        # only one chunk plus any unfinished line is held in memory at a time
+        f = io.TextIOWrapper(raw, encoding=encoding)
+        pending = ''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = pending + chunk
+            cut = chunk.rfind('\n')
+            if cut == -1:
+                # A line longer than a chunk is passed on in pieces instead of being held whole
+                pending = ''
+                yield chunk
+                continue
+            pending = chunk[cut + 1:]
+            yield chunk[:cut]
+        if pending:
+            yield pending
+
+def read_format_sample(path: str, encoding: str) -> str:
+    """The first few KB of a file, which is all format detection needs"""
+    with open(path, encoding=encoding) as f:
+        return f.read(FORMAT_SNIFF_CHARS)
+
+def iter_recent_blocks(path: str, encoding: str) -> Iterator[str]:
+    """Blocks of whole lines, only from the most recent part of huge files"""
+    tail_start = (os.path.getsize(path) - FILE_TAIL_BYTES) // FILE_TAIL_ALIGN * FILE_TAIL_ALIGN
+    return iter_file_blocks(path, encoding, start=max(0, tail_start))
+
+@register_parser(*LINE_FORMAT_PATTERNS)
+def parse_line_file(path: str, encoding: str, detected: DetectedFormat) -> Iterator[Tuple[str, str, str]]:
+    """Messages from a line-oriented chat layout (WhatsApp, bracketed logs, "Name: text")"""
+    return iter_block_messages(iter_recent_blocks(path, encoding), detected.name)
+
+def iter_block_messages(blocks: Iterable[str], format_name: str) -> Iterator[Tuple[str, str, str]]:
+    """Messages from blocks of whole lines in one of the line-oriented layouts"""
+    if format_name.startswith("whatsapp"):
+        # System notices never span lines, so stripping block by block is exact
+        blocks = map(strip_system_messages, blocks)
+    lines = (line for block in blocks for line in block.split('\n'))
+    return iter_line_messages(lines, LINE_FORMAT_PATTERNS[format_name])
+
+def filter_messages(messages: Iterable[Tuple[str, str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """Drop promotional messages and collapse technical spans, as the line parser does while parsing"""
+    messages = iter(messages)
+    while True:
+        batch = list(itertools.islice(messages, FILTER_BATCH_SIZE))
+        if not batch:
+            break
+        for message, rule in zip(batch, PROMOTIONAL_RULES.classify_batch([message[2] for message in batch])):
+            text = message[2]
+            if rule is not None:
+                PROMOTIONAL_RULES.record(rule, len(text))
+                continue
+            text = collapse_technical(text)
+            if text:
+                yield message[0], message[1], text
+
+def sample_fingerprint(sample: str, detected: DetectedFormat) -> Optional[str]:
+    """Fingerprint of a line-oriented conversation from its format sample, None for other formats"""
+    line_re = LINE_FORMAT_PATTERNS.get(detected.name)
+    if line_re is None:
+        return None
+    content = sample.rsplit('\n', 1)[0]  # The last sampled line may be cut short
+    if detected.name.startswith("whatsapp"):
+        content = strip_system_messages(content)
+    # The last message may go on past the sample, so it never counts
+    messages = list(itertools.islice(iter_line_messages(content.split('\n'), line_re), FINGERPRINT_MESSAGES + 1))
+    return prefix_fingerprint(messages[:-1])
+
+def iter_file_conversation(path: str, encoding: str, tracker: Optional[ParseTracker] = None,
+                           redactor: Optional[NameRedactor] = None) -> Iterator[str]:
+    """Yield cleaned conversation lines from a file, detecting its format from a prefix"""
+    sample = read_format_sample(path, encoding)
+    with metrics.stage("format_detection"):
+        detected = detect_format(sample)
+    
+    parser = get_parser(detected.name)
+    if parser is not None:
+        messages = parser(path, encoding, detected)
+        if detected.name not in LINE_FORMAT_PATTERNS:  # Line layouts are filtered while parsing
+            messages = filter_messages(messages)
+        sender_map = None
+        if tracker is not None:
+            # Remember enough to resume this parse when the export grows
+            tracker.fingerprint = sample_fingerprint(sample, detected)
+            tracker.encoding = encoding
+            tracker.format = detected.name
+            messages = tracker.track(messages)
+            sender_map = tracker.sender_map
+        yield from iter_conversation_lines(messages, sender_map, redactor)
+    else:
+        for block in iter_recent_blocks(path, encoding):
+            for line in block.split('\n'):
+                cleaned = basic_content_cleaning(line)
+                if cleaned:
+                    yield cleaned
+
+def read_conversation_file(path: str, budget: int = PROMPT_TOKEN_BUDGET,
+                           tracker: Optional[ParseTracker] = None) -> Optional[str]:
+    """Read a conversation file and condense it to the prompt token budget"""
+    # Decoding, cleaning and condensing are streamed together, so they are timed as one stage
+    with metrics.stage("file_read"):
+        for encoding in FILE_ENCODINGS:
+            try:
+                # Redacting the condensed text is cheap, and by then every participant is known,
+                # including those mentioned before their first message
+                redactor = new_redactor()
+                if tracker is not None:
+                    tracker.redactor = redactor
+                return redact(condense_lines(iter_file_conversation(path, encoding, tracker, redactor), budget), redactor)
+            except UnicodeDecodeError:
+                if tracker is not None:
+                    tracker.reset()
+                continue
+        return None
+
+def read_appended_conversation(path: str, budget: int = PROMPT_TOKEN_BUDGET) -> Optional[Tuple[AnalysisState, ParseTracker, str]]:
+    """Find an earlier analysis of this export and read only the messages added since, condensed"""
+    for encoding in FILE_ENCODINGS:
+        try:
+            sample = read_format_sample(path, encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+    
+    fingerprint = sample_fingerprint(sample, detect_format(sample))
+    if fingerprint is None:
+        return None
+    state = get_state_store().find(fingerprint, path)
+    if state is None or (REDACT_MESSAGE_NAMES and state.redaction is None):
+        return None  # Without the earlier participants, names in new messages could not all be redacted
+    
+    tracker = ParseTracker(state.chain, state.message_count, SenderMap.from_hashed(state.sender_map))
+    tracker.fingerprint = fingerprint
+    tracker.encoding = state.encoding
+    tracker.format = state.format
+    
+    # Resuming one byte early makes the partial-line skip land exactly on the first new line
+    blocks = iter_file_blocks(path, state.encoding, start=max(0, state.size - 1))
+    messages = tracker.track(iter_block_messages(blocks, state.format))
+    # Earlier participants are only known by their hashed names, which redact the new part all the same
+    redactor = new_redactor(state.redaction or ())
+    tracker.redactor = redactor
+    try:
+        new_content = condense_lines(iter_conversation_lines(messages, tracker.sender_map, redactor), budget)
+    except UnicodeDecodeError:
+        return None
+    new_content = redact(new_content, redactor)
+    return state, tracker, new_content
+
+def remember_analysis(path: str, tracker: ParseTracker, analysis: Tuple[str, str, str]):
+    """Store the parse state and analysis of a file so a grown re-upload can be updated incrementally"""
+    if tracker.fingerprint is None:
+        return
+    size = os.path.getsize(path)
+    get_state_store().save(AnalysisState(
+        fingerprint=tracker.fingerprint,
+        size=size,
+        boundary=boundary_digest(path, size),
+        encoding=tracker.encoding,
+        format=tracker.format,
+        chain=tracker.chain,
+        message_count=tracker.message_count,
+        sender_map=tracker.sender_map.hashed(),
+        analysis=tuple(analysis),
+        redaction=tracker.redactor.hashed_entries() if tracker.redactor is not None else None,
+    ))
+
+def read_conversation_chunks(path: str, max_chunks: int = LONG_CHAT_MAX_CHUNKS) -> Optional[List[str]]:
+    """Read a conversation file as token-bounded chunks, keeping only the most recent ones"""
+    with metrics.stage("file_read"):
+        for encoding in FILE_ENCODINGS:
+            try:
+                chunks = deque(maxlen=max_chunks)
+                redactor = new_redactor()
+                for chunk in iter_chunks(iter_file_conversation(path, encoding, redactor=redactor)):
+                    chunks.append(' '.join(chunk))
+                return [redact(chunk, redactor) for chunk in chunks]
+            except UnicodeDecodeError:
+                continue
+        return None
+
+def register_metrics_collectors():
+    """Expose response cache, circuit breaker and prompt template state, read only when /metrics is scraped"""
+    def cache_events():
+        stats = get_response_cache().stats()
+        return [({"event": event}, stats[event]) for event in ("hits", "disk_hits", "misses", "evictions")]
+    
+    def cache_entries():
+        return [({}, get_response_cache().stats()["entries"])]
+    
+    def breaker_state():
+        current = get_client().breaker.state
+        return [({"state": state}, float(state == current)) for state in ("closed", "open", "half-open")]
+    
+    def template_tokens():
+        return [({"template": template.name, "version": str(template.version)}, template.static_tokens)
+                for template in iter_templates()]
+    
+    metrics.REGISTRY.register_collector("response_cache_events_total", "counter", "Response cache lookups and evictions", cache_events)
+    metrics.REGISTRY.register_collector("response_cache_entries", "gauge", "Responses held in memory", cache_entries)
+    metrics.REGISTRY.register_collector("llm_circuit_state", "gauge", "Circuit breaker state (1 for the current one)", breaker_state)
+    metrics.REGISTRY.register_collector("prompt_template_static_tokens", "gauge", "Estimated tokens in the fixed part of each prompt template", template_tokens)
@@ -0,0 +1,215 @@
+import argparse
+import bisect
+import itertools
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from condense import CHARS_PER_TOKEN
+from metrics import Counter
+
+# Filter rule settings (overridable from the environment)
+FILTER_RULES_PATH = os.environ.get(
+    "FILTER_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "filter_rules.json"))
+FILTER_LOCALES = os.environ.get("FILTER_LOCALES", "")  # Comma-separated locale packs to load, empty loads them all
+FILTER_BATCH_SIZE = int(os.environ.get("FILTER_BATCH_SIZE", "512"))  # Messages classified per scan
+
+# Hits are messages dropped (promotional), notices cut out of a line (system) or
+# code, LaTeX, HTML and stack traces collapsed (technical, see segmenter.py);
+# tokens estimate what each rule kept out of the prompt. A rule that never hits
+# costs scan time for nothing, one that hits ordinary chat costs context.
+FILTER_HITS = Counter("message_filter_hits_total", "Filter rule hits, by rule set and rule", ["rule_set", "rule"])
+FILTER_TOKENS = Counter("message_filter_tokens_total", "Estimated prompt tokens removed, by rule set and rule",
+                        ["rule_set", "rule"])
+
+RULE_SETS = ("system", "promotional")
+
+
+class FilterRule(NamedTuple):
+    id: str  # "<locale>.<name>", the label its hits are counted under
+    keyword: Optional[str]  # As written in the config, None for a regex rule
+    lowered: Optional[str]  # The keyword lowercased
+    pattern: re.Pattern  # Case-insensitive, finds the rule in original or lowercased text
+
+
+class RuleSet:
+    """Rules of one set compiled into combined matchers: keywords are plain substring scans, regexes one alternation"""
+
+    def __init__(self, name: str, rules: Sequence[FilterRule]):
+        self.name = name
+        self.rules = tuple(rules)
+        self.keywords = [rule.keyword for rule in self.rules if rule.keyword is not None]
+        self._lowered_keywords = list(dict.fromkeys(rule.lowered for rule in self.rules if rule.lowered is not None))
+        # Keywords in other scripts are grouped by their first non-ASCII character and only
+        # searched for in text that has it, which an English chat (emoji and all) never does
+        self._ascii_keywords = [keyword for keyword in self._lowered_keywords if keyword.isascii()]
+        self._keywords_by_char: Dict[str, List[str]] = {}
+        for keyword in self._lowered_keywords:
+            if not keyword.isascii():
+                char = next(char for char in keyword if not char.isascii())
+                self._keywords_by_char.setdefault(char, []).append(keyword)
+        regexes = [rule.pattern.pattern for rule in self.rules if rule.keyword is None]
+        self.pattern = _compile_alternation(
+            [re.escape(rule.keyword) for rule in self.rules if rule.keyword is not None] + regexes, re.IGNORECASE)
+        self._regex = _compile_alternation(regexes, re.IGNORECASE) if regexes else None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, text: str) -> Optional[str]:
+        """Id of the first rule the text contains, in config order"""
+        return self._first_rule(text.lower())
+
+    def classify_batch(self, texts: Sequence[str]) -> List[Optional[str]]:
+        """Id of the first rule each text contains, or None, from one lowercased copy of the whole batch"""
+        verdicts: List[Optional[str]] = [None] * len(texts)
+        if not texts or not self.rules:
+            return verdicts
+        lowered = '\n'.join(texts).lower()
+        starts = list(itertools.accumulate((len(text) + 1 for text in texts[:-1]), initial=0))
+        if len(lowered) != starts[-1] + len(texts[-1]):
+            return [self.match(text) for text in texts]  # Lowering changed some lengths: offsets are unreliable
+
+        # Only texts with a hit are checked rule by rule, to name the rule
+        for index in {bisect.bisect_right(starts, pos) - 1 for pos in self.hit_positions(lowered)}:
+            verdicts[index] = self._first_rule(lowered[starts[index]:starts[index] + len(texts[index])])
+        return verdicts
+
+    def hit_positions(self, lowered: str) -> Iterator[int]:
+        """Where rules start in lowercased text, at most once per rule and line, in no particular order"""
+        # A substring scan per keyword is much faster than one alternation of them all,
+        # which sre can only try position by position. Rules never span a newline.
+        keywords = self._ascii_keywords
+        if not lowered.isascii():
+            keywords = keywords + [keyword for char, group in self._keywords_by_char.items() if char in lowered
+                                   for keyword in group]
+        for keyword in keywords:
+            pos = lowered.find(keyword)
+            while pos != -1:
+                yield pos
+                end = lowered.find('\n', pos + len(keyword))
+                pos = lowered.find(keyword, end) if end != -1 else -1
+        if self._regex is not None:
+            match = self._regex.search(lowered)
+            while match:
+                yield match.start()
+                end = lowered.find('\n', match.end())
+                match = self._regex.search(lowered, end) if end != -1 else None
+
+    def _first_rule(self, lowered: str) -> Optional[str]:
+        for rule in self.rules:
+            if rule.lowered is not None:
+                if rule.lowered in lowered:
+                    return rule.id
+            elif rule.pattern.search(lowered) is not None:
+                return rule.id
+        return None
+
+    def remove(self, line: str, line_lower: Optional[str] = None) -> str:
+        """Cut every rule's matches out of a line, one rule after another in config order"""
+        for rule in self.rules:
+            if line_lower is not None:
+                if rule.lowered is not None:
+                    if rule.lowered not in line_lower:
+                        continue
+                elif rule.pattern.search(line_lower) is None:
+                    continue
+            stripped = rule.pattern.sub('', line)
+            if stripped != line:
+                self.record(rule.id, len(line) - len(stripped))
+                line = stripped
+                if line_lower is not None:
+                    line_lower = line.lower()
+        return line
+
+    def record(self, rule_id: str, chars: int):
+        record_hit(self.name, rule_id, chars)
+
+
+def record_hit(rule_set: str, rule: str, chars: int):
+    """Count a hit of a rule that kept this many characters out of the prompt"""
+    FILTER_HITS.inc((rule_set, rule))
+    FILTER_TOKENS.inc((rule_set, rule), (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _compile_alternation(sources: List[str], flags: int = 0) -> re.Pattern:
+    if not sources:
+        return re.compile(r'(?!)')  # Matches nothing
+    return re.compile('|'.join(sources), flags)
+
+
+def _parse_rule(locale: str, entry: Dict, path: str) -> Iterator[FilterRule]:
+    rule_id = f"{locale}.{entry.get('id', '')}"
+    if not entry.get("id"):
+        raise ValueError(f"{path}: a {locale} rule has no id")
+    if "regex" in entry:
+        try:
+            pattern = re.compile(entry["regex"], re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"{path}: rule {rule_id} has an invalid regex: {e}") from None
+        yield FilterRule(rule_id, None, None, pattern)
+        return
+    keywords = entry.get("keywords")
+    if not keywords or not all(isinstance(keyword, str) and keyword for keyword in keywords):
+        raise ValueError(f"{path}: rule {rule_id} needs a regex or a list of non-empty keywords")
+    for keyword in keywords:
+        yield FilterRule(rule_id, keyword, keyword.lower(), re.compile(re.escape(keyword), re.IGNORECASE))
+
+
+def load_rule_sets(path: str = FILTER_RULES_PATH, locales: Iterable[str] = ()) -> Dict[str, RuleSet]:
+    """Compile the rule sets of a config file, from the requested locale packs (all when none are given)"""
+    with open(path, encoding="utf-8") as f:
+        packs = json.load(f)["locales"]
+    wanted = [locale for locale in locales if locale] or list(packs)
+    unknown = [locale for locale in wanted if locale not in packs]
+    if unknown:
+        raise ValueError(f"{path}: no locale pack named {', '.join(unknown)}")
+    rules: Dict[str, List[FilterRule]] = {name: [] for name in RULE_SETS}
+    for locale in wanted:
+        for name, entries in packs[locale].items():
+            if name not in rules:
+                continue  # Descriptions and sets this version does not apply
+            for entry in entries:
+                rules[name].extend(_parse_rule(locale, entry, path))
+    return {name: RuleSet(name, set_rules) for name, set_rules in rules.items()}
+
+
+def configured_rule_sets() -> Dict[str, RuleSet]:
+    """The rule sets selected by FILTER_RULES_PATH and FILTER_LOCALES"""
+    return load_rule_sets(FILTER_RULES_PATH, (locale.strip() for locale in FILTER_LOCALES.split(',')))
+
+
+def hit_report() -> List[Tuple[str, str, int, int]]:
+    """(rule set, rule, hits, tokens) counted so far, most tokens first"""
+    tokens = {tuple(labels.values()): value for _, labels, value in FILTER_TOKENS.samples()}
+    report = [(labels["rule_set"], labels["rule"], int(value), int(tokens.get(tuple(labels.values()), 0)))
+              for _, labels, value in FILTER_HITS.samples()]
+    return sorted(report, key=lambda row: (-row[3], -row[2], row[0], row[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report which filter rules hit in chat exports and what they removed")
+    parser.add_argument("paths", nargs="+", help="exported chats")
+    args = parser.parse_args()
+
+    import metrics
+    metrics.METRICS_ENABLED = True  # Counters only count when enabled, so before anything is read
+    import engine
+    import filters  # Run as a script this module is __main__; engine counts into the imported one
+
+    for path in args.paths:
+        engine.read_conversation_file(path)
+    report = filters.hit_report()
+    fired = {(rule_set, rule) for rule_set, rule, _, _ in report}
+    for rule_set, rule, hits, tokens in report:
+        print(f"{rule_set:<12} {rule:<40} hits={hits:<8} tokens~{tokens}")
+    # Rules that never hit are candidates for removal
+    for rule_set in engine.FILTER_RULES.values():
+        for rule_id in dict.fromkeys(rule.id for rule in rule_set.rules):
+            if (rule_set.name, rule_id) not in fired:
+                print(f"{rule_set.name:<12} {rule_id:<40} hits=0")
+
+
+if __name__ == "__main__":
+    main()
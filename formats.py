@@ -0,0 +1,129 @@
+import csv
+import re
+from typing import List, NamedTuple, Optional
+
+# Detection settings
+FORMAT_SNIFF_CHARS = 8 * 1024  # Prefix used to detect the file format
+FORMAT_SNIFF_LINES = 200  # Upper bound on sampled lines, so detection cost is fixed
+FORMAT_MIN_CONFIDENCE = 0.3  # Below this the content is treated as plain text
+
+# Line layouts recognised in a sample. Each is anchored at the start of a line
+# and only looks at the first few dozen characters, so a long line costs no more
+# than a short one.
+_DATE = r'\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}'
+_TIME = r'\d{1,2}:\d{2}(?::\d{2})?'
+_AMPM = r'\s*[ap]\.?\s?m\.?'
+# Android layout exactly as the WhatsApp line parser accepts it
+_WHATSAPP_ANDROID_SNIFF_RE = re.compile(
+    r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4},?\s*\d{1,2}:\d{2}(\s*[ap]m)?\s*-\s', re.IGNORECASE
+)
+_WHATSAPP_IOS_SNIFF_RE = re.compile(r'\[' + _DATE + r',?\s+' + _TIME + r'(' + _AMPM + r')?\]\s', re.IGNORECASE)
+_BRACKETED_SNIFF_RE = re.compile(r'\[[^\]\n]{4,40}\]\s*[^:\[\]\n]{1,40}:\s')
+_NAME_TEXT_SNIFF_RE = re.compile(r'([^:/\[\]\n]{1,40}?):\s+\S')
+_WHATSAPP_MARKERS_RE = re.compile(
+    r'messages and calls are end-to-end encrypted|<media omitted>|this message was deleted|image omitted'
+)
+_CSV_SENDER_COLUMNS = frozenset({'sender', 'author', 'from', 'name', 'user', 'username'})
+_CSV_TEXT_COLUMNS = frozenset({'message', 'text', 'content', 'body'})
+
+
+class DetectedFormat(NamedTuple):
+    """Result of format sniffing: a format name, a 0-1 confidence and the clock style if timestamped"""
+    name: str  # whatsapp_android, whatsapp_ios, bracketed, name_text, csv, telegram_json, slack_json or plain
+    confidence: float
+    clock: str = ""  # "12h", "24h" or "" when there are no timestamps
+
+
+def _sample_lines(sample: str) -> List[str]:
+    lines = []
+    for line in sample.split('\n', FORMAT_SNIFF_LINES)[:FORMAT_SNIFF_LINES]:
+        line = line.strip().lstrip('\u200e\ufeff')
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _csv_confidence(lines: List[str]) -> float:
+    """Share of lines with the header's field count, boosted by recognisable column names"""
+    if len(lines) < 2:
+        return 0.0
+    try:
+        dialect = csv.Sniffer().sniff(lines[0], delimiters=',;\t')
+    except csv.Error:
+        return 0.0
+    rows = list(csv.reader(lines, dialect))
+    width = len(rows[0])
+    if width < 2:
+        return 0.0
+    # Rows cut off by the end of the sample are not counted against the file
+    consistent = sum(1 for row in rows[:-1] if len(row) == width) / max(1, len(rows) - 1)
+    header = {column.strip().lower() for column in rows[0]}
+    if header & _CSV_SENDER_COLUMNS and header & _CSV_TEXT_COLUMNS:
+        return consistent
+    # Without a sender and a text column this is more likely prose with commas
+    return consistent * 0.25
+
+
+def _detect_json(sample: str) -> Optional[DetectedFormat]:
+    """Chat exports that are one JSON document, recognised by their keys"""
+    if sample.lstrip('\ufeff \t\r\n')[:1] not in ('{', '['):
+        return None
+    if '"messages"' in sample and '"from"' in sample:
+        return DetectedFormat("telegram_json", 0.9)
+    if '"ts"' in sample and '"text"' in sample:
+        return DetectedFormat("slack_json", 0.9)
+    return None
+
+
+def detect_format(sample: str) -> DetectedFormat:
+    """Guess the layout of a conversation from a bounded prefix of it"""
+    sample = sample[:FORMAT_SNIFF_CHARS]
+    detected = _detect_json(sample)
+    if detected is not None:
+        return detected
+    lines = _sample_lines(sample)
+    if not lines:
+        return DetectedFormat("plain", 0.0)
+
+    counts = {"whatsapp_android": 0, "whatsapp_ios": 0, "bracketed": 0, "name_text": 0}
+    twelve_hour = 0
+    senders = set()
+    for line in lines:
+        match = _WHATSAPP_ANDROID_SNIFF_RE.match(line)
+        if match:
+            counts["whatsapp_android"] += 1
+            twelve_hour += match.group(1) is not None
+            continue
+        match = _WHATSAPP_IOS_SNIFF_RE.match(line)
+        if match:
+            counts["whatsapp_ios"] += 1
+            twelve_hour += match.group(1) is not None
+            continue
+        if _BRACKETED_SNIFF_RE.match(line):
+            counts["bracketed"] += 1
+            continue
+        match = _NAME_TEXT_SNIFF_RE.match(line)
+        if match:
+            counts["name_text"] += 1
+            senders.add(match.group(1))
+
+    # Multi-line messages add continuation lines, so a share well below 1 is normal
+    total = len(lines)
+    scores = {name: count / total for name, count in counts.items()}
+    if len(senders) < 2:
+        scores["name_text"] = 0.0  # "Note: ..." headings are not a transcript
+    if _WHATSAPP_MARKERS_RE.search(sample[:4096].lower()):
+        for name in ("whatsapp_android", "whatsapp_ios"):
+            if counts[name]:
+                scores[name] = min(1.0, scores[name] + 0.25)
+    scores["csv"] = _csv_confidence(lines)
+
+    name = max(scores, key=scores.get)
+    confidence = scores[name]
+    if confidence < FORMAT_MIN_CONFIDENCE:
+        return DetectedFormat("plain", round(1.0 - confidence, 3))
+
+    clock = ""
+    if name.startswith("whatsapp"):
+        clock = "12h" if twelve_hour * 2 >= counts[name] else "24h"
+    return DetectedFormat(name, round(confidence, 3), clock)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from redaction import Entry, NameRedactor
+
+# Incremental re-analysis settings (overridable from the environment)
+ANALYSIS_STATE_DB = os.environ.get("ANALYSIS_STATE_DB", "")  # SQLite path, empty keeps state in memory only
+ANALYSIS_STATE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_STATE_MAX_ENTRIES", "1000"))
+FINGERPRINT_MESSAGES = 8  # Leading messages that pick candidate states (the boundary check decides)
+BOUNDARY_BYTES = 64 * 1024  # Bytes before the end of the analyzed part that must still match
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def chain_digest(previous: str, message: Tuple[str, str, str]) -> str:
+    """Rolling hash: each step covers the previous digest and one parsed message"""
+    return _digest(previous + '\x1e' + '\x1f'.join(message))
+
+
+def prefix_fingerprint(messages: Iterable[Tuple[str, str, str]], count: int = FINGERPRINT_MESSAGES) -> Optional[str]:
+    """Rolling hash of the first `count` messages of a conversation, None if it has fewer"""
+    chain = ""
+    seen = 0
+    for message in messages:
+        chain = chain_digest(chain, message)
+        seen += 1
+        if seen == count:
+            break
+    return chain if seen == count else None
+
+
+def boundary_digest(path: str, size: int) -> str:
+    """Hash of the bytes just before `size`, used to check that a file still starts with the analyzed part"""
+    start = max(0, size - BOUNDARY_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(size - start)).hexdigest()
+
+
+class SenderMap(dict):
+    """Sender -> anonymized label map that only ever stores hashes of the real names"""
+
+    def __contains__(self, sender) -> bool:
+        return dict.__contains__(self, _digest(sender))
+
+    def __getitem__(self, sender) -> str:
+        return dict.__getitem__(self, _digest(sender))
+
+    def __setitem__(self, sender, label: str):
+        dict.__setitem__(self, _digest(sender), label)
+
+    @classmethod
+    def from_hashed(cls, hashed: Dict[str, str]) -> "SenderMap":
+        sender_map = cls()
+        dict.update(sender_map, hashed)
+        return sender_map
+
+    def hashed(self) -> Dict[str, str]:
+        return dict(self.items())
+
+
+class ParseTracker:
+    """Follows a parsed message stream so the parse can later resume where it stopped"""
+
+    def __init__(self, chain: str = "", message_count: int = 0, sender_map: Optional[SenderMap] = None):
+        self.chain = chain
+        self.message_count = message_count
+        self.sender_map = sender_map if sender_map is not None else SenderMap()
+        self.redactor: Optional[NameRedactor] = None  # Of the parse, if names in messages are redacted
+        self.fingerprint: Optional[str] = None
+        self.encoding = ""
+        self.format = ""
+
+    def reset(self):
+        """Forget a parse attempt that failed part way, e.g. on a decoding error"""
+        self.__init__()
+
+    def track(self, messages: Iterable[Tuple[str, str, str]]) -> Iterator[Tuple[str, str, str]]:
+        for message in messages:
+            self.chain = chain_digest(self.chain, message)
+            self.message_count += 1
+            yield message
+
+
+class AnalysisState(NamedTuple):
+    """What is remembered about an analyzed export"""
+    fingerprint: str  # prefix_fingerprint of the conversation
+    size: int  # Bytes analyzed
+    boundary: str  # boundary_digest at `size`
+    encoding: str
+    format: str
+    chain: str  # Rolling hash over every parsed message
+    message_count: int
+    sender_map: Dict[str, str]  # Hashed sender -> "Person N"
+    analysis: Tuple[str, str, str]  # Title, summary, resolution
+    redaction: Optional[List[Entry]] = None  # NameRedactor.hashed_entries, None if saved without them
+
+
+class AnalysisStateStore:
+    """Latest analysis states by conversation fingerprint, in memory or in SQLite"""
+
+    def __init__(self, path: str = ANALYSIS_STATE_DB, max_entries: int = ANALYSIS_STATE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, int], AnalysisState]" = OrderedDict()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_state (fingerprint TEXT NOT NULL, size INTEGER NOT NULL, "
+                "state TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (fingerprint, size))"
+            )
+            self._conn.commit()
+
+    def _candidates(self, fingerprint: str, max_size: int) -> List[AnalysisState]:
+        with self._lock:
+            if self._conn is None:
+                states = [state for (key, size), state in self._memory.items()
+                          if key == fingerprint and size <= max_size]
+                return sorted(states, key=lambda state: state.size, reverse=True)
+            rows = self._conn.execute(
+                "SELECT state FROM analysis_state WHERE fingerprint = ? AND size <= ? ORDER BY size DESC",
+                (fingerprint, max_size),
+            ).fetchall()
+        states = []
+        for (row,) in rows:
+            fields = json.loads(row)
+            fields['analysis'] = tuple(fields['analysis'])
+            states.append(AnalysisState(**fields))
+        return states
+
+    def find(self, fingerprint: str, path: str) -> Optional[AnalysisState]:
+        """Most complete earlier state whose analyzed part the file at path still starts with"""
+        size = os.path.getsize(path)
+        for state in self._candidates(fingerprint, size):
+            if boundary_digest(path, state.size) == state.boundary:
+                return state
+        return None
+
+    def save(self, state: AnalysisState):
+        key = (state.fingerprint, state.size)
+        with self._lock:
+            if self._conn is None:
+                self._memory[key] = state
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_state (fingerprint, size, state, updated) VALUES (?, ?, ?, ?)",
+                (state.fingerprint, state.size, json.dumps(state._asdict(), ensure_ascii=False), time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM analysis_state WHERE rowid IN "
+                "(SELECT rowid FROM analysis_state ORDER BY updated DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> AnalysisStateStore:
+    """Return the process-wide analysis state store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AnalysisStateStore()
+    return _store
@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import email.utils
+import os
+import random
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+
+from metrics import CIRCUIT_REJECTIONS, RETRIES, UPSTREAM_RESPONSES
+from scheduler import readmit, readmit_async
+
+# requests and httpx are most of this module's import time, so they are only
+# imported when the first client is created
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+# Connection pool and resilience settings (overridable from the environment)
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "10"))
+# httpcore scans every idle connection on each request, so a large idle pool
+# costs more event-loop time than the handshakes it saves
+LLM_ASYNC_KEEPALIVE = int(os.environ.get("LLM_ASYNC_KEEPALIVE", "16"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "20"))
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the provider while the circuit breaker is open"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"provider temporarily unavailable, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, then probe with a single request"""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go upstream now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                CIRCUIT_REJECTIONS.inc()
+                raise CircuitOpenError(remaining)
+            # Half-open: let exactly one probe through
+            if self._probing:
+                CIRCUIT_REJECTIONS.inc()
+                raise CircuitOpenError(self.cooldown)
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class LLMClient:
+    """Shared keep-alive HTTP client for chat completion providers"""
+
+    def __init__(self, pool_size: int = LLM_POOL_SIZE,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        # Retries are handled here so Retry-After and the breaker see every attempt
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_json(self, url: str, payload: Dict, headers: Optional[Dict[str, str]] = None) -> "requests.Response":
+        """POST a JSON payload, retrying transient failures with jittered backoff"""
+        import requests
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.breaker.record_failure()
+                UPSTREAM_RESPONSES.inc(("error",))
+                if attempt >= self.max_retries:
+                    raise
+                RETRIES.inc()
+                time.sleep(backoff_delay(attempt))
+                readmit()  # A retry is another call against the rate limits
+                attempt += 1
+                continue
+
+            UPSTREAM_RESPONSES.inc((str(response.status_code),))
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+            RETRIES.inc()
+            time.sleep(backoff_delay(attempt, retry_after))
+            readmit()
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient:
+    """Async counterpart of LLMClient built on a pooled httpx.AsyncClient"""
+
+    def __init__(self, pool_size: int = LLM_POOL_SIZE,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None,
+                 keepalive: int = LLM_ASYNC_KEEPALIVE):
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        import httpx
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=min(pool_size, keepalive)),
+        )
+
+    async def post_json(self, url: str, payload: Dict, headers: Optional[Dict[str, str]] = None) -> "httpx.Response":
+        """POST a JSON payload, retrying transient failures with jittered backoff"""
+        import httpx
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            try:
+                response = await self.client.post(url, json=payload, headers=headers)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                UPSTREAM_RESPONSES.inc(("error",))
+                if attempt >= self.max_retries:
+                    raise
+                RETRIES.inc()
+                await asyncio.sleep(backoff_delay(attempt))
+                await readmit_async()
+                attempt += 1
+                continue
+
+            UPSTREAM_RESPONSES.inc((str(response.status_code),))
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            RETRIES.inc()
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            await readmit_async()
+            attempt += 1
+
+    @contextlib.asynccontextmanager
+    async def stream_post(self, url: str, payload: Dict,
+                          headers: Optional[Dict[str, str]] = None) -> AsyncIterator["httpx.Response"]:
+        """POST and yield the response with its body unread, retrying only before any data is consumed"""
+        import httpx
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            request = self.client.build_request("POST", url, json=payload, headers=headers)
+            try:
+                response = await self.client.send(request, stream=True)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                UPSTREAM_RESPONSES.inc(("error",))
+                if attempt >= self.max_retries:
+                    raise
+                RETRIES.inc()
+                await asyncio.sleep(backoff_delay(attempt))
+                await readmit_async()
+                attempt += 1
+                continue
+
+            UPSTREAM_RESPONSES.inc((str(response.status_code),))
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.breaker.record_success()
+                break
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                break
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            await response.aclose()
+            RETRIES.inc()
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            await readmit_async()
+            attempt += 1
+
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def iter_sse_data(response: "httpx.Response") -> AsyncIterator[str]:
+    """Yield the data payload of each server-sent event until the [DONE] marker"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield data
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> LLMClient:
+    """Return the process-wide client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def get_async_client() -> AsyncLLMClient:
+    """Return the async client for the running event loop, sharing the sync breaker"""
+    # httpx connections are bound to the loop that opened them
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncLLMClient(breaker=get_client().breaker)
+        _async_clients[loop] = client
+    return client
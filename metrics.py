@@ -0,0 +1,280 @@
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Metrics settings (overridable from the environment). Read once at import:
+# when disabled, handlers are left undecorated and every update returns at once.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")  # /metrics has no authentication, 0.0.0.0 exposes it on every interface
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, name: str, kind: str, documentation: str,
+                           collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        """Add a metric whose samples are computed only when scraped"""
+        with self._lock:
+            self._collectors.append((name, kind, documentation, collect))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, kind, documentation, collect in collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _labels(self, values: Labels) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(labels), value) for labels, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Labels, List[float]] = {}  # labels -> bucket counts, then sum
+
+    def observe(self, value: float, labels: Labels = ()):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 1)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-1] += value
+
+    def time(self, labels: Labels = ()):
+        """Context manager that observes the duration of its block"""
+        if not METRICS_ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_dict = self._labels(labels)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**label_dict, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", label_dict, values[-1]))
+            samples.append((f"{self.name}_count", label_dict, cumulative))
+        return samples
+
+
+# Pipeline metrics shared by the app and the LLM client
+STAGE_SECONDS = Histogram("analysis_stage_seconds", "Time spent in each analysis stage", ["stage"])
+REQUESTS = Counter("analysis_requests_total", "Analyses handled, by handler", ["handler"])
+IN_FLIGHT = Gauge("analysis_in_flight", "Analyses currently running, by handler", ["handler"])
+TOKENS = Counter("llm_tokens_total", "Tokens reported in the provider usage field", ["kind"])
+UPSTREAM_RESPONSES = Counter("llm_upstream_responses_total", "Upstream attempts by HTTP status (or 'error')",
+                             ["status"])
+RETRIES = Counter("llm_retries_total", "Upstream attempts that were retried")
+CIRCUIT_REJECTIONS = Counter("llm_circuit_rejections_total", "Requests failed fast by the circuit breaker")
+
+
+def stage(name: str):
+    """Time a pipeline stage into analysis_stage_seconds"""
+    return STAGE_SECONDS.time((name,))
+
+
+def record_usage(usage: Optional[Dict]):
+    """Count prompt and completion tokens from an OpenAI-style usage object"""
+    if not METRICS_ENABLED or not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            TOKENS.inc((kind[:-len("_tokens")],), usage[kind])
+
+
+def instrument_handler(handler: str):
+    """Count requests and track in-flight analyses for a sync, async or async-generator handler"""
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        labels = (handler,)
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                REQUESTS.inc(labels)
+                IN_FLIGHT.inc(labels)
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                finally:
+                    IN_FLIGHT.dec(labels)
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                REQUESTS.inc(labels)
+                IN_FLIGHT.inc(labels)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    IN_FLIGHT.dec(labels)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                REQUESTS.inc(labels)
+                IN_FLIGHT.inc(labels)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    IN_FLIGHT.dec(labels)
+        return wrapper
+    return decorate
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> "ThreadingHTTPServer":
+    """Serve /metrics on a background thread next to the Gradio server"""
+    # Imported here: only the server process ever exposes metrics over HTTP
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from backends import Backend
+from metrics import Histogram
+from scheduler import LANES, admitted_call, current_admission
+
+# Micro-batching settings (overridable from the environment)
+LLM_BATCH_MAX_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", "1"))  # Requests sent upstream as one call, 1 disables batching
+LLM_BATCH_MAX_WAIT_MS = float(os.environ.get("LLM_BATCH_MAX_WAIT_MS", "5"))  # How long the first request of a batch waits for more
+LLM_BATCH_CONCURRENCY = int(os.environ.get("LLM_BATCH_CONCURRENCY", "4"))  # Batches upstream at the same time
+
+BATCH_SIZE = Histogram("llm_batch_size", "Requests per batched upstream call", [],
+                       buckets=(1, 2, 4, 8, 16, 32, 64))
+BATCH_WAIT_SECONDS = Histogram("llm_batch_wait_seconds", "Time requests waited for their batch to fill", [],
+                               buckets=(0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1))
+
+
+class _Pending:
+    __slots__ = ("data", "headers", "future", "enqueued", "admission")
+
+    def __init__(self, data: Dict, headers: Dict[str, str]):
+        self.data = data
+        self.headers = headers
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.admission = current_admission()  # The caller's scheduler lane and tokens, for retries
+
+
+def _batch_key(pending: _Pending) -> str:
+    """Requests only share a call when everything but their messages is the same"""
+    settings = {key: value for key, value in pending.data.items() if key != "messages"}
+    return json.dumps([settings, pending.headers], sort_keys=True)
+
+
+class MicroBatcher:
+    """Collect requests for up to max_wait seconds or max_size requests, then send them as one batched call"""
+
+    def __init__(self, backend: Backend, max_size: int = LLM_BATCH_MAX_SIZE, max_wait: float = LLM_BATCH_MAX_WAIT_MS / 1000):
+        self.backend = backend
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._queue: "queue.SimpleQueue[_Pending]" = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(LLM_BATCH_CONCURRENCY)
+        self._executor = ThreadPoolExecutor(max_workers=LLM_BATCH_CONCURRENCY, thread_name_prefix="llm-batch")
+
+    def submit(self, data: Dict, headers: Dict[str, str]) -> Future:
+        """Queue one request; the future resolves to its completion text"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name="llm-batcher", daemon=True)
+                    self._thread.start()
+        pending = _Pending(data, headers)
+        self._queue.put(pending)
+        return pending.future
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0].enqueued + self.max_wait
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # While every batch slot is busy, requests keep joining this batch
+            # instead of queueing upstream one by one
+            self._slots.acquire()
+            while len(batch) < self.max_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            groups: Dict[str, List[_Pending]] = {}
+            for pending in batch:
+                groups.setdefault(_batch_key(pending), []).append(pending)
+            self._executor.submit(self._send, list(groups.values()))
+
+    def _send(self, groups: List[List[_Pending]]):
+        try:
+            for group in groups:
+                self._send_group(group)
+        finally:
+            self._slots.release()
+
+    def _send_group(self, group: List[_Pending]):
+        now = time.monotonic()
+        # Callers that gave up in the meantime (a hedge that lost) are left out
+        group = [pending for pending in group if pending.future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        for pending in group:
+            BATCH_WAIT_SECONDS.observe(now - pending.enqueued)
+        BATCH_SIZE.observe(len(group))
+        admissions = [pending.admission for pending in group if pending.admission is not None]
+        admission = contextlib.nullcontext()
+        if admissions:
+            # Retries of the batched call wait on the most urgent member's lane, for all members' tokens
+            lane = min((lane for lane, _ in admissions), key=LANES.index)
+            admission = admitted_call(lane, sum(tokens for _, tokens in admissions))
+        try:
+            with admission:
+                texts = self.backend.complete_batch([pending.data for pending in group], group[0].headers)
+        except BaseException as e:
+            for pending in group:
+                pending.future.set_exception(e)
+            return
+        for pending, text in zip(group, texts):
+            pending.future.set_result(text)
+
+
+class BatchedBackend(Backend):
+    """A batch-capable backend whose single requests go through a MicroBatcher; batched answers arrive in one piece"""
+
+    def __init__(self, backend: Backend, max_size: int = LLM_BATCH_MAX_SIZE, max_wait: float = LLM_BATCH_MAX_WAIT_MS / 1000):
+        self.backend = backend
+        self.name = backend.name  # Answers count as the wrapped backend's, for caching and metrics
+        self.supports_json = backend.supports_json
+        self.remote = backend.remote
+        self.batcher = MicroBatcher(backend, max_size, max_wait)
+
+    def available(self) -> bool:
+        return self.backend.available()
+
+    def complete(self, data: Dict, headers: Dict[str, str]) -> str:
+        return self.batcher.submit(data, headers).result()
+
+    async def complete_async(self, data: Dict, headers: Dict[str, str]) -> str:
+        return await asyncio.wrap_future(self.batcher.submit(data, headers))
+
+
+_batched: Dict[int, Backend] = {}
+_batched_lock = threading.Lock()
+
+
+def get_batched_backend(backend: Backend) -> Backend:
+    """The process-wide batching wrapper of a backend, or the backend itself when batching is off"""
+    if LLM_BATCH_MAX_SIZE <= 1:
+        return backend
+    key = id(backend)
+    if key not in _batched:
+        with _batched_lock:
+            if key not in _batched:
+                _batched[key] = BatchedBackend(backend)
+    return _batched[key]
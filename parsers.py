@@ -0,0 +1,208 @@
+import csv
+import json
+import re
+from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from formats import DetectedFormat
+
+# A parser turns a file into (sender, timestamp, text) records, the message
+# stream every format shares. Parsers are looked up by detected format name.
+MessageRecord = Tuple[str, str, str]
+Parser = Callable[[str, str, DetectedFormat], Iterator[MessageRecord]]
+
+CSV_BATCH_ROWS = 8192  # Rows converted to columns at a time
+CSV_SENDER_COLUMNS = ('sender', 'author', 'from', 'name', 'user', 'username')
+CSV_TEXT_COLUMNS = ('message', 'text', 'content', 'body')
+CSV_TIME_COLUMNS = ('timestamp', 'datetime', 'date', 'time', 'ts')
+JSON_CHUNK_CHARS = 64 * 1024  # Characters read at a time while streaming a JSON export
+
+PARSERS: Dict[str, Parser] = {}
+
+
+def register_parser(*names: str):
+    """Register a parser for one or more detected format names"""
+    def decorate(parser: Parser) -> Parser:
+        for name in names:
+            PARSERS[name] = parser
+        return parser
+    return decorate
+
+
+def get_parser(name: str) -> Optional[Parser]:
+    return PARSERS.get(name)
+
+
+def _find_column(header: List[str], candidates: Tuple[str, ...]) -> Optional[int]:
+    lowered = [column.strip().lower() for column in header]
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered.index(candidate)
+    return None
+
+
+@register_parser("csv")
+def parse_csv(path: str, encoding: str, detected: DetectedFormat) -> Iterator[MessageRecord]:
+    """Read sender, time and text columns from a CSV chat export in batches"""
+    with open(path, encoding=encoding, newline='') as f:
+        header_line = f.readline()
+        try:
+            dialect = csv.Sniffer().sniff(header_line, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        header = next(csv.reader([header_line], dialect), [])
+        sender_index = _find_column(header, CSV_SENDER_COLUMNS)
+        text_index = _find_column(header, CSV_TEXT_COLUMNS)
+        if sender_index is None or text_index is None:
+            return
+        time_index = _find_column(header, CSV_TIME_COLUMNS)
+        width = max(index for index in (sender_index, text_index, time_index) if index is not None) + 1
+
+        reader = csv.reader(f, dialect)
+        while True:
+            rows = list(islice(reader, CSV_BATCH_ROWS))
+            if not rows:
+                return
+            if any(len(row) < width for row in rows):
+                rows = [row for row in rows if len(row) >= width]
+
+            # Whole columns are pulled out and cleaned with C-level map calls
+            senders = map(str.strip, map(itemgetter(sender_index), rows))
+            texts = map(str.strip, map(itemgetter(text_index), rows))
+            times = map(str.strip, map(itemgetter(time_index), rows)) if time_index is not None else [''] * len(rows)
+            for record in zip(senders, times, texts):
+                if record[2]:
+                    yield record
+
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_JSON_SEPARATOR = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+
+
+class _JsonStream:
+    """Decodes one JSON value after another from a file, holding only the unread part of a chunk"""
+
+    def __init__(self, f):
+        self._f = f
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(JSON_CHUNK_CHARS)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at the end of the file"""
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def separator(self) -> str:
+        """Consume the ',' or ']' after an array entry and return it"""
+        match = _JSON_SEPARATOR.match(self._buffer, self._pos)
+        if match is not None and match.end() < len(self._buffer):
+            self._pos = match.end()
+            return match.group(1)
+        char = self.peek()
+        if char not in (',', ']'):
+            raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self._buffer, self._pos)
+        self._pos += 1
+
+    def value(self):
+        """Decode the next value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal that ends with the buffer may continue in the next chunk
+            if end < len(self._buffer) or self._eof or isinstance(value, (dict, list, str)):
+                self._pos = end
+                return value
+            self._fill()
+
+
+def _iter_json_messages(f) -> Iterator:
+    """Entries of a JSON export's message list, a top-level array or the object's "messages" key, one at a time"""
+    stream = _JsonStream(f)
+    if stream.peek() != '[':
+        stream.expect('{')
+        while True:
+            if stream.peek() == '}':
+                return  # No message list
+            key = stream.value()
+            stream.expect(':')
+            if key == 'messages' and stream.peek() == '[':
+                break
+            stream.value()  # Other fields of the export (name, type, id) are small and skipped
+            if stream.peek() == ',':
+                stream.expect(',')
+    stream.expect('[')
+    if stream.peek() == ']':
+        return
+    while True:
+        yield stream.value()
+        if stream.separator() == ']':
+            return
+
+
+def _telegram_text(text) -> str:
+    """Telegram stores formatted text as a list of strings and entity objects"""
+    if isinstance(text, str):
+        return text
+    return ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+
+
+@register_parser("telegram_json")
+def parse_telegram_json(path: str, encoding: str, detected: DetectedFormat) -> Iterator[MessageRecord]:
+    """Messages from a Telegram Desktop JSON chat export (service entries skipped), streamed one at a time"""
+    with open(path, encoding=encoding) as f:
+        for message in _iter_json_messages(f):
+            if not isinstance(message, dict) or message.get('type', 'message') != 'message':
+                continue
+            text = _telegram_text(message.get('text', '')).strip()
+            if text:
+                yield message.get('from') or '', message.get('date', ''), text
+
+
+@register_parser("slack_json")
+def parse_slack_json(path: str, encoding: str, detected: DetectedFormat) -> Iterator[MessageRecord]:
+    """Messages from one Slack export channel file (joins and other subtypes skipped), streamed one at a time"""
+    with open(path, encoding=encoding) as f:
+        for message in _iter_json_messages(f):
+            if not isinstance(message, dict) or message.get('type') != 'message' or message.get('subtype'):
+                continue
+            text = (message.get('text') or '').strip()
+            if not text:
+                continue
+            profile = message.get('user_profile') or {}
+            sender = profile.get('real_name') or message.get('user_name') or message.get('user') or ''
+            yield sender, _slack_time(message.get('ts')), text
+
+
+def _slack_time(ts) -> str:
+    try:
+        return datetime.fromtimestamp(float(ts), timezone.utc).strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return ''
@@ -0,0 +1,221 @@
+import os
+from string import Formatter
+from typing import Dict, Iterator, Optional, Tuple
+
+from condense import estimate_tokens
+from metrics import Counter
+
+# Template version used when a caller does not ask for one (overridable from the environment).
+# Version 1 reproduces the original prompts byte for byte; version 2 moves every
+# instruction in front of the input so the start of each request never changes.
+PROMPT_TEMPLATE_VERSION = int(os.environ.get("PROMPT_TEMPLATE_VERSION", "2"))
+# Version 3 is version 2 asking for a JSON object, used in structured output mode
+STRUCTURED_TEMPLATE_VERSION = 3
+
+PROMPT_TOKENS = Counter("prompt_template_tokens_total",
+                        "Estimated prompt tokens sent, by template and part (static prefix or spliced input)",
+                        ["template", "version", "part"])
+
+SYSTEM_PROMPT = """You are a highly skilled conflict resolution expert with deep training in psychology, counseling, and nonviolent communication. You analyze disagreements with the wisdom of a seasoned therapist who understands human emotions and motivations. Your responses should be compassionate, insightful, and practical."""
+
+
+class PromptTemplate:
+    """A prompt split into a static prefix, a body with named fields and a static suffix"""
+
+    def __init__(self, name: str, version: int, prefix: str, body: str, suffix: str = ""):
+        self.name = name
+        self.version = version
+        self.prefix = prefix
+        self.body = body
+        self.suffix = suffix
+        # Field names are read once here, so a bad template fails at import rather than per request
+        self.fields = frozenset(field for _, field, _, _ in Formatter().parse(body) if field)
+        self.static_tokens = estimate_tokens(prefix) + estimate_tokens(suffix)
+        self._labels = (name, str(version))
+
+    def render(self, **values: str) -> str:
+        missing = self.fields.difference(values)
+        if missing:
+            raise ValueError(f"Prompt template {self.name!r} v{self.version} needs {', '.join(sorted(missing))}")
+        body = self.body.format(**values)
+        PROMPT_TOKENS.inc(self._labels + ("prefix",), self.static_tokens)
+        PROMPT_TOKENS.inc(self._labels + ("input",), estimate_tokens(body))
+        return self.prefix + body + self.suffix
+
+
+TEMPLATES: Dict[Tuple[str, int], PromptTemplate] = {}
+
+
+def register_template(template: PromptTemplate) -> PromptTemplate:
+    TEMPLATES[(template.name, template.version)] = template
+    return template
+
+
+def get_template(name: str, version: Optional[int] = None) -> PromptTemplate:
+    """Look up a template, by default in PROMPT_TEMPLATE_VERSION"""
+    version = PROMPT_TEMPLATE_VERSION if version is None else version
+    try:
+        return TEMPLATES[(name, version)]
+    except KeyError:
+        raise KeyError(f"No prompt template {name!r} in version {version}") from None
+
+
+def iter_templates() -> Iterator[PromptTemplate]:
+    return iter(TEMPLATES.values())
+
+
+# Shared pieces. Every analysis template of a version starts with the same bytes.
+_ANALYSIS_GOALS = """Your response should include:
+1. ⚔️ Conflict Title (short and thoughtful)
+2. 🔍 Conflict Summary (briefly describe the emotional and logical disagreement)
+3. 🤝 Conflict Resolution (a concise solution that respects both perspectives - keep this under 100 words)
+Use emotionally intelligent language and always aim for fairness and clarity."""
+
+_RESPONSE_FORMAT = """Please structure your response exactly like this:
+
+⚔️ Conflict Title:
+"[Your thoughtful title here]"
+
+🔍 Conflict Summary:
+[Your empathetic analysis of both sides here]
+
+🤝 Conflict Resolution:
+[Your concise solution that acknowledges both truths and provides practical next steps - maximum 100 words]"""
+
+_JSON_RESPONSE_FORMAT = """Respond with only a JSON object with exactly these string fields:
+{"title": "your thoughtful title", "summary": "your empathetic analysis of both sides", "resolution": "your concise solution that acknowledges both truths and provides practical next steps - maximum 100 words"}"""
+
+_CHUNK_SUMMARY_INSTRUCTIONS = "Summarize the following part of a longer conversation in at most 80 words. Focus on any disagreements: what each person wants, what upset them, and how the tone changed. Stay neutral and do not take sides. If there is no disagreement in this part, say so in one sentence."
+
+
+# Version 1: the original prompts, input in the middle
+
+def _v1_analysis_intro(subject: str, sides: str, argument: str = "argument") -> str:
+    return (f"You are an empathetic conflict analyst. Analyze the following {subject} and provide a respectful, "
+            f"psychologically insightful resolution. Your goal is to mediate the {argument} by understanding "
+            f"{sides} sides deeply, without taking sides. ")
+
+
+_V1_SUFFIX = "\n\n" + _RESPONSE_FORMAT
+
+register_template(PromptTemplate(
+    "conversation", 1,
+    _v1_analysis_intro("conversation", "both") + _ANALYSIS_GOALS + "\n\n",
+    "Conversation: {conversation}",
+    _V1_SUFFIX,
+))
+register_template(PromptTemplate(
+    "pov", 1,
+    _v1_analysis_intro("opposing POVs", "both") + _ANALYSIS_GOALS + "\n\n",
+    "Person 1's Perspective: {person1}\nPerson 2's Perspective: {person2}",
+    _V1_SUFFIX,
+))
+register_template(PromptTemplate(
+    "file", 1,
+    _v1_analysis_intro("conversation file", "all", "arguments") + _ANALYSIS_GOALS + "\n\n",
+    "Conversation Content: {content}",
+    _V1_SUFFIX,
+))
+register_template(PromptTemplate(
+    "update", 1,
+    "You are an empathetic conflict analyst. You already analyzed the start of a conversation; new messages have since been added to it. Update your analysis so it covers the whole conversation, without taking sides. Keep what still holds and change what the new messages change.\n\n",
+    "Earlier Analysis:\n⚔️ Conflict Title: {title}\n🔍 Conflict Summary: {summary}\n🤝 Conflict Resolution: {resolution}\n\n"
+    "New Messages: {content}",
+    _V1_SUFFIX,
+))
+register_template(PromptTemplate(
+    "long_conversation", 1,
+    "You are an empathetic conflict analyst. The following are summaries of consecutive parts of a long conversation, oldest first. Analyze how the conflict developed across them and provide a respectful, psychologically insightful resolution. Your goal is to mediate the arguments by understanding all sides deeply, without taking sides. "
+    + _ANALYSIS_GOALS + "\n\nConversation Summaries:\n",
+    "{summaries}",
+    _V1_SUFFIX,
+))
+register_template(PromptTemplate(
+    "chunk_summary", 1,
+    _CHUNK_SUMMARY_INSTRUCTIONS + "\n\n",
+    "Conversation Part: {chunk}",
+))
+
+
+# Version 2: instructions and response format first, input last
+
+_V2_ANALYSIS_PREFIX = ("You are an empathetic conflict analyst. You mediate arguments by understanding every side "
+                       "deeply, without taking sides. " + _ANALYSIS_GOALS + "\n\n" + _RESPONSE_FORMAT + "\n\n")
+
+register_template(PromptTemplate(
+    "conversation", 2,
+    _V2_ANALYSIS_PREFIX + "Analyze the following conversation and provide a respectful, psychologically insightful resolution.\n\n",
+    "Conversation: {conversation}",
+))
+register_template(PromptTemplate(
+    "pov", 2,
+    _V2_ANALYSIS_PREFIX + "Analyze the following opposing POVs and provide a respectful, psychologically insightful resolution.\n\n",
+    "Person 1's Perspective: {person1}\nPerson 2's Perspective: {person2}",
+))
+register_template(PromptTemplate(
+    "file", 2,
+    _V2_ANALYSIS_PREFIX + "Analyze the following conversation file and provide a respectful, psychologically insightful resolution.\n\n",
+    "Conversation Content: {content}",
+))
+register_template(PromptTemplate(
+    "update", 2,
+    _V2_ANALYSIS_PREFIX + "You already analyzed the start of a conversation; new messages have since been added to it. Update your analysis so it covers the whole conversation. Keep what still holds and change what the new messages change.\n\n",
+    "Earlier Analysis:\n⚔️ Conflict Title: {title}\n🔍 Conflict Summary: {summary}\n🤝 Conflict Resolution: {resolution}\n\n"
+    "New Messages: {content}",
+))
+register_template(PromptTemplate(
+    "long_conversation", 2,
+    _V2_ANALYSIS_PREFIX + "The following are summaries of consecutive parts of a long conversation, oldest first. Analyze how the conflict developed across them and provide a respectful, psychologically insightful resolution.\n\nConversation Summaries:\n",
+    "{summaries}",
+))
+register_template(PromptTemplate(
+    "chunk_summary", 2,
+    _CHUNK_SUMMARY_INSTRUCTIONS + "\n\n",
+    "Conversation Part: {chunk}",
+))
+
+
+# Version 3: version 2 with the response as a JSON object
+
+_V3_ANALYSIS_PREFIX = ("You are an empathetic conflict analyst. You mediate arguments by understanding every side "
+                       "deeply, without taking sides. " + _ANALYSIS_GOALS + "\n\n" + _JSON_RESPONSE_FORMAT + "\n\n")
+
+register_template(PromptTemplate(
+    "conversation", 3,
+    _V3_ANALYSIS_PREFIX + "Analyze the following conversation and provide a respectful, psychologically insightful resolution.\n\n",
+    "Conversation: {conversation}",
+))
+register_template(PromptTemplate(
+    "pov", 3,
+    _V3_ANALYSIS_PREFIX + "Analyze the following opposing POVs and provide a respectful, psychologically insightful resolution.\n\n",
+    "Person 1's Perspective: {person1}\nPerson 2's Perspective: {person2}",
+))
+register_template(PromptTemplate(
+    "file", 3,
+    _V3_ANALYSIS_PREFIX + "Analyze the following conversation file and provide a respectful, psychologically insightful resolution.\n\n",
+    "Conversation Content: {content}",
+))
+register_template(PromptTemplate(
+    "update", 3,
+    _V3_ANALYSIS_PREFIX + "You already analyzed the start of a conversation; new messages have since been added to it. Update your analysis so it covers the whole conversation. Keep what still holds and change what the new messages change.\n\n",
+    "Earlier Analysis:\n⚔️ Conflict Title: {title}\n🔍 Conflict Summary: {summary}\n🤝 Conflict Resolution: {resolution}\n\n"
+    "New Messages: {content}",
+))
+register_template(PromptTemplate(
+    "long_conversation", 3,
+    _V3_ANALYSIS_PREFIX + "The following are summaries of consecutive parts of a long conversation, oldest first. Analyze how the conflict developed across them and provide a respectful, psychologically insightful resolution.\n\nConversation Summaries:\n",
+    "{summaries}",
+))
+register_template(PromptTemplate(
+    "chunk_summary", 3,
+    _CHUNK_SUMMARY_INSTRUCTIONS + "\n\n",
+    "Conversation Part: {chunk}",
+))
+# Sent once when an answer fails validation: only the bad answer goes back, not the conversation
+register_template(PromptTemplate(
+    "repair", 3,
+    "Your previous reply could not be used because it is not a valid JSON object with the non-empty string fields "
+    "\"title\", \"summary\" and \"resolution\". Rewrite it as exactly that JSON object, keeping its content.\n\n"
+    + _JSON_RESPONSE_FORMAT + "\n\n",
+    "Problem: {problem}\n\nPrevious Reply:\n{response}",
+))
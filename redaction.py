@@ -0,0 +1,209 @@
+import hashlib
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+MIN_FIRST_NAME_CHARS = 3  # Shorter first names ("Al", "Jo") are too often parts of ordinary words
+CASELESS_NAME_CHARS = 5  # Shorter one-word names ("Will", "Joy") are often ordinary words and need their capital
+PHONE_MIN_DIGITS = 7  # Senders with this many digits (and nothing but phone punctuation) are numbers
+MAX_NAMED_CANDIDATES = 3  # Participants a shared first name is resolved to before it becomes AMBIGUOUS_LABEL
+AMBIGUOUS_LABEL = "someone"
+NATIONAL_DIGITS = 10  # Phone numbers are also matched by their last 10 digits, without the country code
+
+_WORD_RE = re.compile(r'\w+')
+_PHONE_RE = re.compile(r'^\+?[\d\s().-]+$')
+
+# (kind, words, label, capitalized_only) for one way a participant may be written: their
+# phone number ("phone"), whole name ("name") or the first word of a longer name ("first")
+Entry = Tuple[str, Tuple[str, ...], str, bool]
+
+
+def _hash_word(word: str) -> str:
+    return hashlib.sha256(word.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _needs_capital(name: str) -> bool:
+    """Whether a name's first word only counts as the name when capitalized; not if its owner writes it in lower case"""
+    first = _WORD_RE.search(name)
+    return first is not None and len(first.group()) < CASELESS_NAME_CHARS and not name[first.start()].islower()
+
+
+class _Pattern:
+    __slots__ = ("length", "label", "capitalized_only", "phone")
+
+    def __init__(self, length: int, label: str, capitalized_only: bool, phone: bool):
+        self.length = length  # In words
+        self.label = label
+        self.capitalized_only = capitalized_only  # Only counts when written with a capital
+        self.phone = phone
+
+
+class WordAutomaton:
+    """Aho-Corasick automaton over words: finds every pattern in a text in one pass, however many there are"""
+
+    def __init__(self, patterns: Dict[Tuple[str, ...], _Pattern]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[_Pattern]] = [[]]
+        for words, pattern in patterns.items():
+            state = 0
+            for word in words:
+                following = self._goto[state].get(word)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][word] = following
+                state = following
+            self._out[state].append(pattern)
+
+        # Breadth first, so a state's failure target is finished before its children need it
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for word, following in self._goto[state].items():
+                pending.append(following)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[following] = target if target != following else 0
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+    def search(self, words: List[str]) -> Iterator[Tuple[int, _Pattern]]:
+        """(index of the last word, pattern) for every occurrence, in order of where they end"""
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for index, word in enumerate(words):
+            if state == 0:
+                state = root.get(word, 0)  # Most words start nothing: one lookup
+            else:
+                while state and word not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(word, 0)
+            for pattern in out[state]:
+                yield index, pattern
+
+
+def phone_forms(number: str) -> List[Tuple[str, ...]]:
+    """Word sequences a phone number may be written as: grouped as given, and as bare digits, with and without the country code"""
+    groups = tuple(_WORD_RE.findall(number))
+    digits = ''.join(groups)
+    forms = {groups, (digits,)}
+    if len(digits) > NATIONAL_DIGITS:
+        national = digits[-NATIONAL_DIGITS:]
+        forms.add((national,))
+        if number.lstrip().startswith('+') and len(groups) > 1 and ''.join(groups[1:]) == national:
+            forms.add(groups[1:])
+    return sorted(forms)
+
+
+def participant_entries(sender: str, label: str) -> List[Entry]:
+    """The ways a participant may be written inside messages, with their words lowercased"""
+    digits = sum(ch.isdigit() for ch in sender)
+    if digits >= PHONE_MIN_DIGITS and _PHONE_RE.match(sender):
+        return [("phone", form, label, False) for form in phone_forms(sender)]
+    words = tuple(word.lower() for word in _WORD_RE.findall(sender))
+    if not words:
+        return []
+    entries = [("name", words, label, len(words) == 1 and _needs_capital(sender))]
+    if len(words) > 1 and len(words[0]) >= MIN_FIRST_NAME_CHARS:
+        entries.append(("first", words[:1], label, _needs_capital(sender)))
+    return entries
+
+
+class NameRedactor:
+    """Replaces participants' names, first names and phone numbers inside messages with their "Person N" labels"""
+
+    def __init__(self, known: Iterable[Sequence] = ()):
+        self._labels: Dict[str, str] = {}  # Participant as written -> label
+        # Entries of participants from an earlier read, with hashed words (see hashed_entries).
+        # With any, the text's words are hashed too before they are matched.
+        self._known: List[Entry] = [(kind, tuple(words), label, capitalized_only)
+                                    for kind, words, label, capitalized_only in known]
+        self._automaton: Optional[WordAutomaton] = None
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def add_participant(self, sender: str, label: str):
+        if sender in self._labels or not sender:
+            return
+        self._labels[sender] = label
+        self._automaton = None  # Rebuilt on the next redact
+
+    def hashed_entries(self) -> List[Entry]:
+        """Every participant's entries with the words hashed, to redact a later read without keeping the names"""
+        entries = self._known + [(kind, tuple(map(_hash_word, words)), label, capitalized_only)
+                                 for kind, words, label, capitalized_only in self._entries()]
+        return list(dict.fromkeys(entries))
+
+    def _entries(self) -> List[Entry]:
+        return [entry for sender, label in self._labels.items() for entry in participant_entries(sender, label)]
+
+    def _build(self) -> WordAutomaton:
+        entries = self.hashed_entries() if self._known else self._entries()
+        patterns: Dict[Tuple[str, ...], _Pattern] = {}
+        first_names: Dict[Tuple[str, ...], List[Tuple[str, bool]]] = {}
+        for kind, words, label, capitalized_only in entries:
+            if kind == "first":
+                first_names.setdefault(words, []).append((label, capitalized_only))
+            else:
+                patterns[words] = _Pattern(len(words), label, capitalized_only, kind == "phone")
+
+        for words, owners in first_names.items():
+            if words in patterns:
+                continue  # Someone goes by this name alone; that is who it means
+            labels = sorted({label for label, _ in owners}, key=lambda label: (len(label), label))
+            capitalized_only = all(needs_capital for _, needs_capital in owners)
+            # A shared first name cannot be told apart: a few candidates are named, more become anonymous
+            label = " or ".join(labels) if len(labels) <= MAX_NAMED_CANDIDATES else AMBIGUOUS_LABEL
+            patterns[words] = _Pattern(1, label, capitalized_only, False)
+        return WordAutomaton(patterns)
+
+    def redact(self, text: str) -> str:
+        """Rewrite the text in one pass over its words"""
+        if not (self._labels or self._known) or not text:
+            return text
+        if self._automaton is None:
+            self._automaton = self._build()
+
+        spans = [(match.start(), match.end()) for match in _WORD_RE.finditer(text)]
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            words = [lowered[start:end] for start, end in spans]
+        else:
+            words = [text[start:end].lower() for start, end in spans]
+        if self._known:
+            words = list(map(_hash_word, words))
+
+        # Leftmost-longest, non-overlapping occurrences
+        chosen: Dict[int, Tuple[int, _Pattern]] = {}
+        for last, pattern in self._automaton.search(words):
+            first = last - pattern.length + 1
+            if pattern.capitalized_only and not text[spans[first][0]].isupper():
+                continue
+            current = chosen.get(first)
+            if current is None or current[0] < last:
+                chosen[first] = (last, pattern)
+        if not chosen:
+            return text
+
+        pieces = []
+        pos = 0
+        covered = -1
+        for first in sorted(chosen):
+            if first <= covered:
+                continue
+            last, pattern = chosen[first]
+            start, end = spans[first][0], spans[last][1]
+            if pattern.phone and start > pos and text[start - 1] == '+':
+                start -= 1
+            pieces.append(text[pos:start])
+            pieces.append(pattern.label)
+            pos = end
+            covered = last
+        pieces.append(text[pos:])
+        return ''.join(pieces)
@@ -0,0 +1,215 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from metrics import Gauge, Histogram
+
+# Provider account limits (overridable from the environment, 0 disables a limit)
+LLM_RPM_LIMIT = int(os.environ.get("LLM_RPM_LIMIT", "600"))  # Requests per minute
+LLM_TPM_LIMIT = int(os.environ.get("LLM_TPM_LIMIT", "180000"))  # Prompt plus completion tokens per minute
+LLM_RATE_BURST_SECONDS = float(os.environ.get("LLM_RATE_BURST_SECONDS", "10"))  # Unused allowance that may pile up
+QUEUE_FEEDBACK_INTERVAL = 1.0  # Seconds between queue position updates for a waiting caller
+
+# Priority lanes, highest first: clicks on the conversation and POV tabs go
+# ahead of file analyses and batch runs
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+# Lane and tokens of the upstream call being made in this context, so retries and
+# fallback calls deeper down are admitted again on the same lane
+_admission: ContextVar[Optional[Tuple[str, int]]] = ContextVar("llm_admission", default=None)
+
+QUEUE_DEPTH = Gauge("llm_queue_depth", "Upstream calls waiting for a rate limit slot, by lane", ["lane"])
+QUEUE_WAIT_SECONDS = Histogram("llm_queue_wait_seconds", "Time upstream calls waited for a rate limit slot",
+                               ["lane"], buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+
+class TokenBucket:
+    """Allowance that refills at `per_minute` and holds at most `capacity`"""
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity only need a full bucket)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class QueuePosition(int):
+    """Yielded by a completion stream while it waits in line, instead of text"""
+
+
+class _Ticket:
+    __slots__ = ("lane", "tokens", "enqueued", "event", "loop")
+
+    def __init__(self, lane: str, tokens: int, loop: Optional[asyncio.AbstractEventLoop]):
+        self.lane = lane
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class RateLimitScheduler:
+    """Admit upstream calls within request and token budgets, strictly by lane priority, then arrival"""
+
+    def __init__(self, rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        burst = burst_seconds / 60.0
+        self._buckets = []
+        if rpm > 0:
+            self._buckets.append((TokenBucket(rpm, max(1.0, rpm * burst)), False))
+        if tpm > 0:
+            self._buckets.append((TokenBucket(tpm, max(1.0, tpm * burst)), True))
+        self._lanes: Dict[str, Deque[_Ticket]] = {lane: deque() for lane in LANES}
+        self._lock = threading.Lock()
+
+    def _head(self) -> Optional[_Ticket]:
+        for lane in LANES:
+            if self._lanes[lane]:
+                return self._lanes[lane][0]
+        return None
+
+    def _enqueue(self, ticket: _Ticket):
+        with self._lock:
+            self._lanes[ticket.lane].append(ticket)
+        QUEUE_DEPTH.inc((ticket.lane,))
+
+    def _leave(self, ticket: _Ticket):
+        """Remove a ticket that was admitted or gave up, and let the next one check its turn"""
+        with self._lock:
+            try:
+                self._lanes[ticket.lane].remove(ticket)
+            except ValueError:
+                return
+            head = self._head()
+        QUEUE_DEPTH.dec((ticket.lane,))
+        if head is not None:
+            head.wake()
+
+    def _try_admit(self, ticket: _Ticket) -> Tuple[bool, Optional[float]]:
+        """(admitted, seconds to wait); a ticket that is not at the head waits until woken"""
+        with self._lock:
+            if self._head() is not ticket:
+                return False, None
+            now = time.monotonic()
+            delay = max((bucket.delay(ticket.tokens if by_tokens else 1, now) for bucket, by_tokens in self._buckets),
+                        default=0.0)
+            if delay > 0:
+                return False, delay
+            for bucket, by_tokens in self._buckets:
+                bucket.take(ticket.tokens if by_tokens else 1)
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued, (ticket.lane,))
+        self._leave(ticket)
+        return True, None
+
+    def position(self, ticket: _Ticket) -> int:
+        """1-based place in line across this and higher priority lanes"""
+        with self._lock:
+            ahead = 0
+            for lane in LANES:
+                queue = self._lanes[lane]
+                if lane == ticket.lane:
+                    return ahead + (queue.index(ticket) if ticket in queue else 0) + 1
+                ahead += len(queue)
+        return ahead + 1
+
+    def acquire(self, lane: str, tokens: int):
+        """Block the calling thread until the call may go upstream"""
+        ticket = _Ticket(lane, tokens, None)
+        self._enqueue(ticket)
+        try:
+            while True:
+                admitted, delay = self._try_admit(ticket)
+                if admitted:
+                    return
+                ticket.event.wait(delay)
+                ticket.event.clear()
+        finally:
+            self._leave(ticket)
+
+    async def wait_turn(self, lane: str, tokens: int) -> AsyncIterator[QueuePosition]:
+        """Wait for a slot without blocking the loop, yielding the queue position while waiting"""
+        ticket = _Ticket(lane, tokens, asyncio.get_running_loop())
+        self._enqueue(ticket)
+        try:
+            while True:
+                admitted, delay = self._try_admit(ticket)
+                if admitted:
+                    return
+                yield QueuePosition(self.position(ticket))
+                timeout = QUEUE_FEEDBACK_INTERVAL if delay is None else min(delay, QUEUE_FEEDBACK_INTERVAL)
+                try:
+                    await asyncio.wait_for(ticket.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                ticket.event.clear()
+        finally:
+            self._leave(ticket)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide scheduler, creating it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler()
+    return _scheduler
+
+
+@contextlib.contextmanager
+def admitted_call(lane: str, tokens: int) -> Iterator[None]:
+    """Mark the upstream attempts made inside as one admitted call on this lane"""
+    token = _admission.set((lane, tokens))
+    try:
+        yield
+    finally:
+        _admission.reset(token)
+
+
+def current_admission() -> Optional[Tuple[str, int]]:
+    """(lane, tokens) of the call in progress in this context, None outside admitted_call"""
+    return _admission.get()
+
+
+def readmit():
+    """Wait for another slot before a retry or fallback attempt of the call in progress"""
+    admission = _admission.get()
+    if admission is not None:
+        get_scheduler().acquire(*admission)
+
+
+async def readmit_async():
+    """Async variant of readmit"""
+    admission = _admission.get()
+    if admission is not None:
+        async for _ in get_scheduler().wait_turn(*admission):
+            pass
@@ -0,0 +1,235 @@
+import os
+import re
+from typing import List, Optional
+
+from filters import record_hit
+
+TECHNICAL_PLACEHOLDERS = os.environ.get("TECHNICAL_PLACEHOLDERS", "1") == "1"  # Replace technical spans with a short note, 0 drops them
+LONG_LINE_CHARS = 1000  # A line this long with any technical marker is a span on its own
+
+SPAN_LABELS = {"code": "code block", "latex": "LaTeX block", "html": "HTML block", "trace": "stack trace"}
+
+TECHNICAL_PATTERNS = [
+    r'\\documentclass',
+    r'\\usepackage',
+    r'\\begin\{',
+    r'\\end\{',
+    r'\\textbf\{',
+    r'\\section\{',
+    r'\\title\{',
+    r'def\s+\w+\(',
+    r'import\s+\w+',
+    r'from\s+\w+\s+import',
+    r'<[^>]+>',  # HTML tags
+    r'^\s*#.*$',  # Comment lines
+    r'^\s*//.*$'  # Another comment style
+]
+
+_TECHNICAL_RE = re.compile('|'.join(f'(?:{p})' for p in TECHNICAL_PATTERNS), re.IGNORECASE | re.MULTILINE)
+_FENCES = ('```', '~~~')
+_LATEX_OPEN_RE = re.compile(r'\\(?:[a-zA-Z]{2,}(?:[{\[\s*]|$)|\[)|.*\\(?:begin\{|documentclass)')
+_LATEX_ENV_RE = re.compile(r'\\(begin|end)\{')
+_LATEX_LINE_STARTS = ('\\', '%', '}', '$$')
+_HTML_OPEN_RE = re.compile(
+    r'<(?:!doctype|!--|/?(?:html|head|body|div|span|p|a|ul|ol|li|table|thead|tbody|tr|td|th|script|style|pre|code|'
+    r'form|input|button|img|br|hr|meta|link|h[1-6]|section|article|header|footer|nav|main|svg|iframe|label|select|'
+    r'option|textarea|b|i|em|strong)\b)', re.IGNORECASE)
+# Only block elements are counted to follow nesting; inline ones open and close on the same line
+_HTML_BLOCK_RE = re.compile(r'<(/?)(?:html|head|body|div|table|ul|ol|script|style|pre|form|section|article|svg)\b',
+                            re.IGNORECASE)
+_EXCEPTION_NAME = r'(?:[a-z_$][\w$]*\.)*[A-Z]\w*(?:Exception|Error|Exit|Interrupt|Warning)\b'
+_STACK_FRAME = r'at [\w$<>/]+(?:\.[\w$<>/]+)+ ?\('  # Java and JavaScript frames
+_TRACE_LINE_RE = re.compile(
+    rf'File "|{_STACK_FRAME}|\.\.\. \d+ more|Caused by:|During handling of the above exception|'
+    rf'The above exception was|Traceback \(most recent call last\)|[~^]+$|{_EXCEPTION_NAME}')
+# Lines that are code beyond doubt and open a span on their own
+_STRONG_CODE = (
+    r'(?:async\s+)?def\s+\w+\s*\(.*\)\s*(?:->.*)?:$'
+    r'|import\s+[\w.]+(?:\s+as\s+\w+)?(?:\s*,\s*[\w.]+(?:\s+as\s+\w+)?)*\s*;?$'
+    r'|from\s+[\w.]+\s+import\s+(?:\*|\(?[\w\s,]+\)?)$')
+# Lines that may start code. They only open a span when the next line looks like code too:
+# "class tomorrow: bring the notes" or "let it = be" alone is chat.
+_CODE_OPEN = (
+    r'(?:async\s+)?def\s+\w+\s*\(|class\s+\w+\s*(?:\([\w.,=\s]*\))?\s*:$'
+    r'|class\s+\w+(?:\s+(?:extends|implements)\s+[\w.<>, ]+)*\s*\{$|#(?:include|define|pragma)\b'
+    r'|function\s*\w*\s*\([^)]*\)\s*\{?$|(?:const|let|var)\s+\w+\s*=[^=].*[;{\[(,]$'
+    r'|(?:public|private|protected)\s+(?:static\s+)?[\w<>\[\],]+\s+\w+\s*\([^)]*\)\s*(?:throws\s+[\w., ]+)?[{;]?$'
+    r'|(?:package|using)\s+[\w.]+;$')
+_CODE_OPEN_RE = re.compile(f'{_STRONG_CODE}|{_CODE_OPEN}')
+# One match per line decides between strong code, a stack trace, maybe code and neither
+_WORD_OPEN_RE = re.compile(
+    rf'(?P<strong>{_STRONG_CODE})'
+    rf'|(?P<trace>Traceback \(most recent call last\)|Exception in thread |{_EXCEPTION_NAME}|{_STACK_FRAME})'
+    rf'|(?P<code>{_CODE_OPEN})')
+# Code openers start with one of these; trace openers have a colon or are a single word.
+# Most chat lines have neither and skip the regex.
+_CODE_FIRST_CHARS = frozenset('acdfilpuv#')
+# Closing brackets only continue a span, on their own they are as likely a smiley
+_CODE_CLOSE_RE = re.compile(r'[}\])]+[;,)]*$')
+# Statements that confirm a possible opener on the line before
+_CODE_STATEMENT_RE = re.compile(
+    r'[\w.\[\]]+\s*(?:[-+*/%]?=(?!=)|\+\+|--)|[\w.]+\(.*\)[;,]?$|(?:if|while|for|switch)\s*\(.*\)\s*\{?$'
+    r'|(?:return|throw)\b.*;$|(?:else|try|finally)\s*[:{]$|}\s*else\b.*\{$|@\w+(?:\(.*\))?$|.*[)=]\s*\{$')
+# Lines that only count as code inside a code span
+_CODE_LINE_RE = re.compile(
+    r'#|//|/\*|\*|@\w|(?:return|elif|else|except|finally|try|raise|yield|pass|break|continue)\b'
+    r'|(?:if|for|while|with)\b.*:$|print\(|self\.|[\w.\[\]]+\s*(?:[-+*/%]?=|\+\+|--)|[\w.]+\(.*\)[;,]?$')
+_CODE_LINE_ENDS = frozenset('{}:;,)]')
+
+
+def contains_technical_content(text: str) -> bool:
+    """Check if text contains technical content like LaTeX, code, etc."""
+    return _TECHNICAL_RE.search(text) is not None
+
+
+def _latex_depth(line: str) -> int:
+    """Environments a line opens minus those it closes"""
+    if '\\' not in line:
+        return 0
+    return sum(1 if name == 'begin' else -1 for name in _LATEX_ENV_RE.findall(line))
+
+
+def _html_depth(line: str) -> int:
+    """Block elements a line opens minus those it closes"""
+    if '<' not in line:
+        return 0
+    return sum(-1 if slash else 1 for slash in _HTML_BLOCK_RE.findall(line))
+
+
+class TechnicalSegmenter:
+    """Find code, LaTeX, HTML and stack trace spans in a message's lines, in one pass, and collapse each into a placeholder"""
+
+    def __init__(self, placeholders: bool = TECHNICAL_PLACEHOLDERS):
+        self.placeholders = placeholders
+        self._kind: Optional[str] = None  # Of the open span, None outside one
+        self._mode = ""  # How the open span continues: fence, latex, html, trace or code
+        self._pending: Optional[str] = None  # The first line of a span the next line has yet to confirm
+        self._fence = ""
+        self._depth = 0  # Open LaTeX environments or HTML blocks
+        self._closed = False  # The span ended on its last line: a closing fence or a single long line
+        self._after_frame = False  # The next trace line is the source line of a "File ..." frame
+        self._lines = 0
+        self._chars = 0
+
+    def feed(self, line: str, pieces: List[str]):
+        """Take the next stripped, non-empty line of a message: conversation goes to pieces, technical lines into a span"""
+        if self._kind is not None:
+            if self._pending is not None:
+                if self._confirms(line):
+                    self._pending = None
+                    self._lines += 1
+                    self._chars += len(line)
+                    return
+                self._drop_pending(pieces)
+            elif not self._closed and self._continues(line):
+                self._lines += 1
+                self._chars += len(line)
+                return
+            else:
+                self.finish(pieces)
+        if self._opens(line):
+            self._lines = 1
+            self._chars = len(line)
+        else:
+            pieces.append(line)
+
+    def finish(self, pieces: List[str]):
+        """End of the message: close the open span and add its placeholder"""
+        if self._kind is None:
+            return
+        if self._pending is not None:
+            self._drop_pending(pieces)
+            return
+        label = f"[{SPAN_LABELS[self._kind]}, {self._lines} line{'s' if self._lines != 1 else ''}]"
+        # A span shorter than its placeholder is dropped outright: the note would cost more than the content
+        if self.placeholders and self._chars > len(label):
+            pieces.append(label)
+            record_hit("technical", self._kind, self._chars - len(label))
+        else:
+            record_hit("technical", self._kind, self._chars)
+        self._kind = None
+
+    def _drop_pending(self, pieces: List[str]):
+        # Nothing confirmed the opener: it was conversation after all
+        pieces.append(self._pending)
+        self._pending = None
+        self._kind = None
+
+    def _open(self, kind: str, mode: str, depth: int = 0, closed: bool = False, pending: Optional[str] = None) -> bool:
+        self._kind = kind
+        self._mode = mode
+        self._depth = depth
+        self._closed = closed
+        self._pending = pending
+        self._after_frame = False
+        return True
+
+    def _opens(self, line: str) -> bool:
+        first = line[0]
+        if first in '`~' and line.startswith(_FENCES):
+            self._fence = line[:3]
+            return self._open("code", "fence", closed=self._fence in line[3:])  # ```x = 1``` on one line
+        if '\\' in line and _LATEX_OPEN_RE.match(line):
+            strong = '\\begin{' in line or '\\documentclass' in line
+            return self._open("latex", "latex", max(0, _latex_depth(line)), pending=None if strong else line)
+        if first == '<' and _HTML_OPEN_RE.match(line):
+            depth = max(0, _html_depth(line))
+            if depth or line.endswith('>'):
+                return self._open("html", "html", depth, pending=line)
+        if first in _CODE_FIRST_CHARS or ':' in line or ' ' not in line:
+            match = _WORD_OPEN_RE.match(line)
+            if match:
+                if match.lastgroup == "strong":
+                    return self._open("code", "code")
+                return self._open(match.lastgroup, match.lastgroup, pending=line)
+        if line[-1] in '{;' and ('(' in line or '=' in line):
+            return self._open("code", "code", pending=line)
+        if len(line) > LONG_LINE_CHARS and _TECHNICAL_RE.search(line):
+            kind = "latex" if '\\' in line else "html" if '<' in line else "code"
+            return self._open(kind, "line", closed=True)
+        return False
+
+    def _confirms(self, line: str) -> bool:
+        """Whether the line after a possible opener shows the span is technical"""
+        if self._mode != "code":
+            return self._continues(line)
+        if line.startswith(_FENCES):
+            return False
+        return (_CODE_OPEN_RE.match(line) is not None or _CODE_STATEMENT_RE.match(line) is not None
+                or (self._pending[-1] in '{[(' and (line[-1] in ',;{[(' or _CODE_CLOSE_RE.match(line) is not None)))
+
+    def _continues(self, line: str) -> bool:
+        mode = self._mode
+        if mode == "fence":
+            self._closed = line.startswith(self._fence)
+            return True
+        if mode == "latex":
+            inside = self._depth > 0
+            self._depth = max(0, self._depth + _latex_depth(line))
+            return inside or self._depth > 0 or line.startswith(_LATEX_LINE_STARTS)
+        if mode == "html":
+            inside = self._depth > 0
+            self._depth = max(0, self._depth + _html_depth(line))
+            return inside or self._depth > 0 or (line[0] == '<' and _HTML_OPEN_RE.match(line) is not None)
+        if mode == "trace":
+            if self._after_frame:
+                self._after_frame = False
+                return True
+            self._after_frame = line.startswith('File "')
+            return self._after_frame or _TRACE_LINE_RE.match(line) is not None
+        if line.startswith(_FENCES):
+            return False  # A fence starts a span of its own
+        return (line[-1] in _CODE_LINE_ENDS or _CODE_OPEN_RE.match(line) is not None
+                or _CODE_CLOSE_RE.match(line) is not None or _CODE_LINE_RE.match(line) is not None)
+
+
+def collapse_technical(text: str, placeholders: bool = TECHNICAL_PLACEHOLDERS) -> str:
+    """A message's text with its technical spans collapsed, '' when nothing else is left"""
+    segmenter = TechnicalSegmenter(placeholders)
+    pieces = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line:
+            segmenter.feed(line, pieces)
+    segmenter.finish(pieces)
+    return '\n'.join(pieces)
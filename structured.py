@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Tuple
+
+from metrics import Counter
+
+ANALYSIS_FIELDS = ("title", "summary", "resolution")
+
+# Sent as the response format of JSON-capable backends, which then only emit a matching object
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in ANALYSIS_FIELDS},
+    "required": list(ANALYSIS_FIELDS),
+}
+
+# Format failures are json/repaired plus json/invalid; every json/repaired answer is a
+# click on Analyze the user did not have to repeat. Text answers count as incomplete
+# when a section fell back to canned text.
+ANALYSIS_FORMAT = Counter("llm_analysis_format_total", "Analyses by response format and how the response parsed",
+                          ["format", "outcome"])
+
+# Value of a field as far as it has arrived: the closing quote may still be missing
+_PARTIAL_FIELD_RE = re.compile(r'"(title|summary|resolution)"\s*:\s*"((?:[^"\\]|\\.)*)')
+_CUT_ESCAPE_RE = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+_decoder = json.JSONDecoder()
+
+
+class FormatError(ValueError):
+    """A response is not the JSON analysis object; the message says what is wrong with it"""
+
+
+def validate_analysis(text: str) -> Tuple[str, str, str]:
+    """Title, summary and resolution from a JSON analysis, checked in one pass over the text"""
+    start = text.find('{')
+    if start == -1:
+        raise FormatError("no JSON object found")
+    try:
+        # Decoding from the first brace ignores a code fence or a sentence around the object
+        value, _ = _decoder.raw_decode(text, start)
+    except ValueError as e:
+        raise FormatError(f"invalid JSON: {e}") from None
+    if not isinstance(value, dict):
+        raise FormatError("the JSON value is not an object")
+    sections = []
+    for field in ANALYSIS_FIELDS:
+        section = value.get(field)
+        if not isinstance(section, str) or not section.strip():
+            raise FormatError(f'"{field}" is missing or not a non-empty string')
+        sections.append(section.strip())
+    return tuple(sections)
+
+
+def _unescape(raw: str) -> str:
+    try:
+        return json.loads('"' + _CUT_ESCAPE_RE.sub('', raw) + '"')
+    except ValueError:
+        return raw
+
+
+def extract_fields(text: str) -> Tuple[str, str, str]:
+    """Whatever field values can be read from a partial or malformed JSON analysis, '' for the rest"""
+    found = {}
+    for match in _PARTIAL_FIELD_RE.finditer(text):
+        found.setdefault(match.group(1), _unescape(match.group(2)).strip())
+    return tuple(found.get(field, "") for field in ANALYSIS_FIELDS)
+
+
+class JsonAnalysisStream:
+    """Collect a streamed JSON analysis and show its fields as they arrive"""
+
+    def __init__(self):
+        self._parts = []
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def feed(self, delta: str) -> Tuple[str, str, str]:
+        """Consume a streamed chunk and return the fields as they stand so far"""
+        self._parts.append(delta)
+        return self.partial()
+
+    def partial(self) -> Tuple[str, str, str]:
+        return extract_fields(self.text)
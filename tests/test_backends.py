@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backends import Backend, LocalBackend, complete_hedged
+
+
+class SlowLlama:
+    """Streams one token every few milliseconds, up to a limit, and counts what it generated"""
+
+    def __init__(self, tokens=1000):
+        self.tokens = tokens
+        self.generated = 0
+        self.closed = threading.Event()
+
+    def create_chat_completion(self, stream=False, **kwargs):
+        assert stream
+        try:
+            for _ in range(self.tokens):
+                time.sleep(0.002)
+                self.generated += 1
+                yield {"choices": [{"delta": {"content": "x"}}]}
+        finally:
+            self.closed.set()
+
+
+class QuickBackend(Backend):
+    name = "quick"
+
+    def complete(self, data, headers):
+        time.sleep(0.05)
+        return "quick"
+
+
+@pytest.fixture
+def local(monkeypatch):
+    backend = LocalBackend(model_path="model.gguf")
+    backend._model = SlowLlama()
+    monkeypatch.setattr(backend, "available", lambda: True)
+    return backend
+
+
+def test_local_backend_joins_the_streamed_tokens(local):
+    local._model = SlowLlama(tokens=5)
+    assert local.complete({"messages": []}, {}) == "xxxxx"
+
+
+def test_cancelled_local_call_stops_generating_and_frees_the_model(local):
+    async def cancel_soon():
+        task = asyncio.ensure_future(local.complete_async({"messages": []}, {}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_soon())
+    assert local._model.closed.wait(1)
+    assert local._model.generated < local._model.tokens
+    assert local._lock.acquire(timeout=1)
+    local._lock.release()
+
+
+def test_hedge_loser_stops_generating(local):
+    completion = complete_hedged(QuickBackend(), local, {"messages": []}, {}, hedge_after=0.01)
+    assert completion.text == "quick"
+    assert local._model.closed.wait(1)
+    assert local._model.generated < local._model.tokens
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import engine
+import metrics
+from backends import Backend, BackendError, LocalBackend, complete_hedged
+from batch import BatchRunner, load_checkpoint, model_calls
+
+
+def test_one_failing_file_does_not_fail_the_batch(tmp_path, monkeypatch):
+    chats = tmp_path / "chats"
+    chats.mkdir()
+    for name in ("good", "bad"):
+        (chats / f"{name}.txt").write_text(f"12/01/2024, 10:00 - Asha: {name} talk about the trip\n", encoding="utf-8")
+
+    async def analyze_async(prompt, lane):
+        if "bad talk" in prompt:
+            raise RuntimeError("connection reset")
+        return "Title", "Summary", "Resolution"
+
+    monkeypatch.setattr(engine, "analyze_async", analyze_async)
+    output = tmp_path / "results.jsonl"
+    runner = BatchRunner(output, processes=1, concurrency=2)
+    asyncio.run(runner.run(sorted(chats.iterdir()) + [chats / "missing.txt"]))
+
+    rows = {row["path"]: row for row in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert rows[str(chats / "good.txt")]["status"] == "ok"
+    assert rows[str(chats / "bad.txt")]["error"] == "An error occurred: connection reset"
+    assert rows[str(chats / "missing.txt")]["status"] == "error"
+    assert runner.counts == {"ok": 1, "error": 2}
+    assert list(load_checkpoint(output)) == [str(chats / "good.txt")]
+
+
+class DownBackend(Backend):
+    name = "together"
+
+    def complete(self, data, headers):
+        metrics.UPSTREAM_RESPONSES.inc(("429",))
+        raise BackendError("rate limited")
+
+
+class AnsweringLocalBackend(Backend):
+    name = LocalBackend.name
+
+    def complete(self, data, headers):
+        return "answer"
+
+
+def test_model_calls_include_fallbacks(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    api_before, local_before = model_calls()
+    for _ in range(2):
+        complete_hedged(DownBackend(), AnsweringLocalBackend(), {}, {}, hedge_after=0)
+    api_after, local_after = model_calls()
+    assert (api_after - api_before, local_after - local_before) == (2, 2)
@@ -0,0 +1,76 @@
+import random
+from collections import deque
+
+import condense
+from condense import (CHARS_PER_TOKEN, MessageScorer, condense_text, estimate_tokens, iter_chunks,
+                      select_window)
+
+
+def reference_window(lines, budget, half_life=condense.CONDENSE_RECENCY_HALF_LIFE):
+    """select_window as first written, copying the best window whenever it changes"""
+    decay = 0.5 ** (1.0 / half_life)
+    scorer = MessageScorer()
+    window, costs = deque(), deque()
+    tokens_total = score_total = 0
+    best, best_score = [], 0.0
+    for line in lines:
+        line = line[:budget * CHARS_PER_TOKEN]
+        tokens, score = estimate_tokens(line), scorer.score(line)
+        window.append(line)
+        costs.append((tokens, score))
+        tokens_total += tokens
+        score_total += score
+        while tokens_total > budget:
+            window.popleft()
+            old_tokens, old_score = costs.popleft()
+            tokens_total -= old_tokens
+            score_total -= old_score
+        best_score *= decay
+        if score_total >= best_score:
+            best_score = score_total
+            best = list(window)
+    return best
+
+
+def test_select_window_matches_reference():
+    rng = random.Random(3)
+    texts = ["ok", "see you at 6", "why would you do that??", "you never listen", "sorry", "x" * 300]
+    for _ in range(200):
+        lines = [f"{rng.choice('ABC')}: {rng.choice(texts)}" for _ in range(rng.randint(0, 300))]
+        budget = rng.choice([5, 40, 200])
+        assert select_window(iter(lines), budget, half_life=50) == reference_window(lines, budget, half_life=50)
+
+
+def test_select_window_fits_the_budget():
+    lines = [f"A: message number {i}" for i in range(5000)]
+    window = select_window(lines, 100)
+    assert window and sum(estimate_tokens(line) for line in window) <= 100
+    assert lines[-len(window):] == window  # Equal scores: the most recent run wins
+
+
+def test_select_window_prefers_the_argument():
+    calm = [f"{'AB'[i % 2]}: see you at {i % 12}" for i in range(2000)]
+    heated = ["A: why did you lie to me??", "B: I never lied, stop blaming me", "A: how dare you"] * 5
+    window = select_window(calm[:1500] + heated + calm[1500:1520], 120)
+    assert set(heated) <= set(window)
+
+
+def test_condense_text_leaves_short_text_alone():
+    text = "A: hi\n\n  B: hello  "
+    assert condense_text(text, 100) == text
+    assert condense_text("A: one\n\nB: two\nC: three", 3) == "C: three"
+
+
+def test_default_budget_leaves_room_for_prompt_and_answer():
+    assert condense.PROMPT_TOKEN_BUDGET == (condense.MODEL_CONTEXT_TOKENS - condense.COMPLETION_TOKENS
+                                            - condense.PROMPT_OVERHEAD_TOKENS)
+    assert condense.PROMPT_TOKEN_BUDGET > 2000
+
+
+def test_iter_chunks_bounded_and_stable_under_appends():
+    lines = [f"A: line {i} " + "word " * (i % 7) for i in range(3000)]
+    chunks = list(iter_chunks(lines, 200))
+    assert [line for chunk in chunks for line in chunk] == lines
+    assert all(sum(estimate_tokens(line) for line in chunk) <= 200 for chunk in chunks)
+    grown = list(iter_chunks(lines + ["B: more"] * 50, 200))
+    assert grown[:len(chunks) - 1] == chunks[:-1]
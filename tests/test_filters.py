@@ -0,0 +1,80 @@
+import json
+import random
+
+import pytest
+
+from filters import FILTER_RULES_PATH, load_rule_sets
+
+TEXTS = [
+    "see you at 5",
+    "use my referral code ABC for cashback",
+    "Download app now: https://example.com",
+    "\u092f\u0939 \u0938\u0902\u0926\u0947\u0936 \u0939\u091f\u093e \u0926\u093f\u092f\u093e \u0917\u092f\u093e \u0925\u093e",
+    "\u0910\u092a \u0921\u093e\u0909\u0928\u0932\u094b\u0921 \u0915\u0930\u0947\u0902 \U0001f389",
+    "descarga la app y gana hasta 100",
+    "\U0001f602\U0001f602 that was great",
+    "the join India movement",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def rule_sets():
+    return load_rule_sets()
+
+
+def test_classify_batch_agrees_with_match(rule_sets):
+    rng = random.Random(7)
+    for rule_set in rule_sets.values():
+        for _ in range(50):
+            texts = [rng.choice(TEXTS) for _ in range(rng.randint(1, 20))]
+            assert rule_set.classify_batch(texts) == [rule_set.match(text) for text in texts]
+
+
+def test_classify_batch_falls_back_when_lowercasing_changes_lengths(rule_sets):
+    promotional = rule_sets["promotional"]
+    texts = ["\u0130stanbul trip", "get your CASHBACK", "hello"]  # A dotted capital I lowercases to two characters
+    assert promotional.classify_batch(texts) == [None, "en.cashback", None]
+
+
+def test_first_rule_in_config_order_names_the_hit(rule_sets):
+    assert rule_sets["promotional"].match("cashback via paytm") == "en.cashback"
+    assert rule_sets["promotional"].match("paytm cashback") == "en.cashback"
+
+
+def test_hit_positions_searches_only_scripts_present(rule_sets):
+    promotional = rule_sets["promotional"]
+    lowered = "gpay me\nrefer: \u0930\u0947\u092b\u0930\u0932 \u0915\u094b\u0921 xyz\nno spam here"
+    positions = sorted(promotional.hit_positions(lowered))
+    assert positions == [0, lowered.index("\u0930\u0947\u092b\u0930\u0932")]
+    assert list(promotional.hit_positions("nothing to see")) == []
+
+
+def test_remove_cuts_system_notices_in_order(rule_sets):
+    system = rule_sets["system"]
+    line = "Messages and calls are end-to-end encrypted. Learn more"
+    assert system.remove(line).strip(" .") == ""
+    assert system.remove(line, line.lower()) == system.remove(line)
+
+
+def test_locales_limit_the_rules(rule_sets):
+    english = load_rule_sets(locales=["en"])
+    assert len(english["promotional"]) < len(rule_sets["promotional"])
+    assert english["promotional"].match("\u0915\u0948\u0936\u092c\u0948\u0915") is None
+
+
+@pytest.mark.parametrize("pack, message", [
+    ({"system": [{"keywords": ["x"]}]}, "has no id"),
+    ({"system": [{"id": "bad", "regex": "("}]}, "invalid regex"),
+    ({"system": [{"id": "empty", "keywords": [""]}]}, "non-empty keywords"),
+])
+def test_invalid_rules_are_reported(tmp_path, pack, message):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"locales": {"xx": pack}}), encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        load_rule_sets(str(path))
+
+
+def test_unknown_locale_is_reported():
+    with pytest.raises(ValueError, match="no locale pack named zz"):
+        load_rule_sets(FILTER_RULES_PATH, ["en", "zz"])
@@ -0,0 +1,135 @@
+import pytest
+
+import engine
+import incremental
+from incremental import (AnalysisState, AnalysisStateStore, ParseTracker, SenderMap, boundary_digest, chain_digest,
+                         prefix_fingerprint)
+
+MESSAGES = [("12/01/2024, 10:%02d" % minute, "Asha" if minute % 2 else "Ravi", f"message number {minute}")
+            for minute in range(12)]
+
+
+def chat_lines(start, stop):
+    return "".join(f"{when} - {sender}: {text}\n" for when, sender, text in MESSAGES[start:stop])
+
+
+def state(fingerprint="f", size=10, boundary="b"):
+    return AnalysisState(fingerprint, size, boundary, "utf-8", "whatsapp", "chain", 3, {}, ("t", "s", "r"))
+
+
+@pytest.fixture
+def store(monkeypatch):
+    memory_store = AnalysisStateStore(path="")
+    monkeypatch.setattr(incremental, "_store", memory_store)
+    return memory_store
+
+
+def test_prefix_fingerprint_is_the_rolling_hash_of_the_first_messages():
+    chain = ""
+    for message in MESSAGES[:3]:
+        chain = chain_digest(chain, message)
+    assert prefix_fingerprint(MESSAGES, count=3) == chain
+    assert prefix_fingerprint(iter(MESSAGES), count=3) == chain  # Stops reading after `count`
+    assert prefix_fingerprint(MESSAGES[:2], count=3) is None
+    assert prefix_fingerprint(MESSAGES[1::-1], count=2) != prefix_fingerprint(MESSAGES, count=2)
+
+
+def test_chain_digest_separates_fields():
+    assert chain_digest("", ("a", "b", "c")) != chain_digest("", ("a", "bc", ""))
+
+
+def test_sender_map_keeps_only_hashes():
+    sender_map = SenderMap()
+    sender_map["Asha Rao"] = "Person 1"
+    assert "Asha Rao" in sender_map
+    assert sender_map["Asha Rao"] == "Person 1"
+    assert "Asha Rao" not in sender_map.hashed()
+    assert "Asha Rao" in SenderMap.from_hashed(sender_map.hashed())
+
+
+def test_resumed_parse_continues_the_chain_of_a_full_parse(tmp_path, store):
+    path = tmp_path / "chat.txt"
+    path.write_text(chat_lines(0, 10), encoding="utf-8")
+    tracker = ParseTracker()
+    assert engine.read_conversation_file(str(path), tracker=tracker)
+    engine.remember_analysis(str(path), tracker, ("Title", "Summary", "Resolution"))
+
+    with path.open("a", encoding="utf-8") as f:
+        f.write(chat_lines(10, 12))
+    saved, resumed, new_content = engine.read_appended_conversation(str(path))
+    full = ParseTracker()
+    engine.read_conversation_file(str(path), tracker=full)
+
+    assert saved.analysis == ("Title", "Summary", "Resolution")
+    assert full.message_count == 12
+    assert (resumed.chain, resumed.message_count) == (full.chain, full.message_count)
+    assert "message number 11" in new_content
+    assert "message number 9" not in new_content
+
+
+def test_edited_export_is_not_resumed(tmp_path, store):
+    path = tmp_path / "chat.txt"
+    path.write_text(chat_lines(0, 10), encoding="utf-8")
+    tracker = ParseTracker()
+    engine.read_conversation_file(str(path), tracker=tracker)
+    engine.remember_analysis(str(path), tracker, ("Title", "Summary", "Resolution"))
+
+    path.write_text(chat_lines(0, 10).replace("number 9", "number 9!") + chat_lines(10, 12), encoding="utf-8")
+    assert engine.read_appended_conversation(str(path)) is None
+
+
+def test_memory_store_evicts_the_least_recently_saved(tmp_path):
+    path = tmp_path / "chat.txt"
+    path.write_bytes(b"0123456789")
+    boundary = boundary_digest(str(path), 10)
+    states = AnalysisStateStore(path="", max_entries=2)
+    states.save(state("a", boundary=boundary))
+    states.save(state("b", boundary=boundary))
+    states.save(state("a", boundary=boundary))  # Saving again makes it the most recent
+    states.save(state("c", boundary=boundary))
+    assert states.find("a", str(path)) is not None
+    assert states.find("b", str(path)) is None
+    assert states.find("c", str(path)) is not None
+
+
+def test_sqlite_store_prefers_the_longest_matching_state(tmp_path):
+    path = tmp_path / "chat.txt"
+    path.write_bytes(b"0123456789")
+    states = AnalysisStateStore(path=str(tmp_path / "state.db"))
+    states.save(state(size=4, boundary=boundary_digest(str(path), 4)))
+    states.save(state(size=8, boundary="stale"))
+    states.save(state(size=20, boundary="past the end"))
+    found = states.find("f", str(path))
+    assert found.size == 4
+    assert found.analysis == ("t", "s", "r")
+
+
+@pytest.mark.parametrize("db", ["", "state.db"])
+def test_appended_messages_redact_earlier_participants(tmp_path, monkeypatch, db):
+    monkeypatch.setattr(incremental, "_store", AnalysisStateStore(path=str(tmp_path / db) if db else ""))
+    path = tmp_path / "chat.txt"
+    senders = ["Asha Rao", "Bela Das"]
+    path.write_text("".join(f"12/01/2024, 10:{minute:02d} - {senders[minute % 2]}: message number {minute}\n"
+                            for minute in range(10)), encoding="utf-8")
+    tracker = ParseTracker()
+    engine.read_conversation_file(str(path), tracker=tracker)
+    engine.remember_analysis(str(path), tracker, ("Title", "Summary", "Resolution"))
+
+    with path.open("a", encoding="utf-8") as f:
+        f.write("12/01/2024, 11:00 - Chen Li: Chen here, Bela Das and Asha Rao stop, Asha please\n")
+    _, resumed, new_content = engine.read_appended_conversation(str(path))
+    assert new_content == "Person 3: Person 3 here, Person 2 and Person 1 stop, Person 1 please"
+    assert engine.read_conversation_file(str(path)).endswith(new_content)  # As a full read redacts it
+    assert all("Asha" not in str(entry) for entry in resumed.redactor.hashed_entries())
+
+
+def test_state_saved_without_redaction_is_read_in_full(tmp_path, store):
+    path = tmp_path / "chat.txt"
+    path.write_text(chat_lines(0, 10), encoding="utf-8")
+    tracker = ParseTracker()
+    engine.read_conversation_file(str(path), tracker=tracker)
+    tracker.redactor = None  # As saved before the redaction entries were kept
+    engine.remember_analysis(str(path), tracker, ("Title", "Summary", "Resolution"))
+    with path.open("a", encoding="utf-8") as f:
+        f.write(chat_lines(10, 12))
+    assert engine.read_appended_conversation(str(path)) is None
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import parsers
+from formats import detect_format
+from parsers import get_parser
+
+TELEGRAM_EXPORT = {
+    "name": "Flatmates",
+    "type": "private_group",
+    "id": 42,
+    "messages": [
+        {"id": 1, "type": "service", "date": "2023-03-01T09:00:00", "actor": "Alice", "action": "create_group"},
+        {"id": 2, "type": "message", "date": "2023-03-01T09:01:00", "from": "Alice",
+         "text": "who left the dishes again??"},
+        {"id": 3, "type": "message", "date": "2023-03-01T09:02:00", "from": "Bob",
+         "text": ["not me, ", {"type": "bold", "text": "never"}, " me"]},
+        {"id": 4, "type": "message", "date": "2023-03-01T09:03:00", "from": "Alice", "text": "  "},
+        {"id": 5, "type": "message", "date": "2023-03-01T09:04:00", "from": None, "text": "ok é \"quoted\" [1, 2]"},
+    ],
+}
+TELEGRAM_RECORDS = [
+    ("Alice", "2023-03-01T09:01:00", "who left the dishes again??"),
+    ("Bob", "2023-03-01T09:02:00", "not me, never me"),
+    ("", "2023-03-01T09:04:00", 'ok é "quoted" [1, 2]'),
+]
+SLACK_EXPORT = [
+    {"type": "message", "subtype": "channel_join", "user": "U1", "text": "<@U1> has joined", "ts": "1677661200.0"},
+    {"type": "message", "user": "U1", "user_profile": {"real_name": "Alice"}, "text": "the deploy broke again",
+     "ts": "1677661260.000100"},
+    {"type": "message", "user": "U2", "text": "not my change", "ts": "oops"},
+    {"type": "message", "user": "U2", "text": "", "ts": "1677661380.0"},
+]
+SLACK_RECORDS = [("Alice", "2023-03-01 09:01", "the deploy broke again"), ("U2", "", "not my change")]
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def parse(path):
+    with open(path, encoding="utf-8") as f:
+        detected = detect_format(f.read(8192))
+    return detected.name, list(get_parser(detected.name)(path, "utf-8", detected))
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_chars", [1, 7, 64 * 1024])
+def test_json_exports_stream_in_any_chunk_size(tmp_path, monkeypatch, indent, chunk_chars):
+    monkeypatch.setattr(parsers, "JSON_CHUNK_CHARS", chunk_chars)
+    telegram = write(tmp_path, "result.json", json.dumps(TELEGRAM_EXPORT, indent=indent))
+    slack = write(tmp_path, "general.json", json.dumps(SLACK_EXPORT, indent=indent))
+    assert parse(telegram) == ("telegram_json", TELEGRAM_RECORDS)
+    assert parse(slack) == ("slack_json", SLACK_RECORDS)
+
+
+def test_json_export_without_messages(tmp_path):
+    path = write(tmp_path, "result.json", json.dumps({"name": "Empty", "type": "personal_chat", "messages": []}))
+    assert list(parsers.parse_telegram_json(path, "utf-8", None)) == []
+    path = write(tmp_path, "other.json", json.dumps({"name": "No list", "count": 3}))
+    assert list(parsers.parse_telegram_json(path, "utf-8", None)) == []
+
+
+def test_truncated_json_export_raises(tmp_path):
+    path = write(tmp_path, "result.json", json.dumps(TELEGRAM_EXPORT)[:-40])
+    with pytest.raises(json.JSONDecodeError):
+        list(parsers.parse_telegram_json(path, "utf-8", None))
+
+
+def test_csv_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(parsers, "CSV_BATCH_ROWS", 2)
+    path = write(tmp_path, "chat.csv", "Timestamp,Sender,Message\n"
+                                       "2023-03-01 09:00, Alice ,why are you late\n"
+                                       "2023-03-01 09:01,Bob,\n"
+                                       "2023-03-01 09:02,Bob,\"traffic, sorry\"\n"
+                                       "short row\n")
+    assert parse(path) == ("csv", [("Alice", "2023-03-01 09:00", "why are you late"),
+                                   ("Bob", "2023-03-01 09:02", "traffic, sorry")])
+
+
+@pytest.mark.parametrize("sample, name", [
+    ("12/03/2023, 10:15 pm - Alice: hi\n12/03/2023, 10:16 pm - Bob: hello\n", "whatsapp_android"),
+    ("[12/03/2023, 22:15:01] Alice: hi\n[12/03/2023, 22:16:09] Bob: hello\n", "whatsapp_ios"),
+    ("Alice: hi\nBob: hello\nAlice: how are you\n", "name_text"),
+    ("just some notes\nwithout any speakers at all\n", "plain"),
+])
+def test_detect_line_formats(sample, name):
+    assert detect_format(sample).name == name
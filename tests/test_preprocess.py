@@ -0,0 +1,85 @@
+import random
+import re
+
+import pytest
+
+import engine
+
+# The notices the original preprocess_chat_content removed, in its order
+LEGACY_SYSTEM_MESSAGES = [
+    'Messages and calls are end-to-end encrypted',
+    'Only people in this chat can read, listen to, or share them',
+    'Learn more',
+    'is a contact',
+    'Your security code with',
+    'changed. Tap to learn more',
+    '<Media omitted>',
+    'This message was deleted',
+    'You deleted this message',
+    'joined using this group',
+    'left the group',
+    'added you',
+    'removed you',
+    'created group',
+    'changed the group description',
+    'changed this group\'s icon',
+    'null'
+]
+
+
+def legacy_strip(content: str) -> str:
+    """The original removal: one IGNORECASE pass over the whole content per notice"""
+    for msg in LEGACY_SYSTEM_MESSAGES:
+        content = re.sub(re.escape(msg), '', content, flags=re.IGNORECASE)
+    return content
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    "no notices here",
+    "12/01/2020, 9:00 am - Messages and calls are end-to-end encrypted. Learn more",
+    "Bob's security code changed. Tap to learn more",  # "Learn more" goes first and breaks the later notice
+    "LEARN MORE\nlearn More\nnulL",
+    "nunullll",  # Removing the inner match joins a new one, which a single pass leaves
+    "Alice: <Media omitted>\nBob: This message was deleted\n",
+    "\u0130stanbul trip: Learn more",  # Lowering changes the length
+    "\u0131 and \u017f fold differently: null",
+    "\u212a is the Kelvin sign, null",
+])
+def test_strip_system_messages_matches_legacy(content):
+    assert engine.strip_system_messages(content) == legacy_strip(content)
+
+
+def test_strip_system_messages_matches_legacy_fuzz():
+    fragments = LEGACY_SYSTEM_MESSAGES + [
+        'you', 'You', 'this message', 'nu', 'll', 'NULL', 'learn MORE', ' ', '\n', '\n\n',
+        '12/03/2023, 10:15 pm - Alice: ', 'hello', '\u017f', '\u212a', '\u0131', '\u0130', '\u00e9', ':',
+    ]
+    rng = random.Random(1)
+    for _ in range(2000):
+        content = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 30)))
+        assert engine.strip_system_messages(content) == legacy_strip(content), repr(content)
+
+
+def test_line_longer_than_a_chunk_is_yielded_in_pieces(tmp_path):
+    path = tmp_path / "chat.txt"
+    path.write_text("x" * 1000 + "\nend\n", encoding="utf-8")
+    blocks = list(engine.iter_file_blocks(str(path), "utf-8", chunk_size=64))
+    assert max(map(len, blocks)) <= 128
+    assert ''.join(blocks) == "x" * 1000 + "\nend"
+
+
+def test_resuming_inside_a_long_line_skips_only_a_chunk(tmp_path):
+    path = tmp_path / "chat.txt"
+    path.write_text("é" * 1000, encoding="utf-8")
+    blocks = list(engine.iter_file_blocks(str(path), "utf-8", chunk_size=64, start=101))  # Inside a character
+    assert ''.join(blocks) == "é" * (1000 - 83)
+
+
+def test_single_line_upload_keeps_its_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "FILE_TAIL_BYTES", 256 * 1024)
+    monkeypatch.setattr(engine, "FILE_TAIL_ALIGN", 64 * 1024)
+    path = tmp_path / "chat.txt"
+    path.write_text("we keep arguing about the trip " * 20000, encoding="utf-8")  # Tail starts inside the line
+    assert len(engine.read_format_sample(str(path), "utf-8")) == engine.FORMAT_SNIFF_CHARS
+    assert "arguing about the trip" in engine.read_conversation_file(str(path))
@@ -0,0 +1,51 @@
+import pytest
+
+from redaction import AMBIGUOUS_LABEL, NameRedactor, WordAutomaton, _Pattern, phone_forms
+
+
+def redactor(*participants):
+    names = NameRedactor()
+    for number, sender in enumerate(participants, 1):
+        names.add_participant(sender, f"Person {number}")
+    return names
+
+
+def test_automaton_finds_overlapping_patterns():
+    patterns = {words: _Pattern(len(words), ' '.join(words), False, False)
+                for words in [("he",), ("she",), ("his",), ("she", "said"), ("said", "his")]}
+    found = [(index, pattern.label) for index, pattern in WordAutomaton(patterns).search(["she", "said", "his"])]
+    assert found == [(0, "she"), (1, "she said"), (2, "said his"), (2, "his")]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("asha rao said hi", "Person 1 said hi"),
+    ("Asha Rao Menon", "Person 1 Menon"),  # Leftmost longest: the full name wins over the first name
+    ("Ashan is here", "Ashan is here"),  # Whole words only
+    ("I will call Will", "I will call Person 3"),  # Short one-word names need their capital
+    ("ravi and Ravi", "Person 4 and Person 4"),  # Unless their owner writes them in lower case
+])
+def test_names_inside_messages(text, expected):
+    assert redactor("Asha Rao", "Bela Das", "Will", "ravi").redact(text) == expected
+
+
+def test_shared_first_name_names_its_candidates():
+    assert redactor("Asha Rao", "Asha Menon").redact("ask Asha") == "ask Person 1 or Person 2"
+    assert redactor("Asha Rao", "Asha").redact("ask Asha") == "ask Person 2"  # Someone goes by the name alone
+    many = redactor("Asha Rao", "Asha Menon", "Asha Iyer", "Asha Das")
+    assert many.redact("ask Asha") == f"ask {AMBIGUOUS_LABEL}"
+
+
+def test_phone_numbers_in_any_grouping():
+    names = redactor("+91 98765 43210")
+    assert names.redact("call +91 98765 43210, 9876543210 or 98765 43210") == "call Person 1, Person 1 or Person 1"
+    assert names.redact("the code is 98765") == "the code is 98765"
+    assert phone_forms("+91 98765 43210") == [("91", "98765", "43210"), ("919876543210",), ("98765", "43210"),
+                                              ("9876543210",)]
+
+
+def test_participants_added_later_are_redacted():
+    names = redactor("Asha Rao")
+    assert names.redact("Bela Das agrees") == "Bela Das agrees"
+    names.add_participant("Bela Das", "Person 2")
+    assert names.redact("Bela Das agrees") == "Person 2 agrees"
+    assert len(names) == 2
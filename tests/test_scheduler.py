@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import backends
+import llm_client
+import scheduler
+from backends import Backend, complete_hedged, complete_hedged_async
+from scheduler import LANE_BULK, LANE_INTERACTIVE, RateLimitScheduler, TokenBucket, admitted_call
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.calls = []
+
+    def acquire(self, lane, tokens):
+        self.calls.append((lane, tokens))
+
+    async def wait_turn(self, lane, tokens):
+        self.calls.append((lane, tokens))
+        return
+        yield
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recording = RecordingScheduler()
+    monkeypatch.setattr(scheduler, "get_scheduler", lambda: recording)
+    return recording
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(per_minute=60, capacity=10)
+    now = bucket._updated
+    assert bucket.delay(10, now) == 0
+    bucket.take(10)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(5, now + 2) == pytest.approx(3.0)
+    assert bucket.delay(10, now + 100) == 0
+    assert bucket.level == 10  # Idle time does not pile up past the capacity
+    bucket.take(50)  # Amounts above capacity only need a full bucket
+    assert bucket.level == 0
+
+
+def test_scheduler_admits_within_the_request_budget():
+    limiter = RateLimitScheduler(rpm=600, tpm=0, burst_seconds=0.2)  # Two requests of burst, then one per 0.1 s
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire(LANE_BULK, 100)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_interactive_lane_goes_first():
+    limiter = RateLimitScheduler(rpm=60, tpm=0, burst_seconds=1)  # One request, then one per second
+    limiter.acquire(LANE_BULK, 1)
+    order = []
+
+    def call(lane):
+        limiter.acquire(lane, 1)
+        order.append(lane)
+
+    bulk = threading.Thread(target=call, args=(LANE_BULK,))
+    bulk.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=call, args=(LANE_INTERACTIVE,))
+    interactive.start()
+    bulk.join(5)
+    interactive.join(5)
+    assert order == [LANE_INTERACTIVE, LANE_BULK]
+
+
+def test_readmit_outside_a_call_does_nothing(recorder):
+    scheduler.readmit()
+    assert recorder.calls == []
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def post(self, url, json, headers, timeout):
+        return FakeResponse(self.statuses.pop(0))
+
+
+def test_retries_wait_for_a_slot_on_the_same_lane(recorder, monkeypatch):
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt, retry_after=None: 0)
+    client = llm_client.LLMClient(max_retries=3)
+    client.session = FakeSession([503, 429, 200])
+    with admitted_call(LANE_BULK, 700):
+        assert client.post_json("http://upstream", {}).status_code == 200
+    assert recorder.calls == [(LANE_BULK, 700), (LANE_BULK, 700)]
+
+
+class FailingBackend(Backend):
+    name = "remote"
+
+    def complete(self, data, headers):
+        raise backends.BackendError("down")
+
+
+class AnsweringBackend(Backend):
+    name = "local"
+
+    def complete(self, data, headers):
+        return "answer"
+
+
+class AnsweringRemoteBackend(AnsweringBackend):
+    name = "secondary"
+    remote = True
+
+
+def test_local_fallback_takes_no_scheduler_slot(recorder):
+    with admitted_call(LANE_INTERACTIVE, 300):
+        completion = complete_hedged(FailingBackend(), AnsweringBackend(), {}, {}, hedge_after=0)
+    assert completion.backend == "local"
+    assert recorder.calls == []
+
+
+def test_remote_fallback_waits_for_a_slot_on_the_same_lane(recorder):
+    with admitted_call(LANE_INTERACTIVE, 300):
+        completion = complete_hedged(FailingBackend(), AnsweringRemoteBackend(), {}, {}, hedge_after=0)
+    assert completion.backend == "secondary"
+    assert recorder.calls == [(LANE_INTERACTIVE, 300)]
+
+
+@pytest.mark.parametrize("fallback, calls", [(AnsweringBackend(), []),
+                                             (AnsweringRemoteBackend(), [(LANE_INTERACTIVE, 300)])])
+def test_async_fallback_is_admitted_only_when_remote(recorder, fallback, calls):
+    async def hedged():
+        with admitted_call(LANE_INTERACTIVE, 300):
+            return await complete_hedged_async(FailingBackend(), fallback, {}, {}, hedge_after=0)
+
+    assert asyncio.run(hedged()).backend == fallback.name
+    assert recorder.calls == calls
@@ -0,0 +1,61 @@
+import pytest
+
+from segmenter import TechnicalSegmenter, collapse_technical
+
+
+@pytest.mark.parametrize("text", [
+    "class tomorrow: bring the notes",
+    "private school fees(2 kids) are insane;",
+    "let it = be",
+    "call me (after 6);",
+    "class cancelled :(",
+    ")",
+    "ok\n)\n:)",
+    "ValueError: bad input",
+    "<b>wow</b>",
+    "\\section{Intro}\nSome text",
+    "private school fees(2 kids) are insane;\ncall me (after 6);",
+    "class tomorrow: bring the notes\nlet it = be",
+])
+def test_chat_lines_are_not_code(text):
+    assert collapse_technical(text) == text
+
+
+def test_possible_opener_needs_a_second_code_line():
+    assert collapse_technical("let x = 5;") == "let x = 5;"
+    assert collapse_technical("let total = price * count;\nlet tax = total * rate;\nright?") == (
+        "[code block, 2 lines]\nright?")
+
+
+def test_strong_openers_open_on_one_line():
+    assert collapse_technical("import numpy as np") == ""
+    assert collapse_technical("from os import path") == ""
+    assert collapse_technical("def add(a, b):\nthat's all") == "that's all"
+    assert collapse_technical("```\nx = 1\n```") == ""
+
+
+def test_spans_become_placeholders():
+    code = "function total(items) {\n  let sum = 0;\n  for (const item of items) {\n    sum += item.price;\n  }\n  return sum;\n}"
+    assert collapse_technical(f"{code}\nwhy does this return NaN") == "[code block, 7 lines]\nwhy does this return NaN"
+    trace = ('Traceback (most recent call last):\n  File "app.py", line 3, in <module>\n    main()\n'
+             'ValueError: invalid literal for int()')
+    assert collapse_technical(f"{trace}\nhelp") == "[stack trace, 4 lines]\nhelp"
+    latex = "\\begin{document}\n\\section{Intro}\nThis is the introduction.\n\\end{document}"
+    assert collapse_technical(f"{latex}\nok") == "[LaTeX block, 4 lines]\nok"
+
+
+def test_closing_brackets_only_continue_a_span():
+    assert collapse_technical("if (ready) {\n  start();\n}\n)") == "[code block, 4 lines]"
+    assert collapse_technical(")\n}") == ")\n}"
+
+
+def test_unconfirmed_opener_is_kept_at_message_end():
+    segmenter = TechnicalSegmenter()
+    pieces = []
+    segmenter.feed("class cancelled today:", pieces)
+    segmenter.finish(pieces)
+    assert pieces == ["class cancelled today:"]
+
+
+def test_placeholders_off_drops_spans():
+    assert collapse_technical("def f(x):\n    return x * 2\nsee?", placeholders=False) == "see?"